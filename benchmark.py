@@ -1,11 +1,25 @@
 import json
+import hashlib
 import time
 import re
+import argparse
+import itertools
 from pathlib import Path
-from typing import Any, Dict, List, Tuple, Set
-from collections import Counter
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Set
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
 
-from openai import OpenAI
+from openai import DefaultHttpxClient, OpenAI
+
+from concurrency_tuner import AIMDTuner, iter_adaptive
+from eval_engine import RoundContext, evaluate_idx
+from instrument import add_instrument_args, add_time, count, instrumented, observe, span
+from response_cache import ResponseCache
+from response_encodings import ENCODINGS, PROMPTS as ENCODING_PROMPTS, decode as decode_encoding, schema as encoding_schema
+from rounds_store import iter_rounds_file, open_rounds
+from run_journal import RunJournal, iter_journal
+from stream_parser import IdxStreamParser, salvage_items
+from token_budget import BUDGET_MIN, BUDGET_RESERVE, BUDGET_SLACK, default_counter, round_budget
 
 
 BASE_URL = "http://localhost:1234/v1"
@@ -15,13 +29,21 @@ MODEL_NAME = "openai/gpt-oss-20b"
 N_ROUNDS = 20
 K_MAX = 20
 
+# Number of requests kept in flight against the server (1 = old serial behaviour)
+CONCURRENCY = 4
+
+# --early_stop: cancel a streamed response after this many invalid items in a row
+MAX_INVALID_RUN = 5
+
 # Response budget controls (tune these for speed)
 TEMPERATURE = 0.0
 MAX_TOKENS = 800  # keep low for speed; raise if recall is too low
 
 ROUNDS_JSONL = r".\rounds\rounds_5000_sp_with_solutions.jsonl"
 
-SYSTEM_PROMPT = f"""Output ONLY a valid JSON list of up to {K_MAX} constructions from the tiles. No reasoning, explanations, or extra text.
+# System prompt variants ({k_max} is filled in by make_config); sweep.py compares them
+PROMPT_VARIANTS = {
+    "default": """Output ONLY a valid JSON list of up to {k_max} constructions from the tiles. No reasoning, explanations, or extra text.
 
 Rules:
 1. used_tokens: subset of the provided tiles (use exact strings, respect counts, no extras or modifications).
@@ -29,66 +51,423 @@ Rules:
 3. word: concat with 'Ġ'->' ', 'Ċ'->'\\n', then strip and lowercase. Example: "Ġhelloworld" -> "helloworld". "ab" -> "ab".
 4. Objects: {{"word": str, "used_tokens": [str, ...], "concat": str}}
 5. If none, output [].
-"""
+""",
+    "idx": """Output ONLY a valid JSON list of up to {k_max} constructions from the tiles. No reasoning, explanations, or extra text.
 
-RESPONSE_FORMAT = {
-    "type": "json_schema",
-    "json_schema": {
-        "name": "constructions_idx",
-        "strict": True,
-        "schema": {
-            "type": "array",
-            "maxItems": K_MAX,
-            "items": {
-                "type": "object",
-                "additionalProperties": False,
-                "required": ["idx"],
-                "properties": {
-                    "idx": {
-                        "type": "array",
-                        "items": {"type": "integer"},
-                        "minItems": 1
+Each construction is {{"idx": [i, j, ...]}}: 0-based positions into the tiles, in concatenation order, each position used at most once.
+The tiles at those positions, joined, with 'Ġ'->' ' and 'Ċ'->'\\n', then stripped and lowercased, must spell a dictionary word.
+Example: tiles=["ky", "Ġin", "x"] -> {{"idx": [1, 0]}} spells "inky".
+If none, output [].
+""",
+}
+
+SYSTEM_PROMPT = PROMPT_VARIANTS["default"].format(k_max=K_MAX)
+
+
+def response_format(k_max: int = K_MAX) -> Dict[str, Any]:
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": "constructions_idx",
+            "strict": True,
+            "schema": {
+                "type": "array",
+                "maxItems": k_max,
+                "items": {
+                    "type": "object",
+                    "additionalProperties": False,
+                    "required": ["idx"],
+                    "properties": {
+                        "idx": {
+                            "type": "array",
+                            "items": {"type": "integer"},
+                            "minItems": 1
+                        }
                     }
                 }
             }
         }
     }
-}
 
-def normalize_concat_to_word(concat: str) -> str:
-    return concat.replace("Ġ", " ").replace("Ċ", "\n").strip().lower()
+
+RESPONSE_FORMAT = response_format(K_MAX)
+
+BATCH_SYSTEM_PROMPT_TEMPLATE = """You get several independent rounds, each with its own tiles list. Output ONLY valid JSON. No reasoning, explanations, or extra text.
+
+For every round, find up to {k_max} dictionary words that can be built by concatenating some of that round's tiles.
+Each construction is {{"idx": [i, j, ...]}}: 0-based positions into THAT round's tiles, in concatenation order, each position used at most once.
+Output {{"rounds": [{{"round": <round number from the input>, "items": [{{"idx": [...]}}, ...]}}, ...]}} with exactly one entry per input round, in input order. Use "items": [] if a round has no constructions.
+"""
+BATCH_SYSTEM_PROMPT = BATCH_SYSTEM_PROMPT_TEMPLATE.format(k_max=K_MAX)
+
+
+def make_config(
+    model: Optional[str] = None,
+    temperature: Optional[float] = None,
+    max_tokens: Optional[int] = None,
+    k_max: Optional[int] = None,
+    prompt: str = "default",
+    budget: Optional[Dict[str, Any]] = None,
+    encoding: str = "idx",
+) -> Dict[str, Any]:
+    """
+    Everything that shapes a model response, with the module constants as defaults.
+    request_model, run_round, iter_round_results and config_hash all take this dict.
+    With a `budget` (see make_budget) max_tokens is only the cap of per-round budgets.
+    A non-idx `encoding` (see response_encodings.py) brings its own prompt and schema.
+    """
+    k = K_MAX if k_max is None else k_max
+    cfg = {
+        "model": MODEL_NAME if model is None else model,
+        "temperature": TEMPERATURE if temperature is None else temperature,
+        "max_tokens": MAX_TOKENS if max_tokens is None else max_tokens,
+        "k_max": k,
+        "system_prompt": PROMPT_VARIANTS[prompt].format(k_max=k),
+        "response_format": response_format(k),
+    }
+    # Only present when adaptive, so fixed-budget config hashes (and journals) are unchanged
+    if budget is not None:
+        cfg["budget"] = budget
+    if encoding != "idx":
+        cfg["encoding"] = encoding
+        cfg["system_prompt"] = ENCODING_PROMPTS[encoding].format(k_max=k)
+        cfg["response_format"] = {
+            "type": "json_schema",
+            "json_schema": {"name": f"constructions_{encoding}", "strict": True, "schema": encoding_schema(encoding, k)},
+        }
+    return cfg
+
+
+def make_budget(
+    slack: float = BUDGET_SLACK,
+    reserve: int = BUDGET_RESERVE,
+    min_tokens: int = BUDGET_MIN,
+) -> Dict[str, Any]:
+    """Adaptive max_tokens settings for make_config (see token_budget.round_budget)."""
+    return {"slack": slack, "reserve": reserve, "min_tokens": min_tokens}
 
 
-def iter_jsonl(path: str):
-    with open(path, "r", encoding="utf-8") as f:
-        for line in f:
-            line = line.strip()
-            if line:
-                yield json.loads(line)
+def round_max_tokens(r: Dict[str, Any], cfg: Dict[str, Any]) -> int:
+    """cfg["max_tokens"], or with an adaptive budget the round's own estimate capped at it."""
+    b = cfg.get("budget")
+    if b is None:
+        return cfg["max_tokens"]
+    return round_budget(r, cfg["k_max"], b["slack"], b["reserve"], b["min_tokens"], cfg["max_tokens"],
+                        encoding=cfg.get("encoding", "idx"))
 
 
-def call_model(client: OpenAI, tiles: List[str]) -> Tuple[List[Dict[str, Any]], float, str]:
+def round_messages(cfg: Dict[str, Any], tiles: List[str]) -> List[Dict[str, str]]:
+    """Chat messages of a single-round request."""
     user_payload = {"tiles": tiles}
     user_text = json.dumps(user_payload, ensure_ascii=False)
+    return [
+        {"role": "system", "content": cfg["system_prompt"]},
+        {"role": "user", "content": user_text},
+    ]
+
+
+def batch_response_format(n_rounds: int, k_max: int = K_MAX) -> Dict[str, Any]:
+    """Strict schema for a batch of n_rounds rounds; items reuse the single-round idx objects."""
+    item_schema = response_format(k_max)["json_schema"]["schema"]["items"]
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": "constructions_idx_batch",
+            "strict": True,
+            "schema": {
+                "type": "object",
+                "additionalProperties": False,
+                "required": ["rounds"],
+                "properties": {
+                    "rounds": {
+                        "type": "array",
+                        "minItems": n_rounds,
+                        "maxItems": n_rounds,
+                        "items": {
+                            "type": "object",
+                            "additionalProperties": False,
+                            "required": ["round", "items"],
+                            "properties": {
+                                "round": {"type": "integer"},
+                                "items": {"type": "array", "maxItems": k_max, "items": item_schema},
+                            },
+                        },
+                    }
+                },
+            },
+        },
+    }
+
+
+def make_client(max_connections: int = CONCURRENCY) -> OpenAI:
+    """
+    One OpenAI client for the whole run. Every worker thread shares its
+    keep-alive connection pool, sized to the most requests ever in flight.
+    """
+    import importlib
+
+    # openai builds ship either httpx or httpx2; the limits must come from the one its client is built on
+    for name in ("httpx", "httpx2"):
+        try:
+            http = importlib.import_module(name)
+        except ImportError:
+            continue
+        if issubclass(DefaultHttpxClient, http.Client):
+            limits = http.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+            return OpenAI(base_url=BASE_URL, api_key="lm-studio", http_client=DefaultHttpxClient(limits=limits))
+
+    print(f"Warning: no httpx/httpx2 found for this openai build; using the default connection pool "
+          f"instead of {max_connections} connections")
+    return OpenAI(base_url=BASE_URL, api_key="lm-studio")
+
+
+def _percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def _read_stream(
+    stream,
+    t_send: float,
+    timings: Optional[Dict[str, Any]],
+    parser: Optional[IdxStreamParser] = None,
+) -> str:
+    """
+    Drains a streamed completion and returns the content. Every chunk that
+    carries text (content or reasoning) counts as one decoded token for timing.
+    With a `parser`, content is fed to it as it arrives and the stream is closed
+    (generation cancelled) as soon as it asks to stop; the content read so far
+    is returned and timings["cancelled"] records why.
+    """
+    pieces: List[str] = []
+    arrivals: List[float] = []
+    usage = None
+    cancelled = None
+    finish_reason = None
+    for chunk in stream:
+        if getattr(chunk, "usage", None):
+            usage = chunk.usage
+        if not chunk.choices:
+            continue
+        finish_reason = getattr(chunk.choices[0], "finish_reason", None) or finish_reason
+        delta = chunk.choices[0].delta
+        text = delta.content or ""
+        reasoning = getattr(delta, "reasoning_content", None) or getattr(delta, "reasoning", None)
+        if text or reasoning:
+            arrivals.append(time.perf_counter())
+        if text:
+            pieces.append(text)
+            if parser is not None:
+                parser.feed(text)
+                if parser.should_stop:
+                    cancelled = parser.stop_reason
+                    # Closing the response drops the connection; the server stops generating
+                    close = getattr(stream, "close", None)
+                    if close is not None:
+                        close()
+                    break
+
+    if timings is not None and cancelled:
+        timings["cancelled"] = cancelled
+    if timings is not None and finish_reason == "length":
+        timings["truncated"] = True
+    if timings is not None and arrivals:
+        out_tokens = usage.completion_tokens if usage is not None else len(arrivals)
+        timings["ttft_ms"] = (arrivals[0] - t_send) * 1000
+        gaps = [(b - a) * 1000 for a, b in zip(arrivals, arrivals[1:])]
+        if gaps:
+            timings["itl_ms_mean"] = sum(gaps) / len(gaps)
+            timings["itl_ms_p95"] = _percentile(gaps, 0.95)
+        decode_s = arrivals[-1] - arrivals[0]
+        if decode_s > 0 and out_tokens > 1:
+            timings["decode_tps"] = (out_tokens - 1) / decode_s
+        timings["output_tokens"] = out_tokens
+        if usage is not None:
+            timings["prompt_tokens"] = usage.prompt_tokens
+    return "".join(pieces)
+
+
+def request_model(
+    client: OpenAI,
+    tiles: List[str],
+    stream: bool = False,
+    timings: Optional[Dict[str, Any]] = None,
+    parser: Optional[IdxStreamParser] = None,
+    config: Optional[Dict[str, Any]] = None,
+    cache: Optional[ResponseCache] = None,
+    max_tokens: Optional[int] = None,
+) -> Tuple[str, float]:
+    """
+    Sends one round and returns (raw_content, seconds). Does not parse.
+    `config` (see make_config) overrides model / sampling / prompt.
+    With a `cache`, a cached answer is returned without a request (timings["cache"] = "hit").
+    If `timings` is given it is filled with serialize_ms / network_ms, token
+    counts, and with stream=True also ttft_ms, itl_ms_* and decode_tps.
+    With stream=True a `parser` may cancel the response early (see _read_stream).
+    `max_tokens` overrides cfg["max_tokens"] (see round_max_tokens).
+    """
+    cfg = config or make_config()
+    t_ser = time.perf_counter()
+    request = dict(
+        model=cfg["model"],
+        messages=round_messages(cfg, tiles),
+        temperature=cfg["temperature"],
+        max_tokens=cfg["max_tokens"] if max_tokens is None else max_tokens,
+        response_format=cfg["response_format"],
+    )
 
     t0 = time.perf_counter()
-    resp = client.chat.completions.create(
-        model=MODEL_NAME,
+    if cache is not None:
+        cached = cache.get(request)
+        if timings is not None:
+            timings["cache"] = "miss" if cached is None else "hit"
+        if cached is not None:
+            count("cache_hit")
+            return cached, time.perf_counter() - t0
+
+    if stream:
+        raw = _read_stream(
+            client.chat.completions.create(**request, stream=True, stream_options={"include_usage": True}),
+            t0,
+            timings,
+            parser,
+        )
+        dt = time.perf_counter() - t0
+    else:
+        resp = client.chat.completions.create(**request)
+        dt = time.perf_counter() - t0
+        raw = resp.choices[0].message.content or ""
+        usage = getattr(resp, "usage", None)
+        if timings is not None and getattr(resp.choices[0], "finish_reason", None) == "length":
+            timings["truncated"] = True
+        if timings is not None and usage is not None:
+            timings["output_tokens"] = usage.completion_tokens
+            timings["prompt_tokens"] = usage.prompt_tokens
+
+    add_time("serialize", t0 - t_ser)
+    add_time("request", dt)
+    if timings is not None:
+        timings["serialize_ms"] = (t0 - t_ser) * 1000
+        timings["network_ms"] = dt * 1000
+        if "ttft_ms" in timings:
+            add_time("ttft", timings["ttft_ms"] / 1000)
+        if "output_tokens" in timings:
+            observe("output_tokens", timings["output_tokens"])
+    # A cancelled stream is only a prefix of the answer
+    if cache is not None and not (parser is not None and parser.should_stop):
+        cache.put(request, raw)
+    return raw, dt
+
+
+def parse_model_output(raw: str) -> List[Dict[str, Any]]:
+    parsed = json.loads(raw)
+    if not isinstance(parsed, list):
+        raise ValueError(f"Expected JSON list, got {type(parsed)}. Raw:\n{raw}")
+    return parsed
+
+
+def parse_or_salvage(raw: str) -> Tuple[List[Any], bool]:
+    """
+    parse_model_output, falling back to the complete items of a truncated or
+    cancelled list. Returns (outputs, salvaged).
+    """
+    try:
+        return parse_model_output(raw), False
+    except (json.JSONDecodeError, ValueError):
+        items = salvage_items(raw)
+        if not items:
+            raise
+        return items, True
+
+
+def call_model(
+    client: OpenAI,
+    tiles: List[str],
+    cache: Optional[ResponseCache] = None,
+) -> Tuple[List[Dict[str, Any]], float, str]:
+    raw, dt = request_model(client, tiles, cache=cache)
+    return parse_model_output(raw), dt, raw
+
+
+def request_model_batch(
+    client: OpenAI,
+    tiles_list: List[List[str]],
+    config: Optional[Dict[str, Any]] = None,
+    cache: Optional[ResponseCache] = None,
+    max_tokens: Optional[int] = None,
+) -> Tuple[str, float, bool]:
+    """
+    Sends several rounds in one request; the decode budget scales with the batch size
+    (or is `max_tokens`, e.g. the sum of the rounds' adaptive budgets).
+    Returns (raw_content, seconds, cache_hit).
+    """
+    cfg = config or make_config()
+    user_payload = {"rounds": [{"round": j, "tiles": tiles} for j, tiles in enumerate(tiles_list)]}
+    user_text = json.dumps(user_payload, ensure_ascii=False)
+
+    request = dict(
+        model=cfg["model"],
         messages=[
-            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "system", "content": BATCH_SYSTEM_PROMPT_TEMPLATE.format(k_max=cfg["k_max"])},
             {"role": "user", "content": user_text},
         ],
-        temperature=TEMPERATURE,
-        max_tokens=MAX_TOKENS,
-        response_format=RESPONSE_FORMAT,
+        temperature=cfg["temperature"],
+        max_tokens=cfg["max_tokens"] * len(tiles_list) if max_tokens is None else max_tokens,
+        response_format=batch_response_format(len(tiles_list), cfg["k_max"]),
     )
+
+    t0 = time.perf_counter()
+    if cache is not None:
+        cached = cache.get(request)
+        if cached is not None:
+            return cached, time.perf_counter() - t0, True
+    resp = client.chat.completions.create(**request)
     dt = time.perf_counter() - t0
 
     raw = resp.choices[0].message.content or ""
+    if cache is not None:
+        cache.put(request, raw)
+    return raw, dt, False
+
+
+def split_batch_output(raw: str, n_rounds: int) -> List[Any]:
+    """
+    Splits a batched response into per-round item lists (local tile indices).
+    Entries are matched by their "round" key, falling back to position; a round
+    the model skipped comes back as None.
+    """
     parsed = json.loads(raw)
-    if not isinstance(parsed, list):
-        raise ValueError(f"Expected JSON list, got {type(parsed)}. Raw:\n{raw}")
-    return parsed, dt, raw
+    entries = parsed.get("rounds") if isinstance(parsed, dict) else None
+    if not isinstance(entries, list):
+        raise ValueError(f"Expected {{\"rounds\": [...]}}, got {type(parsed)}. Raw:\n{raw}")
+
+    out: List[Any] = [None] * n_rounds
+    for pos, e in enumerate(entries):
+        if not isinstance(e, dict) or not isinstance(e.get("items"), list):
+            continue
+        j = e.get("round")
+        if not isinstance(j, int) or not 0 <= j < n_rounds or out[j] is not None:
+            j = pos
+        if 0 <= j < n_rounds and out[j] is None:
+            out[j] = e["items"]
+    return out
+
+
+def config_hash(batch_size: int = 1, max_invalid_run: int = 0, config: Optional[Dict[str, Any]] = None) -> str:
+    """
+    Short hash of everything that shapes a model response.
+    Journaled rounds are only reused when this matches.
+    """
+    config = dict(config or make_config())
+    if batch_size > 1:
+        # Batched answers come from a different prompt; keep their journals apart
+        config["batch_size"] = batch_size
+        config["batch_system_prompt"] = BATCH_SYSTEM_PROMPT_TEMPLATE.format(k_max=config["k_max"])
+    if max_invalid_run:
+        # Cancelling after invalid runs can drop items a full response would have had
+        config["max_invalid_run"] = max_invalid_run
+    blob = json.dumps(config, sort_keys=True, ensure_ascii=False).encode("utf-8")
+    return hashlib.sha256(blob).hexdigest()[:16]
 
 
 def evaluate_outputs(
@@ -97,111 +476,699 @@ def evaluate_outputs(
     all_solutions: Set[str],
     targets: Set[str],
 ) -> Dict[str, Any]:
-    fmt_err = 0
-    pred_words = set()
+    """Per-round idx metrics (see eval_engine.evaluate_idx)."""
+    return evaluate_idx(outputs, RoundContext(tiles, all_solutions, targets), K_MAX)
 
-    index_oob = 0
-    index_reuse = 0
 
-    for it in outputs[:K_MAX]:
-        if not isinstance(it, dict) or "idx" not in it or not isinstance(it["idx"], list):
-            fmt_err += 1
-            continue
-        if any(not isinstance(x, int) for x in it["idx"]):
-            fmt_err += 1
-            continue
+def score_response(
+    r: Dict[str, Any],
+    i: int,
+    raw: str,
+    latency_ms: Any,
+    error: Any = None,
+    timings: Optional[Dict[str, Any]] = None,
+    ctx: Optional[RoundContext] = None,
+    k_max: int = K_MAX,
+    encoding: str = "idx",
+) -> Dict[str, Any]:
+    """
+    Turns a raw model response for round `r` into per-round metrics.
+    Shared by live runs, --resume and --replay so all three score identically.
+    Request-side `timings` (see request_model) are merged in, plus parse_ms / evaluate_ms.
+    Pass a reused `ctx` for r when scoring many responses to the same round.
+    Non-idx `encoding`s are decoded to idx items first (see response_encodings.py).
+    """
+    round_id = r.get("round_id", i)
+    if error is not None:
+        count("request_errors")
+        return {"round_id": round_id, "latency_ms": None, "error": error}
 
-        idx_list = it["idx"]
+    if ctx is None:
+        ctx = RoundContext(r["tiles"], r.get("all_solutions", []), r.get("targets", []),
+                           tilings=r.get("idx_tilings"))
+
+    try:
+        t0 = time.perf_counter()
+        if encoding == "idx":
+            outputs, salvaged = parse_or_salvage(raw)
+        else:
+            outputs, salvaged = decode_encoding(encoding, raw, r["tiles"])
+        t1 = time.perf_counter()
+        metrics = evaluate_idx(outputs, ctx, k_max, words_ok=encoding == "words")
+        t2 = time.perf_counter()
+        metrics.update({
+            "round_id": round_id,
+            "latency_ms": latency_ms,
+        })
+        if encoding != "idx":
+            metrics["encoding"] = encoding
+        if salvaged:
+            metrics["salvaged"] = True
+        if timings:
+            metrics.update(timings)
+        metrics["parse_ms"] = (t1 - t0) * 1000
+        metrics["evaluate_ms"] = (t2 - t1) * 1000
+        add_time("parse", t1 - t0)
+        add_time("evaluate", t2 - t1)
+        observe("n_valid_unique", metrics["n_valid_unique"])
+    except Exception as e:
+        count("score_errors")
+        metrics = {
+            "round_id": round_id,
+            "latency_ms": None,
+            "error": str(e),
+        }
+    return metrics
+
+
+def run_round(
+    client: OpenAI,
+    r: Dict[str, Any],
+    i: int,
+    stream: bool = False,
+    max_invalid_run: Optional[int] = None,
+    config: Optional[Dict[str, Any]] = None,
+    cache: Optional[ResponseCache] = None,
+) -> Tuple[Dict[str, Any], str]:
+    """
+    Sends one round to the model and scores it.
+    Runs inside a worker thread, so evaluation overlaps with other in-flight requests.
+    With stream=True and max_invalid_run set (0 = K_MAX only), the stream is
+    cancelled once K_MAX items have closed or after that many invalid items in a row.
+    Cache hits are scored with latency_ms None, so they don't skew latency stats.
+    Returns (metrics, raw_model_output).
+    """
+    cfg = config or make_config()
+    timings: Dict[str, Any] = {}
+    max_tokens = None
+    if "budget" in cfg:
+        max_tokens = round_max_tokens(r, cfg)
+        timings["max_tokens"] = max_tokens
+        timings["prompt_tokens_est"] = default_counter().count_messages(round_messages(cfg, r["tiles"]))
+    parser = None
+    if stream and max_invalid_run is not None:
+        parser = IdxStreamParser(r["tiles"], k_max=cfg["k_max"], max_invalid_run=max_invalid_run)
+    try:
+        raw, dt = request_model(client, r["tiles"], stream=stream, timings=timings, parser=parser,
+                                config=cfg, cache=cache, max_tokens=max_tokens)
+    except Exception as e:
+        return score_response(r, i, "", None, error=str(e)), ""
+    latency_ms = None if timings.get("cache") == "hit" else int(dt * 1000)
+    return score_response(r, i, raw, latency_ms, timings=timings, k_max=cfg["k_max"],
+                          encoding=cfg.get("encoding", "idx")), raw
 
-        # bounds check
-        if any(x < 0 or x >= len(tiles) for x in idx_list):
-            index_oob += 1
-            continue
 
-        # multiplicity check (each position usable once)
-        if len(set(idx_list)) != len(idx_list):
-            index_reuse += 1
+def run_batch(
+    client: OpenAI,
+    batch: List[Dict[str, Any]],
+    start_i: int,
+    config: Optional[Dict[str, Any]] = None,
+    cache: Optional[ResponseCache] = None,
+) -> List[Tuple[Dict[str, Any], str]]:
+    """
+    Sends len(batch) rounds in one request and scores each of them.
+    Per-round latency_ms is the request latency divided by the batch size;
+    the per-round raw is that round's item list, so journals replay per round.
+    """
+    cfg = config or make_config()
+    n = len(batch)
+    max_tokens = sum(round_max_tokens(r, cfg) for r in batch) if "budget" in cfg else None
+    try:
+        raw, dt, hit = request_model_batch(client, [r["tiles"] for r in batch], cfg, cache, max_tokens)
+        per_round = split_batch_output(raw, n)
+    except Exception as e:
+        return [(score_response(r, start_i + j, "", None, error=str(e)), "") for j, r in enumerate(batch)]
+
+    results = []
+    for j, (r, items) in enumerate(zip(batch, per_round)):
+        if items is None:
+            metrics = score_response(r, start_i + j, "", None, error="round missing from batched response")
+            results.append((metrics, ""))
             continue
+        round_raw = json.dumps(items, ensure_ascii=False)
+        metrics = score_response(r, start_i + j, round_raw, None if hit else int(dt * 1000 / n), k_max=cfg["k_max"])
+        metrics.update({"batch_size": n, "batch_latency_ms": None if hit else int(dt * 1000)})
+        if cache is not None:
+            metrics["cache"] = "hit" if hit else "miss"
+        results.append((metrics, round_raw))
+    return results
 
-        used_tokens = [tiles[i] for i in idx_list]
-        concat = "".join(used_tokens)
-        w = normalize_concat_to_word(concat)
-        pred_words.add(w)
 
-    valid_hits = pred_words.intersection(all_solutions)
-    target_hits = pred_words.intersection(targets)
+def iter_ordered(
+    fn: Callable[[Any, int], Any],
+    items: Iterable[Any],
+    concurrency: int = CONCURRENCY,
+) -> Iterator[Tuple[int, Any]]:
+    """
+    Runs fn(item, i) with up to `concurrency` calls in flight and yields (i, result)
+    in input order. Items are pulled lazily, only when a slot frees up.
+    """
+    concurrency = max(1, concurrency)
+    pending: deque = deque()
 
-    n_pred = len(pred_words)
-    n_valid = len(valid_hits)
-    n_solutions = max(1, len(all_solutions))
-    n_targets = max(1, len(targets))
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        items_iter = enumerate(items)
+        for i, item in items_iter:
+            pending.append((i, pool.submit(fn, item, i)))
+            if len(pending) >= concurrency:
+                break
 
-    precision = (n_valid / n_pred) if n_pred else 0.0
-    full_recall = (n_valid / n_solutions) if n_solutions else 0.0
-    target_recall = (len(target_hits) / n_targets) if n_targets else 0.0
+        while pending:
+            i, fut = pending.popleft()
+            result = fut.result()
+            # Refill the freed slot before handing the result back
+            nxt = next(items_iter, None)
+            if nxt is not None:
+                pending.append((nxt[0], pool.submit(fn, nxt[1], nxt[0])))
+            yield i, result
 
-    return {
-        "n_output_items_raw": len(outputs),
-        "n_pred_unique": n_pred,
-        "n_valid_unique": n_valid,
-        "n_solutions": len(all_solutions),
-        "n_targets": len(targets),
-        "precision": precision,
-        "full_recall": full_recall,
-        "target_recall": target_recall,
-        "format_errors": fmt_err,
-        "index_oob": index_oob,
-        "index_reuse": index_reuse,
+
+def iter_batches(items: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    it = iter(items)
+    while True:
+        batch = list(itertools.islice(it, size))
+        if not batch:
+            return
+        yield batch
+
+
+def iter_round_results(
+    client: OpenAI,
+    rounds: Iterable[Dict[str, Any]],
+    concurrency: int = CONCURRENCY,
+    batch_size: int = 1,
+    stream: bool = False,
+    max_invalid_run: Optional[int] = None,
+    tuner: Optional[AIMDTuner] = None,
+    config: Optional[Dict[str, Any]] = None,
+    cache: Optional[ResponseCache] = None,
+) -> Iterator[Tuple[int, Dict[str, Any], str]]:
+    """
+    Keeps up to `concurrency` requests in flight and yields (i, metrics, raw) in round order.
+    With batch_size > 1 every request carries batch_size rounds (see run_batch).
+    stream=True streams single-round responses for TTFT / decode-rate metrics;
+    max_invalid_run enables early cancellation (see run_round).
+    With a `tuner`, its live AIMD limit replaces the fixed `concurrency`.
+    `config` (see make_config) applies to every request; `cache` answers repeats.
+    """
+    def run(fn: Callable[[Any, int], Any], items: Iterable[Any]) -> Iterator[Tuple[int, Any]]:
+        if tuner is not None:
+            return iter_adaptive(fn, items, tuner)
+        return iter_ordered(fn, items, concurrency)
+
+    if batch_size <= 1:
+        def fn_round(r: Dict[str, Any], i: int) -> Tuple[Dict[str, Any], str]:
+            return run_round(client, r, i, stream, max_invalid_run, config, cache)
+
+        for i, (metrics, raw) in run(fn_round, rounds):
+            yield i, metrics, raw
+        return
+
+    def fn(batch: List[Dict[str, Any]], b: int) -> List[Tuple[Dict[str, Any], str]]:
+        return run_batch(client, batch, b * batch_size, config, cache)
+
+    for b, results in run(fn, iter_batches(rounds, batch_size)):
+        for j, (metrics, raw) in enumerate(results):
+            yield b * batch_size + j, metrics, raw
+
+
+# Per-round keys filled by request_model (see its docstring)
+REQUEST_TIMING_KEYS = (
+    "serialize_ms", "network_ms", "ttft_ms", "itl_ms_mean", "itl_ms_p95",
+    "decode_tps", "output_tokens", "prompt_tokens", "cancelled", "cache",
+    "max_tokens", "prompt_tokens_est", "truncated",
+)
+# Per-round timing keys reported (when present) in the summary
+PHASE_KEYS = (
+    "serialize_ms", "network_ms", "ttft_ms", "itl_ms_mean", "itl_ms_p95",
+    "decode_tps", "output_tokens", "max_tokens", "parse_ms", "evaluate_ms",
+)
+
+
+def journal_record(metrics: Dict[str, Any], raw: str, cfg_hash: str) -> Dict[str, Any]:
+    rec = {
+        "round_id": metrics["round_id"],
+        "config_hash": cfg_hash,
+        "latency_ms": metrics.get("latency_ms"),
+        "raw": raw,
     }
+    # Request-side timings can't be re-measured offline, so keep them for --replay
+    timings = {k: metrics[k] for k in REQUEST_TIMING_KEYS if k in metrics}
+    if timings:
+        rec["timings"] = timings
+    if "encoding" in metrics:
+        rec["encoding"] = metrics["encoding"]
+    # Transport errors are journaled so they show up, but --resume retries them
+    if not raw and "error" in metrics:
+        rec["error"] = metrics["error"]
+    return rec
+
+
+def replay_journal(rounds_jsonl: str, journal_path: str) -> List[Dict[str, Any]]:
+    """
+    Re-scores every journaled response with the current evaluate_outputs,
+    without contacting the server.
+    """
+    index = open_rounds(rounds_jsonl)
+    # round_id -> (round, RoundContext); journals of sweeps revisit the same rounds
+    contexts: Dict[Any, Tuple[Dict[str, Any], RoundContext]] = {}
+    rows = []
+    try:
+        for rec in iter_journal(journal_path):
+            hit = contexts.get(rec["round_id"])
+            if hit is None:
+                try:
+                    r = index.get_by_id(rec["round_id"])
+                except KeyError:
+                    raise KeyError(f"Journaled round_id={rec['round_id']} not found in {rounds_jsonl}") from None
+                if len(contexts) >= 65536:
+                    contexts.clear()
+                hit = (r, RoundContext(r["tiles"], r.get("all_solutions", []), r.get("targets", []),
+                                       tilings=r.get("idx_tilings")))
+                contexts[rec["round_id"]] = hit
+            rows.append(score_response(hit[0], rec["round_id"], rec.get("raw", ""),
+                                       rec.get("latency_ms"), rec.get("error"), rec.get("timings"), hit[1],
+                                       encoding=rec.get("encoding", "idx")))
+    finally:
+        index.close()
+    return rows
+
 
+class RunningSummary:
+    """Constant-memory aggregate of per-round metrics, so endless streams can be summarized."""
+
+    def __init__(self):
+        self.n_rows = 0
+        self.n_ok = 0
+        self.n_latency = 0
+        self.sum_latency = 0.0
+        self.sum_prec = 0.0
+        self.sum_full = 0.0
+        self.sum_target = 0.0
+        self.n_salvaged = 0
+        self.n_truncated = 0
+        # Server-reported output tokens and valid words of the rounds that report them
+        self.sum_output_tokens = 0
+        self.sum_valid_counted = 0
+        # Offline prompt token estimate vs the server's count (adaptive budgets only)
+        self.n_prompt_est = 0
+        self.sum_prompt_est_err = 0.0
+        # Only rounds with precomputed idx_tilings report canonical vs alternate tilings
+        self.n_valid_canonical = 0
+        self.n_valid_alternate = 0
+        self.cancelled: Counter = Counter()
+        # Optional per-phase timings, averaged over the rounds that report them
+        self.phase_sums: Dict[str, float] = {}
+        self.phase_counts: Dict[str, int] = {}
+
+    def add(self, metrics: Dict[str, Any]) -> None:
+        self.n_rows += 1
+        # Aggregate summary ignores errored rows
+        if "error" in metrics:
+            return
+        self.n_ok += 1
+        if metrics["latency_ms"] is not None:
+            self.n_latency += 1
+            self.sum_latency += metrics["latency_ms"]
+        self.sum_prec += metrics["precision"]
+        self.sum_full += metrics["full_recall"]
+        self.sum_target += metrics["target_recall"]
+        if metrics.get("salvaged"):
+            self.n_salvaged += 1
+        if metrics.get("truncated"):
+            self.n_truncated += 1
+        if metrics.get("output_tokens") is not None:
+            self.sum_output_tokens += metrics["output_tokens"]
+            self.sum_valid_counted += metrics["n_valid_unique"]
+        if metrics.get("prompt_tokens_est") is not None and metrics.get("prompt_tokens"):
+            self.n_prompt_est += 1
+            self.sum_prompt_est_err += abs(metrics["prompt_tokens_est"] - metrics["prompt_tokens"]) / metrics["prompt_tokens"]
+        self.n_valid_canonical += metrics.get("n_valid_canonical", 0)
+        self.n_valid_alternate += metrics.get("n_valid_alternate", 0)
+        if metrics.get("cancelled"):
+            self.cancelled[metrics["cancelled"]] += 1
+        for k in PHASE_KEYS:
+            v = metrics.get(k)
+            if v is not None:
+                self.phase_sums[k] = self.phase_sums.get(k, 0.0) + v
+                self.phase_counts[k] = self.phase_counts.get(k, 0) + 1
+
+    def print(self, wall_s: float = 0.0, concurrency: int = 0, n_timed: int = 0) -> None:
+        ok = self.n_ok
+        if not ok:
+            return
+        print("\n=== Summary (successful rounds) ===")
+        print(f"Rounds: {ok}/{self.n_rows}")
+        if concurrency:
+            print(f"Concurrency: {concurrency}")
+        if wall_s > 0:
+            print(f"Wall time: {wall_s:.1f} s ({n_timed / wall_s:.2f} rounds/s)")
+        # Cache hits and resumed rounds without a latency are left out
+        if self.n_latency:
+            print(f"Avg latency: {self.sum_latency / self.n_latency:.1f} ms")
+        else:
+            print("Avg latency: n/a (no timed rounds)")
+        print(f"Avg precision: {self.sum_prec / ok:.3f}")
+        print(f"Avg full recall: {self.sum_full / ok:.3f}")
+        print(f"Avg target recall: {self.sum_target / ok:.3f}")
+        n_tiled = self.n_valid_canonical + self.n_valid_alternate
+        if n_tiled:
+            print(f"Valid via canonical tiling: {self.n_valid_canonical}/{n_tiled} "
+                  f"({self.n_valid_canonical / n_tiled:.1%}; rest only via alternate tilings)")
+        if self.phase_counts:
+            print("Avg phases: " + ", ".join(
+                f"{k}={self.phase_sums[k] / self.phase_counts[k]:.2f}" for k in PHASE_KEYS if k in self.phase_counts
+            ))
+        if self.cancelled:
+            print(f"Cancelled early: {sum(self.cancelled.values())} "
+                  f"({', '.join(f'{k}={v}' for k, v in sorted(self.cancelled.items()))})")
+        if self.n_salvaged:
+            print(f"Salvaged from truncated output: {self.n_salvaged}")
+        if self.n_truncated:
+            print(f"Stopped at max_tokens: {self.n_truncated}")
+        if self.sum_valid_counted:
+            print(f"Output tokens per valid word: {self.sum_output_tokens / self.sum_valid_counted:.2f}")
+        if self.n_prompt_est:
+            print(f"Offline prompt token estimate: {self.sum_prompt_est_err / self.n_prompt_est:.1%} mean abs error")
+
+
+def print_summary(
+    rows: List[Dict[str, Any]],
+    wall_s: float = 0.0,
+    concurrency: int = 0,
+    n_timed: int = 0,
+) -> None:
+    summary = RunningSummary()
+    for r in rows:
+        summary.add(r)
+    summary.print(wall_s, concurrency, n_timed)
+
+
+def compare_batch_sizes(rounds: List[Dict[str, Any]], batch_sizes: List[int], concurrency: int) -> None:
+    """Runs the same rounds once per batch size B and prints per-round latency and throughput."""
+    client = make_client(concurrency)
+
+    table = []
+    for bs in batch_sizes:
+        summary = RunningSummary()
+        t_start = time.perf_counter()
+        for _, metrics, _ in iter_round_results(client, rounds, concurrency, bs):
+            summary.add(metrics)
+        wall_s = time.perf_counter() - t_start
+        table.append((bs, summary, wall_s))
+        print(f"B={bs}: {summary.n_rows} rounds in {wall_s:.1f} s")
+
+    print("\n=== Batch size comparison ===")
+    print(f"{'B':>4} {'rounds/s':>9} {'ms/round':>9} {'prec':>6} {'recall':>7} {'target':>7} {'errors':>7}")
+    for bs, sm, wall_s in table:
+        ok = max(1, sm.n_ok)
+        print(f"{bs:>4} {sm.n_rows / wall_s:>9.2f} {sm.sum_latency / ok:>9.1f} {sm.sum_prec / ok:>6.3f} "
+              f"{sm.sum_full / ok:>7.3f} {sm.sum_target / ok:>7.3f} {sm.n_rows - sm.n_ok:>7}")
+
+
+def compare_budgets(
+    rounds: List[Dict[str, Any]],
+    budget: Dict[str, Any],
+    concurrency: int,
+    stream: bool = False,
+    encoding: str = "idx",
+) -> None:
+    """
+    Runs the same rounds with the fixed MAX_TOKENS and with per-round adaptive
+    budgets (see token_budget.py), then prints latency saved and recall impact.
+    """
+    client = make_client(concurrency)
+
+    table = []
+    for label, cfg in (("fixed", make_config(encoding=encoding)),
+                       ("adaptive", make_config(budget=budget, encoding=encoding))):
+        summary = RunningSummary()
+        latencies: List[float] = []
+        max_tokens_sum = 0
+        t_start = time.perf_counter()
+        for _, metrics, _ in iter_round_results(client, rounds, concurrency, stream=stream, config=cfg):
+            summary.add(metrics)
+            if metrics.get("latency_ms") is not None:
+                latencies.append(metrics["latency_ms"])
+            max_tokens_sum += metrics.get("max_tokens", cfg["max_tokens"])
+        wall_s = time.perf_counter() - t_start
+        table.append((label, summary, latencies, max_tokens_sum / max(1, summary.n_rows), wall_s))
+        print(f"{label}: {summary.n_rows} rounds in {wall_s:.1f} s")
+
+    print("\n=== max_tokens budget comparison ===")
+    print(f"{'budget':>8} {'max_tok':>8} {'out_tok':>8} {'ms mean':>8} {'ms p95':>8} {'prec':>6} "
+          f"{'recall':>7} {'target':>7} {'trunc':>6} {'errors':>7}")
+    stats = {}
+    for label, sm, lat, mean_max_tokens, wall_s in table:
+        ok = max(1, sm.n_ok)
+        mean_ms = sum(lat) / len(lat) if lat else 0.0
+        p95_ms = _percentile(lat, 0.95) if lat else 0.0
+        out_tok = sm.phase_sums.get("output_tokens", 0.0) / max(1, sm.phase_counts.get("output_tokens", 0))
+        stats[label] = (mean_ms, p95_ms, sm.sum_prec / ok, sm.sum_full / ok, sm.sum_target / ok)
+        print(f"{label:>8} {mean_max_tokens:>8.0f} {out_tok:>8.1f} {mean_ms:>8.1f} {p95_ms:>8.1f} "
+              f"{sm.sum_prec / ok:>6.3f} {sm.sum_full / ok:>7.3f} {sm.sum_target / ok:>7.3f} "
+              f"{sm.n_truncated:>6} {sm.n_rows - sm.n_ok:>7}")
+
+    (f_mean, f_p95, f_prec, f_full, f_target), (a_mean, a_p95, a_prec, a_full, a_target) = stats["fixed"], stats["adaptive"]
+    if f_mean > 0:
+        print(f"Latency saved: {f_mean - a_mean:.1f} ms/round mean ({(f_mean - a_mean) / f_mean:.1%}), "
+              f"{f_p95 - a_p95:.1f} ms p95")
+    print(f"Recall impact: full {a_full - f_full:+.3f}, target {a_target - f_target:+.3f}, "
+          f"precision {a_prec - f_prec:+.3f}")
+
+
+def compare_encodings(
+    rounds: List[Dict[str, Any]],
+    encodings: List[str],
+    concurrency: int,
+    budget: Optional[Dict[str, Any]] = None,
+) -> None:
+    """
+    Runs the same rounds once per response encoding (see response_encodings.py)
+    and prints output tokens per valid word next to latency and recall.
+    Responses without server token usage are counted offline (token_budget.py).
+    """
+    client = make_client(concurrency)
+
+    table = []
+    for enc in encodings:
+        cfg = make_config(budget=budget, encoding=enc)
+        summary = RunningSummary()
+        latencies: List[float] = []
+        out_tokens = 0
+        n_valid = 0
+        fmt_errors = 0
+        t_start = time.perf_counter()
+        for _, metrics, raw in iter_round_results(client, rounds, concurrency, config=cfg):
+            summary.add(metrics)
+            if "error" in metrics:
+                continue
+            if metrics.get("latency_ms") is not None:
+                latencies.append(metrics["latency_ms"])
+            tokens = metrics.get("output_tokens")
+            out_tokens += default_counter().count(raw) if tokens is None else tokens
+            n_valid += metrics["n_valid_unique"]
+            fmt_errors += metrics["format_errors"]
+        wall_s = time.perf_counter() - t_start
+        table.append((enc, summary, latencies, out_tokens, n_valid, fmt_errors))
+        print(f"{enc}: {summary.n_rows} rounds in {wall_s:.1f} s")
+
+    print("\n=== Response encoding comparison ===")
+    print(f"{'encoding':>10} {'out_tok':>8} {'tok/valid':>9} {'ms mean':>8} {'ms p95':>8} {'prec':>6} "
+          f"{'recall':>7} {'target':>7} {'fmt_err':>7} {'errors':>7}")
+    for enc, sm, lat, out_tokens, n_valid, fmt_errors in table:
+        ok = max(1, sm.n_ok)
+        per_valid = f"{out_tokens / n_valid:>9.2f}" if n_valid else f"{'n/a':>9}"
+        mean_ms = sum(lat) / len(lat) if lat else 0.0
+        p95_ms = _percentile(lat, 0.95) if lat else 0.0
+        print(f"{enc:>10} {out_tokens / ok:>8.1f} {per_valid} {mean_ms:>8.1f} {p95_ms:>8.1f} "
+              f"{sm.sum_prec / ok:>6.3f} {sm.sum_full / ok:>7.3f} {sm.sum_target / ok:>7.3f} "
+              f"{fmt_errors:>7} {sm.n_rows - sm.n_ok:>7}")
+
+
+def select_rounds(args) -> List[Dict[str, Any]]:
+    """
+    The rounds to run: the first --n_rounds by default, or a --rounds range /
+    --sample / --stratify subset read directly via the offset index.
+    """
+    if not (args.rounds or args.sample):
+        return list(itertools.islice(iter_rounds_file(args.rounds_jsonl), args.n_rounds))
+
+    index = open_rounds(args.rounds_jsonl)
+    try:
+        if args.rounds:
+            start, _, stop = args.rounds.partition(":")
+            positions = index.range_positions(int(start or 0), int(stop) if stop else 2 ** 63 - 1)
+        else:
+            positions = list(range(len(index)))
+        if args.sample:
+            # Draw from the --rounds range (or the whole file) only
+            candidates = positions if args.rounds else None
+            if args.stratify:
+                positions = index.stratified_positions(args.sample, args.stratify, args.seed, candidates)
+            else:
+                positions = index.sample_positions(args.sample, args.seed, candidates)
+        return list(index.iter_positions(positions))
+    finally:
+        index.close()
 
 
 def main():
-    client = OpenAI(base_url=BASE_URL, api_key="lm-studio")
+    ap = argparse.ArgumentParser(description="Benchmark a model on precomputed token-tile rounds.")
+    ap.add_argument("--rounds_jsonl", default=ROUNDS_JSONL, help="Rounds JSONL or .rstore (see rounds_store.py)")
+    ap.add_argument("--n_rounds", type=int, default=N_ROUNDS)
+    ap.add_argument("--concurrency", type=int, default=CONCURRENCY,
+                    help="Requests kept in flight against the server")
+    ap.add_argument("--journal", default=None,
+                    help="Append per-round raw responses to this JSONL (.gz/.zst for compression)")
+    ap.add_argument("--resume", action="store_true",
+                    help="Skip rounds already in --journal (same config hash) and append the rest")
+    ap.add_argument("--replay", action="store_true",
+                    help="Re-score --journal offline with the current evaluate_outputs; no requests")
+    ap.add_argument("--fsync_every", type=int, default=32, help="Journal records per fsync")
+    # Subset selection through the byte-offset index (rounds_index.py)
+    ap.add_argument("--rounds", default=None, metavar="START:STOP",
+                    help="Only rounds with START <= round_id < STOP, e.g. 4000:4020")
+    ap.add_argument("--sample", type=int, default=0, help="Random sample of N rounds")
+    ap.add_argument("--seed", type=int, default=0, help="Seed for --sample / --stratify")
+    ap.add_argument("--stratify", choices=["n_solutions", "n_tiles"], default=None,
+                    help="With --sample: spread the sample evenly over this column's values")
+    ap.add_argument("--batch_size", type=int, default=1, help="Rounds packed into one request")
+    ap.add_argument("--stream", action="store_true",
+                    help="Stream responses and record TTFT, inter-token latency and decode tokens/s")
+    ap.add_argument("--early_stop", action="store_true",
+                    help="With --stream: cancel once K_MAX items arrived or after --max_invalid_run invalid ones")
+    ap.add_argument("--max_invalid_run", type=int, default=MAX_INVALID_RUN,
+                    help="Invalid items in a row that cancel a stream (0 = only stop at K_MAX)")
+    ap.add_argument("--autotune", action="store_true",
+                    help="Adapt in-flight requests at runtime (AIMD, starting at --concurrency) and report the knee")
+    ap.add_argument("--max_concurrency", type=int, default=32, help="Upper bound for --autotune")
+    ap.add_argument("--p95_target_ms", type=float, default=None,
+                    help="--autotune backs off above this p95 (default: 2x the best p95 seen)")
+    ap.add_argument("--lock_after", type=int, default=3,
+                    help="--autotune locks onto the knee after this many back-offs (0 = keep adapting)")
+    ap.add_argument("--cache", default=None,
+                    help="SQLite response cache; temperature-0 requests seen before are answered from it")
+    ap.add_argument("--cache_mb", type=float, default=512, help="Byte budget of --cache (LRU eviction)")
+    ap.add_argument("--batch_sizes", default=None, metavar="B1,B2,...",
+                    help="Run the selected rounds once per batch size and print a comparison table")
+    ap.add_argument("--budget", choices=["fixed", "adaptive"], default="fixed",
+                    help="max_tokens per request: MAX_TOKENS, or estimated per round from n_solutions, "
+                         "tiles and the response schema (see token_budget.py; capped at MAX_TOKENS)")
+    ap.add_argument("--budget_slack", type=float, default=BUDGET_SLACK,
+                    help="Adaptive budget = tokens of a complete answer * slack + reserve")
+    ap.add_argument("--budget_reserve", type=int, default=BUDGET_RESERVE,
+                    help="Extra adaptive tokens per round (raise for reasoning models)")
+    ap.add_argument("--compare_budgets", action="store_true",
+                    help="Run the selected rounds with fixed and adaptive max_tokens and compare latency / recall")
+    ap.add_argument("--encoding", choices=ENCODINGS, default="idx",
+                    help="Response encoding the model is asked for (see response_encodings.py)")
+    ap.add_argument("--compare_encodings", default=None, metavar="E1,E2,...",
+                    help="Run the selected rounds once per encoding and report output tokens per valid word")
+    add_instrument_args(ap)
+    args = ap.parse_args()
 
-    rows = []
-    rounds_iter = iter_jsonl(ROUNDS_JSONL)
+    if args.stratify and not args.sample:
+        ap.error("--stratify needs --sample N")
+    if args.stream and (args.batch_size > 1 or args.batch_sizes):
+        ap.error("--stream is only supported for single-round requests")
+    if args.autotune and args.batch_sizes:
+        ap.error("--autotune can't be combined with --batch_sizes")
+    if args.compare_budgets and (args.batch_sizes or args.autotune or args.batch_size > 1):
+        ap.error("--compare_budgets runs single-round requests at a fixed --concurrency")
+    if args.compare_encodings and (args.batch_sizes or args.autotune or args.batch_size > 1 or args.compare_budgets):
+        ap.error("--compare_encodings runs single-round requests at a fixed --concurrency")
+    encodings = args.compare_encodings.split(",") if args.compare_encodings else [args.encoding]
+    unknown = [e for e in encodings if e not in ENCODINGS]
+    if unknown:
+        ap.error(f"Unknown encoding(s) {', '.join(unknown)}; choose from {', '.join(ENCODINGS)}")
+    if args.encoding != "idx" and (args.batch_size > 1 or args.batch_sizes or args.early_stop):
+        ap.error("--batch_size/--batch_sizes/--early_stop parse idx objects; use them with --encoding idx")
+    budget = make_budget(args.budget_slack, args.budget_reserve)
+    if args.early_stop and not args.stream:
+        ap.error("--early_stop needs --stream")
+    max_invalid_run = args.max_invalid_run if args.early_stop else None
+
+    if (args.resume or args.replay) and not args.journal:
+        ap.error("--resume/--replay need --journal")
+
+    with instrumented(args, "benchmark"):
+        if args.replay:
+            t_start = time.perf_counter()
+            rows = replay_journal(args.rounds_jsonl, args.journal)
+            print(f"Replayed {len(rows)} journaled rounds in {time.perf_counter() - t_start:.2f} s")
+            print_summary(rows)
+            return
+
+        if args.batch_sizes:
+            compare_batch_sizes(select_rounds(args), [int(x) for x in args.batch_sizes.split(",")], args.concurrency)
+            return
 
-    for i in range(N_ROUNDS):
-        r = next(rounds_iter)
-        round_id = r.get("round_id", i)
-        tiles = r["tiles"]
-        all_solutions = set(r.get("all_solutions", []))
-        targets = set(r.get("targets", []))
+        if args.compare_budgets:
+            compare_budgets(select_rounds(args), budget, args.concurrency, args.stream, args.encoding)
+            return
 
+        if args.compare_encodings:
+            compare_encodings(select_rounds(args), encodings, args.concurrency,
+                              budget if args.budget == "adaptive" else None)
+            return
+
+        config = make_config(budget=budget if args.budget == "adaptive" else None, encoding=args.encoding)
+        cfg_hash = config_hash(args.batch_size, max_invalid_run or 0, config)
+        journal = RunJournal(args.journal, resume=args.resume, fsync_every=args.fsync_every) if args.journal else None
+
+        rows = []
+        done: Dict[Any, Dict[str, Any]] = {}
+        if journal is not None:
+            for rec in journal.existing:
+                if rec.get("config_hash") == cfg_hash and "error" not in rec:
+                    done[rec["round_id"]] = rec
+            if done:
+                print(f"Resuming: {len(done)} rounds already journaled")
+
+        with span("load"):
+            rounds = select_rounds(args)
+        todo = []
+        for i, r in enumerate(rounds):
+            rec = done.get(r.get("round_id", i))
+            if rec is not None:
+                rows.append(score_response(r, i, rec["raw"], rec.get("latency_ms"),
+                                           encoding=rec.get("encoding", "idx")))
+            else:
+                todo.append(r)
+
+        tuner = None
+        if args.autotune:
+            tuner = AIMDTuner(start=args.concurrency, max_limit=args.max_concurrency,
+                              p95_target_ms=args.p95_target_ms, lock_after=args.lock_after)
+        client = make_client(args.max_concurrency if tuner is not None else args.concurrency)
+        cache = ResponseCache(args.cache, int(args.cache_mb * 1024 * 1024)) if args.cache else None
+
+        t_start = time.perf_counter()
         try:
-            outputs, dt, raw = call_model(client, tiles)
-            print("RAW MODEL JSON:", raw)
-            metrics = evaluate_outputs(outputs, tiles, all_solutions, targets)
-            metrics.update({
-                "round_id": round_id,
-                "latency_ms": int(dt * 1000),
-            })
-        except Exception as e:
-            metrics = {
-                "round_id": round_id,
-                "latency_ms": None,
-                "error": str(e),
-            }
+            for i, metrics, raw in iter_round_results(client, todo, args.concurrency, args.batch_size, args.stream,
+                                                         max_invalid_run, tuner, config, cache):
+                round_id = metrics["round_id"]
+                if raw:
+                    print("RAW MODEL JSON:", raw)
+                if journal is not None:
+                    journal.append(journal_record(metrics, raw, cfg_hash))
 
-        rows.append(metrics)
-        print(f"Round {i+1}/{N_ROUNDS} (id={round_id}) -> {metrics.get('latency_ms')} ms | "
-              f"prec={metrics.get('precision')} recall={metrics.get('full_recall')} target={metrics.get('target_recall')} "
-              f"err={metrics.get('error', '')}")
-
-    # Aggregate summary (ignore errored rows)
-    ok = [r for r in rows if "error" not in r]
-    if ok:
-        avg_latency = sum(r["latency_ms"] for r in ok if r["latency_ms"] is not None) / len(ok)
-        avg_prec = sum(r["precision"] for r in ok) / len(ok)
-        avg_full = sum(r["full_recall"] for r in ok) / len(ok)
-        avg_target = sum(r["target_recall"] for r in ok) / len(ok)
-        print("\n=== Summary (successful rounds) ===")
-        print(f"Rounds: {len(ok)}/{len(rows)}")
-        print(f"Avg latency: {avg_latency:.1f} ms")
-        print(f"Avg precision: {avg_prec:.3f}")
-        print(f"Avg full recall: {avg_full:.3f}")
-        print(f"Avg target recall: {avg_target:.3f}")
+                rows.append(metrics)
+                print(f"Round {i+1}/{len(todo)} (id={round_id}) -> {metrics.get('latency_ms')} ms | "
+                      f"prec={metrics.get('precision')} recall={metrics.get('full_recall')} target={metrics.get('target_recall')} "
+                      f"err={metrics.get('error', '')}")
+        finally:
+            if journal is not None:
+                journal.close()
+        wall_s = time.perf_counter() - t_start
+
+        print_summary(rows, wall_s, tuner.limit if tuner is not None else args.concurrency, n_timed=len(todo))
+        if tuner is not None:
+            tuner.report()
+        if cache is not None:
+            cache.report()
+            cache.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,179 @@
+"""
+Adaptive in-flight concurrency (AIMD) for benchmarking a local inference server.
+
+The best number of parallel requests depends on the model, the hardware and
+MAX_TOKENS. AIMDTuner measures completed rounds/s and p95 latency over short
+windows at the current limit and then:
+  - adds one slot while throughput keeps rising by more than `gain_tol` over
+    the best seen at any lower limit (and p95 stays under its target)
+  - halves the limit when p95 exceeds its target, or when more in-flight
+    requests stopped buying throughput (the server is saturated)
+
+Every window is recorded per limit, so the throughput curve builds up over
+the sawtooth. Its knee is the smallest limit reaching (1 - knee_tol) of the
+best throughput. After `lock_after` back-offs the tuner locks onto the knee
+for the rest of the run.
+
+iter_adaptive runs the requests with the tuner's live limit and yields results
+in input order, like benchmark.iter_ordered.
+"""
+
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+
+def _p95(values: List[float]) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))]
+
+
+class AIMDTuner:
+    def __init__(
+        self,
+        start: int = 1,
+        max_limit: int = 32,
+        min_window: int = 8,
+        decrease: float = 0.5,
+        gain_tol: float = 0.05,
+        p95_target_ms: Optional[float] = None,
+        p95_slack: float = 2.0,
+        knee_tol: float = 0.05,
+        lock_after: int = 3,
+    ):
+        """
+        p95_target_ms: back off above this p95; if None, the target is
+          p95_slack x the lowest window p95 seen so far.
+        lock_after: back-offs before locking onto the knee (0 = never lock).
+        """
+        self.max_limit = max(1, max_limit)
+        self.limit = min(max(1, start), self.max_limit)
+        self.min_window = min_window
+        self.decrease = decrease
+        self.gain_tol = gain_tol
+        self.p95_target_ms = p95_target_ms
+        self.p95_slack = p95_slack
+        self.knee_tol = knee_tol
+        self.lock_after = lock_after
+
+        self.locked = False
+        self.n_backoffs = 0
+        # limit -> [(rounds/s, p95 ms), ...] for every completed window
+        self.curve: Dict[int, List[Tuple[float, float]]] = {}
+        self.events: List[str] = []
+
+        self._lock = threading.Lock()
+        self._window_start = time.perf_counter()
+        self._latencies: List[float] = []
+        self._min_p95: Optional[float] = None
+
+    def _window_size(self) -> int:
+        return max(self.min_window, 2 * self.limit)
+
+    def observe(self, latency_s: float) -> None:
+        """Records one completed request; adjusts the limit at the end of each window."""
+        with self._lock:
+            self._latencies.append(latency_s * 1000)
+            if len(self._latencies) >= self._window_size():
+                self._adjust(time.perf_counter())
+
+    def _mean_throughput(self, limit: int) -> float:
+        samples = self.curve[limit]
+        return sum(t for t, _ in samples) / len(samples)
+
+    def _adjust(self, now: float) -> None:
+        elapsed = now - self._window_start
+        tput = len(self._latencies) / elapsed if elapsed > 0 else 0.0
+        p95 = _p95(self._latencies)
+        self._latencies = []
+        self._window_start = now
+
+        self.curve.setdefault(self.limit, []).append((tput, p95))
+        if self.locked:
+            return
+        self._min_p95 = p95 if self._min_p95 is None else min(self._min_p95, p95)
+        target = self.p95_target_ms if self.p95_target_ms is not None else self._min_p95 * self.p95_slack
+
+        lower = [self._mean_throughput(l) for l in self.curve if l < self.limit]
+        gaining = not lower or tput > max(lower) * (1 + self.gain_tol)
+
+        old = self.limit
+        if p95 <= target and gaining:
+            if self.limit < self.max_limit:
+                self.limit += 1
+                self.events.append(f"+ {old}->{self.limit} ({tput:.2f} rounds/s, p95 {p95:.0f} ms)")
+            return
+
+        why = f"p95 {p95:.0f} ms > {target:.0f} ms" if p95 > target else f"plateau at {tput:.2f} rounds/s"
+        self.limit = max(1, int(self.limit * self.decrease))
+        self.n_backoffs += 1
+        self.events.append(f"- {old}->{self.limit} ({why})")
+
+        if self.lock_after and self.n_backoffs >= self.lock_after:
+            self.limit = self.knee()
+            self.locked = True
+            self.events.append(f"locked at knee {self.limit}")
+
+    def knee(self) -> int:
+        """Smallest limit whose mean throughput is within knee_tol of the best."""
+        if not self.curve:
+            return self.limit
+        means = {l: self._mean_throughput(l) for l in self.curve}
+        best = max(means.values())
+        return min(l for l, t in means.items() if t >= best * (1 - self.knee_tol))
+
+    def report(self) -> None:
+        if not self.curve:
+            return
+        knee = self.knee()
+        print("\n=== Concurrency autotune ===")
+        print(f"{'limit':>5} {'windows':>7} {'rounds/s':>9} {'p95 ms':>8}")
+        for l in sorted(self.curve):
+            samples = self.curve[l]
+            p95 = sum(p for _, p in samples) / len(samples)
+            mark = " <- knee" if l == knee else ""
+            print(f"{l:>5} {len(samples):>7} {self._mean_throughput(l):>9.2f} {p95:>8.0f}{mark}")
+        state = "locked" if self.locked else "final"
+        print(f"Knee: {knee} in flight ({state} limit {self.limit}, {self.n_backoffs} back-offs)")
+
+
+def iter_adaptive(
+    fn: Callable[[Any, int], Any],
+    items: Iterable[Any],
+    tuner: AIMDTuner,
+) -> Iterator[Tuple[int, Any]]:
+    """
+    Runs fn(item, i) with up to tuner.limit calls in flight, re-reading the limit
+    whenever a call finishes, and yields (i, result) in input order.
+    Each call's latency is reported to the tuner from its worker thread.
+    """
+    def timed(item: Any, i: int) -> Any:
+        t0 = time.perf_counter()
+        result = fn(item, i)
+        tuner.observe(time.perf_counter() - t0)
+        return result
+
+    items_iter = enumerate(items)
+    exhausted = False
+    running: Dict[Any, int] = {}
+    done: Dict[int, Any] = {}
+    next_i = 0
+
+    with ThreadPoolExecutor(max_workers=tuner.max_limit) as pool:
+        while True:
+            while not exhausted and len(running) < tuner.limit:
+                nxt = next(items_iter, None)
+                if nxt is None:
+                    exhausted = True
+                    break
+                running[pool.submit(timed, nxt[1], nxt[0])] = nxt[0]
+            if not running:
+                break
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for fut in finished:
+                done[running.pop(fut)] = fut.result()
+            while next_i in done:
+                yield next_i, done.pop(next_i)
+                next_i += 1
@@ -0,0 +1,289 @@
+"""
+Compact binary token dictionary + one loader for every dictionary layout.
+
+Accepted inputs (auto-detected by load_dictionary):
+  - english_token_dictionary_bow_sp.json: word -> {"bow"/"sp": {"ids": [...], "tokens": [...]} | None}
+  - english_token_dictionary_clean.json:  word -> [token, ...]
+    (token strings only; exposed as variant `clean_variant`, default "bow", with "ids": None)
+  - the binary format below, written by this script
+
+All three come back in the bow_sp shape, so callers keep using
+dictionary[w][variant]["tokens"].
+
+Binary layout (little-endian), every section 8-byte aligned:
+  b"TOKDICT1" | u32 header length | header JSON | sections
+The header JSON lists n_words, n_tokens, variants and each section's
+(offset, byte length, array typecode):
+  tok_off / tok_blob    interned token table (utf-8 strings + int64 offsets)
+  word_off / word_blob  words sorted by code point (binary-searchable)
+  order                 int32 sorted-word index per original position, so
+                        iteration order matches the source JSON
+  <v>.has               uint8 per word: 0 if the variant is None
+  <v>.off               int64 per word + 1: slice into <v>.tok / <v>.ids
+  <v>.tok               int32 index into the token table
+  <v>.ids               int32 tokenizer ids (-1 if unknown; omitted if none known)
+
+The file is mmap'd and entries are decoded on access, so loading is O(1).
+
+To convert, paste the command below into your terminal:
+
+python dict_store.py ^
+  --in  .\jsons\english_token_dictionary_bow_sp.json ^
+  --out .\jsons\english_token_dictionary_bow_sp.tokdict
+
+"""
+
+import argparse
+import json
+import mmap
+import struct
+import sys
+from array import array
+from collections.abc import Mapping
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+MAGIC = b"TOKDICT1"
+VARIANTS = ("bow", "sp")
+
+
+def _aligned(n: int) -> int:
+    return (n + 7) & ~7
+
+
+def _le(a: array) -> bytes:
+    if sys.byteorder != "little":
+        a = array(a.typecode, a)
+        a.byteswap()
+    return a.tobytes()
+
+
+def _string_table(strings: List[str]) -> Tuple[array, bytes]:
+    offsets = array("q", [0])
+    blob = bytearray()
+    for s in strings:
+        blob += s.encode("utf-8")
+        offsets.append(len(blob))
+    return offsets, bytes(blob)
+
+
+def normalize_layout(raw: Dict[str, Any], clean_variant: str = "bow") -> Dict[str, Any]:
+    """Converts the word -> [tokens] layout to the bow_sp shape; bow_sp passes through."""
+    out: Dict[str, Any] = {}
+    for w, e in raw.items():
+        if isinstance(e, list):
+            out[w] = {clean_variant: {"ids": None, "tokens": e} if e else None}
+        else:
+            out[w] = e
+    return out
+
+
+def write_binary(dictionary: Dict[str, Any], path: str) -> None:
+    variants = [v for v in VARIANTS if any(isinstance(e, dict) and v in e for e in dictionary.values())]
+
+    orig_words = list(dictionary.keys())
+    sorted_words = sorted(orig_words)
+    sorted_pos = {w: i for i, w in enumerate(sorted_words)}
+    order = array("i", (sorted_pos[w] for w in orig_words))
+
+    token_ids: Dict[str, int] = {}
+    sections: Dict[str, Tuple[bytes, str]] = {}
+
+    for v in variants:
+        has = array("B")
+        off = array("q", [0])
+        tok = array("i")
+        ids = array("i")
+        for w in sorted_words:
+            e = dictionary[w]
+            ve = e.get(v) if isinstance(e, dict) else None
+            toks = (ve or {}).get("tokens") or []
+            has.append(1 if ve else 0)
+            for t in toks:
+                tok.append(token_ids.setdefault(t, len(token_ids)))
+            vids = (ve or {}).get("ids")
+            ids.extend(vids if vids and len(vids) == len(toks) else [-1] * len(toks))
+            off.append(len(tok))
+        sections[f"{v}.has"] = (_le(has), "B")
+        sections[f"{v}.off"] = (_le(off), "q")
+        sections[f"{v}.tok"] = (_le(tok), "i")
+        # The clean layout has no ids at all; don't store a column of -1s
+        if any(x != -1 for x in ids):
+            sections[f"{v}.ids"] = (_le(ids), "i")
+
+    tokens = sorted(token_ids, key=token_ids.get)
+    tok_off, tok_blob = _string_table(tokens)
+    word_off, word_blob = _string_table(sorted_words)
+    sections["tok_off"] = (_le(tok_off), "q")
+    sections["tok_blob"] = (tok_blob, "B")
+    sections["word_off"] = (_le(word_off), "q")
+    sections["word_blob"] = (word_blob, "B")
+    sections["order"] = (_le(order), "i")
+
+    # Two passes: header size depends on offsets, offsets depend on header size
+    header: Dict[str, Any] = {
+        "n_words": len(sorted_words),
+        "n_tokens": len(tokens),
+        "variants": variants,
+        "sections": {},
+    }
+    for _ in range(2):
+        pos = _aligned(len(MAGIC) + 4 + len(json.dumps(header).encode("utf-8")))
+        table = {}
+        for name, (data, code) in sections.items():
+            table[name] = [pos, len(data), code]
+            pos = _aligned(pos + len(data))
+        header["sections"] = table
+    header_bytes = json.dumps(header).encode("utf-8")
+
+    with open(path, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<I", len(header_bytes)))
+        f.write(header_bytes)
+        for name, (data, _) in sections.items():
+            f.seek(header["sections"][name][0])
+            f.write(data)
+
+
+class BinaryDictionary(Mapping):
+    """Read-only, mmap-backed view of a .tokdict file with the bow_sp entry shape."""
+
+    def __init__(self, path: str):
+        self._f = open(path, "rb")
+        self._mm = mmap.mmap(self._f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mm[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"Not a binary token dictionary: {path}")
+        (hlen,) = struct.unpack_from("<I", self._mm, len(MAGIC))
+        start = len(MAGIC) + 4
+        header = json.loads(self._mm[start:start + hlen].decode("utf-8"))
+
+        if sys.byteorder != "little":
+            raise RuntimeError("BinaryDictionary assumes a little-endian host")
+
+        view = memoryview(self._mm)
+        self._sec: Dict[str, memoryview] = {}
+        for name, (off, length, code) in header["sections"].items():
+            self._sec[name] = view[off:off + length].cast(code)
+
+        self.n_words: int = header["n_words"]
+        self.n_tokens: int = header["n_tokens"]
+        self.variants: List[str] = header["variants"]
+        self._tok_cache: Dict[int, str] = {}
+
+    def _string(self, table: str, i: int) -> str:
+        off = self._sec[table + "_off"]
+        return bytes(self._sec[table + "_blob"][off[i]:off[i + 1]]).decode("utf-8")
+
+    def token(self, tid: int) -> str:
+        t = self._tok_cache.get(tid)
+        if t is None:
+            t = self._string("tok", tid)
+            self._tok_cache[tid] = t
+        return t
+
+    def _find(self, word: str) -> int:
+        key = word.encode("utf-8")
+        off, blob = self._sec["word_off"], self._sec["word_blob"]
+        lo, hi = 0, self.n_words
+        while lo < hi:
+            mid = (lo + hi) // 2
+            cur = bytes(blob[off[mid]:off[mid + 1]])
+            if cur < key:
+                lo = mid + 1
+            elif cur > key:
+                hi = mid
+            else:
+                return mid
+        return -1
+
+    def _entry(self, i: int) -> Dict[str, Any]:
+        entry: Dict[str, Any] = {}
+        for v in self.variants:
+            if not self._sec[f"{v}.has"][i]:
+                entry[v] = None
+                continue
+            off = self._sec[f"{v}.off"]
+            lo, hi = off[i], off[i + 1]
+            ids_sec = self._sec.get(f"{v}.ids")
+            ids = ids_sec[lo:hi].tolist() if ids_sec is not None else None
+            entry[v] = {
+                "ids": None if ids is None or -1 in ids else ids,
+                "tokens": [self.token(t) for t in self._sec[f"{v}.tok"][lo:hi]],
+            }
+        return entry
+
+    def tokens(self, word: str, variant: str) -> Optional[List[str]]:
+        """Token strings of one variant, without building the full entry."""
+        i = self._find(word)
+        if i < 0 or variant not in self.variants or not self._sec[f"{variant}.has"][i]:
+            return None
+        off = self._sec[f"{variant}.off"]
+        return [self.token(t) for t in self._sec[f"{variant}.tok"][off[i]:off[i + 1]]]
+
+    def __getitem__(self, word: str) -> Dict[str, Any]:
+        i = self._find(word)
+        if i < 0:
+            raise KeyError(word)
+        return self._entry(i)
+
+    def __contains__(self, word: object) -> bool:
+        return isinstance(word, str) and self._find(word) >= 0
+
+    def __len__(self) -> int:
+        return self.n_words
+
+    def __iter__(self) -> Iterator[str]:
+        # Original (source JSON) order, so sampling with a fixed seed is unchanged
+        for i in self._sec["order"]:
+            yield self._string("word", i)
+
+    def items(self):
+        for i in self._sec["order"]:
+            yield self._string("word", i), self._entry(i)
+
+    def close(self) -> None:
+        for m in self._sec.values():
+            m.release()
+        self._sec = {}
+        self._mm.close()
+        self._f.close()
+
+
+def load_dictionary(path: str, clean_variant: str = "bow"):
+    """
+    Loads any supported dictionary file (see module docstring).
+    Binary files are returned as a lazy BinaryDictionary, JSON files as a dict.
+    """
+    with open(path, "rb") as f:
+        head = f.read(len(MAGIC))
+    if head == MAGIC:
+        return BinaryDictionary(path)
+    with open(path, "r", encoding="utf-8") as f:
+        return normalize_layout(json.load(f), clean_variant)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Convert a JSON token dictionary to the binary .tokdict format.")
+    ap.add_argument("--in", dest="inp", required=True, help="Input dictionary (either JSON layout)")
+    ap.add_argument("--out", required=True, help="Output .tokdict path")
+    ap.add_argument("--clean_variant", choices=list(VARIANTS), default="bow",
+                    help="Variant name for the word -> [tokens] layout")
+    ap.add_argument("--verify", action="store_true", help="Re-read the output and compare every entry")
+    args = ap.parse_args()
+
+    dictionary = load_dictionary(args.inp, args.clean_variant)
+    write_binary(dictionary, args.out)
+    print(f"Wrote {len(dictionary)} words to: {args.out}")
+
+    if args.verify:
+        binary = BinaryDictionary(args.out)
+        if list(binary) != list(dictionary):
+            raise SystemExit("Verify failed: word order differs")
+        for w, e in binary.items():
+            want = {v: dictionary[w].get(v) for v in binary.variants}
+            if e != want:
+                raise SystemExit(f"Verify failed at {w!r}: {e} != {want}")
+        print("Verify OK")
+
+
+if __name__ == "__main__":
+    main()
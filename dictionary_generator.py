@@ -1,9 +1,33 @@
+"""
+Builds the bow/sp token dictionary for the top English words.
+
+Both variants of every word are tokenized through the tokenizer's batch API,
+optionally split across --workers processes. With --incremental, entries
+already in --out are reused (after re-checking a sample against the tokenizer)
+and only new words are tokenized. The output is written one entry per line.
+
+To run the code, paste the command below into your terminal:
+
+python dictionary_generator.py ^
+  --n_words 50000 ^
+  --workers 4 ^
+  --incremental
+
+Add --instrument report.json [--profile] for per-phase timings (load, tokenize,
+write) and token-count histograms (see instrument.py).
+
+"""
+
 from transformers import AutoTokenizer
 from wordfreq import top_n_list
+import argparse
 import json
 import re
 from collections import Counter
 import os
+from multiprocessing import get_context
+
+from instrument import add_instrument_args, count, instrumented, observe, span
 
 # ----------------------------
 # Configuration
@@ -20,6 +44,12 @@ ALLOWED_PATTERN = re.compile(r"^[A-Za-z]+$")
 # Acronyms (ALLCAPS) will also be stored under original casing.
 FORCE_LOWERCASE = True
 
+# Texts per tokenizer batch call
+BATCH_SIZE = 4096
+
+# Existing entries re-tokenized in --incremental mode to make sure the tokenizer didn't change
+INCREMENTAL_CHECK = 64
+
 
 def encode_variant(tokenizer, text: str):
     """
@@ -32,58 +62,183 @@ def encode_variant(tokenizer, text: str):
     return {"ids": ids, "tokens": toks}
 
 
-def main():
-    tokenizer = AutoTokenizer.from_pretrained(TOKENIZER_PATH)
-
-    # Load top English words
-    words = top_n_list("en", n=N_WORDS)
-
-    # Filter alphabetic-only
-    clean_words = [w for w in words if ALLOWED_PATTERN.match(w)]
-    print("Words after cleaning:", len(clean_words))
+def encode_batch(tokenizer, texts):
+    """
+    encode_variant for many texts at once. Fast tokenizers go through the Rust
+    batch API, which returns ids and tokens together; slow ones fall back to
+    one encode per text.
+    """
+    if not getattr(tokenizer, "is_fast", False):
+        return [encode_variant(tokenizer, t) for t in texts]
+    encodings = tokenizer.backend_tokenizer.encode_batch(texts, add_special_tokens=False)
+    return [{"ids": e.ids, "tokens": e.tokens} if e.ids else None for e in encodings]
 
-    out = {}
-    skipped = 0
 
+def entry_keys(clean_words):
+    """
+    Dictionary keys in output order: the normalized key of every word, plus the
+    original casing of acronyms (which is the same key when FORCE_LOWERCASE
+    leaves ALLCAPS words alone). Duplicates keep their first position.
+    """
+    keys = {}
     for w in clean_words:
-        # Normalize key
         key = w
         if FORCE_LOWERCASE and not w.isupper():
             key = w.lower()
+        keys.setdefault(key, None)
+        if w.isupper():
+            keys.setdefault(w, None)
+    return list(keys)
+
+
+# ----------------------------
+# Process-level parallelism
+# ----------------------------
+_WORKER_TOKENIZER = None
 
-        # Build variants
-        bow = encode_variant(tokenizer, key)
-        sp = encode_variant(tokenizer, " " + key)
 
-        if bow is None and sp is None:
-            skipped += 1
-            continue
+def _init_worker(tokenizer_path):
+    global _WORKER_TOKENIZER
+    # Parallelism comes from the processes; don't let each one spawn Rust threads too
+    os.environ["TOKENIZERS_PARALLELISM"] = "false"
+    _WORKER_TOKENIZER = AutoTokenizer.from_pretrained(tokenizer_path)
 
-        out[key] = {
-            "bow": bow,
-            "sp": sp,
-        }
 
-        # If original was uppercase acronym and you want it too
-        if w.isupper():
-            bow_u = encode_variant(tokenizer, w)
-            sp_u = encode_variant(tokenizer, " " + w)
-            if bow_u or sp_u:
-                out[w] = {"bow": bow_u, "sp": sp_u}
+def _encode_chunk(texts):
+    return encode_batch(_WORKER_TOKENIZER, texts)
+
+
+def tokenize_keys(tokenizer, keys, workers=1, batch_size=BATCH_SIZE, tokenizer_path=TOKENIZER_PATH):
+    """
+    Returns {key: {"bow": ..., "sp": ...}} for `keys`, with both variants of
+    every key encoded in batches (split across `workers` processes if > 1).
+    """
+    texts = []
+    for k in keys:
+        texts.append(k)
+        texts.append(" " + k)
+    chunks = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+
+    if workers > 1 and len(chunks) > 1:
+        with get_context("spawn").Pool(workers, initializer=_init_worker, initargs=(tokenizer_path,)) as pool:
+            results = pool.map(_encode_chunk, chunks)
+    else:
+        results = []
+        for c in chunks:
+            with span("tokenize_batch"):
+                results.append(encode_batch(tokenizer, c))
+
+    encoded = [e for chunk in results for e in chunk]
+    return {k: {"bow": encoded[2 * i], "sp": encoded[2 * i + 1]} for i, k in enumerate(keys)}
+
+
+def load_existing(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def write_streamed(entries, path):
+    """
+    Writes {key: value, ...} one entry per line, without building the whole
+    document in memory. The result is ordinary JSON; the temp file + rename
+    keeps the old dictionary intact if the run dies halfway.
+    """
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write("{\n")
+        first = True
+        for key, value in entries:
+            if not first:
+                f.write(",\n")
+            f.write(json.dumps(key, ensure_ascii=False))
+            f.write(": ")
+            f.write(json.dumps(value, ensure_ascii=False))
+            first = False
+        f.write("\n}\n")
+    os.replace(tmp_path, path)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Build the bow/sp token dictionary for the top English words.")
+    ap.add_argument("--n_words", type=int, default=N_WORDS)
+    ap.add_argument("--out", default=OUT_PATH)
+    ap.add_argument("--tokenizer", default=TOKENIZER_PATH, help="Local tokenizer folder")
+    ap.add_argument("--workers", type=int, default=1, help="Tokenizer processes (1 = batch API in this process)")
+    ap.add_argument("--batch_size", type=int, default=BATCH_SIZE, help="Texts per tokenizer batch call")
+    ap.add_argument("--incremental", action="store_true",
+                    help="Reuse entries already in --out and only tokenize words missing from it")
+    add_instrument_args(ap)
+    args = ap.parse_args()
+
+    with instrumented(args, "dictionary_generator"):
+        build(args)
+
+
+def build(args):
+
+    with span("load"):
+        tokenizer = AutoTokenizer.from_pretrained(args.tokenizer)
+
+        # Load top English words
+        words = top_n_list("en", n=args.n_words)
+
+    # Filter alphabetic-only
+    clean_words = [w for w in words if ALLOWED_PATTERN.match(w)]
+    print("Words after cleaning:", len(clean_words))
 
-    print("Total entries:", len(out))
-    print("Skipped:", skipped)
+    keys = entry_keys(clean_words)
+
+    with span("load_existing"):
+        existing = load_existing(args.out) if args.incremental else {}
+    if existing:
+        # Re-tokenize a few reused entries; a different tokenizer means a full rebuild
+        probe = [k for k in keys if k in existing][:INCREMENTAL_CHECK]
+        fresh = tokenize_keys(tokenizer, probe, batch_size=args.batch_size)
+        stale = [k for k in probe if fresh[k] != existing[k]]
+        if stale:
+            print(f"Existing dictionary doesn't match the tokenizer (e.g. {stale[0]!r}); rebuilding everything")
+            existing = {}
+
+    missing = [k for k in keys if k not in existing]
+    print(f"Reusing {len(keys) - len(missing)} entries, tokenizing {len(missing)}")
+    with span("tokenize"):
+        encoded = tokenize_keys(tokenizer, missing, workers=args.workers, batch_size=args.batch_size,
+                                tokenizer_path=args.tokenizer)
+    count("reused", len(keys) - len(missing))
+    count("tokenized", len(missing))
+
+    stats = Counter()
+    sample = []
+
+    def iter_entries():
+        for k in keys:
+            value = existing.get(k) or encoded.get(k)
+            if value is None or (value["bow"] is None and value["sp"] is None):
+                stats["skipped"] += 1
+                continue
+            stats["entries"] += 1
+            for variant in ("bow", "sp"):
+                if value[variant] is not None:
+                    observe(f"{variant}_tokens", len(value[variant]["tokens"]))
+            if not sample:
+                sample.append((k, value))
+            yield k, value
 
     # Save JSON
-    with open(OUT_PATH, "w", encoding="utf-8") as f:
-        json.dump(out, f, ensure_ascii=False, indent=2)
+    with span("write"):
+        write_streamed(iter_entries(), args.out)
 
-    print("Saved to:", OUT_PATH)
+    print("Total entries:", stats["entries"])
+    print("Skipped:", stats["skipped"])
+    print("Saved to:", args.out)
 
     # Show a sample
-    sample_key = next(iter(out.keys()))
-    print("Sample key:", sample_key)
-    print("Sample value:", json.dumps(out[sample_key], ensure_ascii=False, indent=2))
+    if sample:
+        sample_key, sample_value = sample[0]
+        print("Sample key:", sample_key)
+        print("Sample value:", json.dumps(sample_value, ensure_ascii=False, indent=2))
 
 
 if __name__ == "__main__":
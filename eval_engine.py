@@ -0,0 +1,402 @@
+"""
+One evaluation engine for both response formats.
+
+  - idx responses     [{"idx": [i, j, ...]}, ...]            (benchmark.py)
+  - word responses    [{"word", "used_tokens", "concat"}]    (run.py / evaluator.py)
+
+benchmark.evaluate_outputs and evaluator.evaluate_round delegate here and keep
+their exact metrics. What is shared instead of rebuilt per item:
+  - TokenInterner: token string -> small int id
+  - EvalIndex: word -> canonical token-id tuple for one dictionary variant
+    (filled lazily, or all at once with precompute=True), plus a bounded
+    concat -> normalized word memo
+  - RoundContext: per-round tile counts by token id, solution/target sets and an
+    idx tuple -> word memo, so re-scoring the same round is mostly dict hits.
+    Given the round's precomputed idx_tilings (see idx_tilings.py), valid idx
+    tuples are scored by one lookup of their tile-group sequence, and
+    evaluate_idx also reports which solutions were found via their canonical
+    tiling
+
+evaluate_words(..., details=False) is the aggregate-only mode: counters only,
+no per-item details list.
+
+To re-score a journal (see run_journal.py) and report the rate, paste the command below into your terminal:
+
+python eval_engine.py ^
+  --rounds_jsonl .\rounds\rounds_5000_sp_with_solutions.jsonl ^
+  --journal .\runs\journal.jsonl.zst
+
+"""
+
+import argparse
+import json
+import time
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+K_MAX = 20
+
+# Non-word results of RoundContext.idx_word
+_FMT, _OOB, _REUSE = 0, 1, 2
+_INT_ONLY = frozenset([int])
+_STR_ONLY = frozenset([str])
+# EvalIndex.canonical() result for words not in the dictionary
+MISSING = object()
+_UNSEEN = object()
+
+
+def normalize_concat_to_word(concat: str) -> str:
+    # Ġ = space, Ċ = newline (same rule as benchmark.py / evaluator.py)
+    return concat.replace("Ġ", " ").replace("Ċ", "\n").strip().lower()
+
+
+class TokenInterner:
+    def __init__(self):
+        self.ids: Dict[str, int] = {}
+        self.tokens: List[str] = []
+
+    def intern(self, token: str) -> int:
+        tid = self.ids.get(token)
+        if tid is None:
+            tid = len(self.tokens)
+            self.ids[token] = tid
+            self.tokens.append(token)
+        return tid
+
+
+class EvalIndex:
+    """Dictionary side of word-format scoring, shared across rounds."""
+
+    def __init__(
+        self,
+        dictionary: Any,
+        variant: str = "sp",
+        precompute: bool = False,
+        norm_cache_size: int = 1 << 20,
+    ):
+        self.dictionary = dictionary
+        self.variant = variant
+        self.interner = TokenInterner()
+        self._canon: Dict[str, Any] = {}
+        self._norm: Dict[str, str] = {}
+        self.norm_cache_size = norm_cache_size
+        if precompute:
+            for w, e in dictionary.items():
+                self._canon[w] = self._canonical_of(e)
+
+    def _canonical_of(self, entry: Any) -> Optional[Tuple[int, ...]]:
+        tokens = ((entry.get(self.variant) or {}).get("tokens")) if isinstance(entry, dict) else None
+        if tokens is None:
+            return None
+        return tuple(self.interner.intern(t) for t in tokens)
+
+    def canonical(self, word: str) -> Any:
+        """Canonical token-id tuple, None if the word lacks the variant, MISSING if unknown."""
+        c = self._canon.get(word, _UNSEEN)
+        if c is _UNSEEN:
+            entry = self.dictionary.get(word)
+            c = MISSING if entry is None else self._canonical_of(entry)
+            self._canon[word] = c
+        return c
+
+    def word_of(self, concat: str) -> str:
+        w = self._norm.get(concat)
+        if w is None:
+            if len(self._norm) >= self.norm_cache_size:
+                self._norm.clear()
+            w = normalize_concat_to_word(concat)
+            self._norm[concat] = w
+        return w
+
+
+class RoundContext:
+    """Round side of scoring: tiles, tile counts by token id, solution sets and memos."""
+
+    def __init__(
+        self,
+        tiles: List[str],
+        all_solutions: Iterable[str] = (),
+        targets: Iterable[str] = (),
+        interner: Optional[TokenInterner] = None,
+        tilings: Optional[List[List[int]]] = None,
+    ):
+        self.tiles = tiles
+        self.n_tiles = len(tiles)
+        # Tile-group sequence -> (word, canonical?) from the round's idx_tilings rows [s, c, i1, ...]
+        self.tiling_words: Optional[Dict[Tuple[int, ...], Tuple[str, bool]]] = None
+        if tilings is not None:
+            solutions = list(all_solutions)
+            first: Dict[str, int] = {}
+            self.groups = [first.setdefault(t, i) for i, t in enumerate(tiles)]
+            self.tiling_words = {
+                tuple(self.groups[i] for i in row[2:]): (solutions[row[0]], bool(row[1])) for row in tilings
+            }
+        self.all_solutions = all_solutions if isinstance(all_solutions, (set, frozenset)) else set(all_solutions)
+        self.targets = targets if isinstance(targets, (set, frozenset)) else set(targets)
+        # Tile counts by token id are only needed for word responses (pass the EvalIndex interner)
+        self.interner = interner
+        self.tile_counts: Dict[int, int] = {}
+        if interner is not None:
+            for t in tiles:
+                tid = interner.intern(t)
+                self.tile_counts[tid] = self.tile_counts.get(tid, 0) + 1
+        self._idx_words: Dict[Tuple[int, ...], Any] = {}
+        # idx tuples (memoized by idx_word) that spell a solution's canonical tiling
+        self.canonical_idx: Set[Tuple[int, ...]] = set()
+
+    def _int_idx_word(self, idx: Tuple[int, ...]) -> Any:
+        if idx and (min(idx) < 0 or max(idx) >= self.n_tiles):
+            return _OOB
+        if len(set(idx)) != len(idx):
+            return _REUSE
+        tiles = self.tiles
+        return normalize_concat_to_word("".join([tiles[i] for i in idx]))
+
+    def _tiling_idx_word(self, idx: Tuple[int, ...]) -> Any:
+        # Valid tuples found in the precomputed table skip the string build
+        if idx and min(idx) >= 0 and max(idx) < self.n_tiles and len(set(idx)) == len(idx):
+            hit = self.tiling_words.get(tuple(map(self.groups.__getitem__, idx)))
+            if hit is not None:
+                if hit[1]:
+                    self.canonical_idx.add(idx)
+                return hit[0]
+        return self._int_idx_word(idx)
+
+    def idx_word(self, idx: Tuple[Any, ...]) -> Any:
+        """Word built by an idx tuple, or _FMT / _OOB / _REUSE."""
+        if not _INT_ONLY.issuperset(map(type, idx)):
+            # bools, floats, strings...: exact checks, not memoized since (1.0,) == (1,) as a key
+            if any(not isinstance(x, int) for x in idx):
+                return _FMT
+            return self._int_idx_word(idx)
+        w = self._idx_words.get(idx)
+        if w is None:
+            w = self._int_idx_word(idx) if self.tiling_words is None else self._tiling_idx_word(idx)
+            self._idx_words[idx] = w
+        return w
+
+
+def evaluate_idx(
+    outputs: List[Any],
+    ctx: RoundContext,
+    k_max: int = K_MAX,
+    words_ok: bool = False,
+) -> Dict[str, Any]:
+    """
+    Metrics for an idx response; identical to benchmark.evaluate_outputs. With
+    precomputed tilings there are two extra counts: n_valid_canonical (found
+    solutions spelled by their dictionary tokens at least once) and
+    n_valid_alternate (found only via other tilings).
+
+    words_ok=True scores decoded words-only responses (see response_encodings.py):
+    {"word": w} items, words no tiling spells, count as predictions of w and
+    are reported as n_unbuildable.
+    """
+    fmt_err = 0
+    index_oob = 0
+    index_reuse = 0
+    unbuildable = 0
+    pred_words = set()
+    canonical_words = set()
+    tilings = ctx.tiling_words is not None
+
+    for it in outputs[:k_max]:
+        idx_list = it.get("idx") if isinstance(it, dict) else None
+        if not isinstance(idx_list, list):
+            if words_ok and isinstance(it, dict) and isinstance(it.get("word"), str):
+                unbuildable += 1
+                pred_words.add(it["word"])
+                continue
+            fmt_err += 1
+            continue
+        idx = tuple(idx_list)
+        w = ctx.idx_word(idx)
+        if w is _FMT:
+            fmt_err += 1
+        elif w is _OOB:
+            index_oob += 1
+        elif w is _REUSE:
+            index_reuse += 1
+        else:
+            pred_words.add(w)
+            if tilings and idx in ctx.canonical_idx:
+                canonical_words.add(w)
+
+    valid_hits = pred_words.intersection(ctx.all_solutions)
+    target_hits = pred_words.intersection(ctx.targets)
+
+    n_pred = len(pred_words)
+    n_valid = len(valid_hits)
+    n_solutions = max(1, len(ctx.all_solutions))
+    n_targets = max(1, len(ctx.targets))
+
+    metrics = {
+        "n_output_items_raw": len(outputs),
+        "n_pred_unique": n_pred,
+        "n_valid_unique": n_valid,
+        "n_solutions": len(ctx.all_solutions),
+        "n_targets": len(ctx.targets),
+        "precision": (n_valid / n_pred) if n_pred else 0.0,
+        "full_recall": n_valid / n_solutions,
+        "target_recall": len(target_hits) / n_targets,
+        "format_errors": fmt_err,
+        "index_oob": index_oob,
+        "index_reuse": index_reuse,
+    }
+    if tilings:
+        metrics["n_valid_canonical"] = len(canonical_words)
+        metrics["n_valid_alternate"] = n_valid - len(canonical_words)
+    if words_ok:
+        metrics["n_unbuildable"] = unbuildable
+    return metrics
+
+
+def evaluate_words(
+    outputs: List[Any],
+    ctx: RoundContext,
+    index: EvalIndex,
+    details: bool = True,
+) -> Dict[str, Any]:
+    """
+    Word-format scoring with evaluator.evaluate_round's statuses.
+    Returns {"summary": counts, "details": [...]}; details=False leaves out "details".
+    """
+    stats: Counter = Counter()
+    out: Optional[List[Dict[str, Any]]] = [] if details else None
+    if ctx.interner is not index.interner:
+        raise ValueError("RoundContext must share the EvalIndex interner (pass interner=index.interner)")
+    ids = index.interner.ids
+    tile_counts = ctx.tile_counts
+
+    for item in outputs:
+        if not isinstance(item, dict):
+            stats["format_error"] += 1
+            if out is not None:
+                out.append({"item": item, "status": "format_error"})
+            continue
+        word = item.get("word")
+        used = item.get("used_tokens")
+        concat_field = item.get("concat")
+
+        if (
+            not isinstance(word, str)
+            or not isinstance(concat_field, str)
+            or not isinstance(used, list)
+            or (not _STR_ONLY.issuperset(map(type, used)) and any(not isinstance(t, str) for t in used))
+        ):
+            stats["format_error"] += 1
+            if out is not None:
+                out.append({"item": item, "status": "format_error"})
+            continue
+
+        word_norm = word.strip().lower()
+
+        # Tile availability (multiset), on interned ids; unknown tokens are never tiles
+        used_ids = tuple(ids.get(t, -1) for t in used)
+        if len(set(used_ids)) == len(used_ids):
+            overuse = any(tid not in tile_counts for tid in used_ids)
+        else:
+            overuse = any(n > tile_counts.get(tid, 0) for tid, n in Counter(used_ids).items())
+        if overuse:
+            stats["hallucinated_token_or_overuse"] += 1
+            if out is not None:
+                out.append({"word": word, "used_tokens": used, "concat": concat_field,
+                            "status": "hallucinated_token_or_overuse"})
+            continue
+
+        concat_exact = "".join(used)
+        if concat_field != concat_exact:
+            stats["concat_field_mismatch"] += 1
+            if out is not None:
+                out.append({"word": word, "used_tokens": used, "concat": concat_field,
+                            "status": "concat_field_mismatch", "expected_concat": concat_exact})
+            continue
+
+        expected_word = index.word_of(concat_exact)
+        if word_norm != expected_word:
+            stats["word_normalization_mismatch"] += 1
+            if out is not None:
+                out.append({"word": word, "used_tokens": used, "concat": concat_field,
+                            "status": "word_normalization_mismatch", "expected_word": expected_word})
+            continue
+
+        canonical = index.canonical(word_norm)
+        if canonical is MISSING:
+            stats["not_in_dictionary"] += 1
+            if out is not None:
+                out.append({"word": word_norm, "used_tokens": used, "concat": concat_field,
+                            "status": "not_in_dictionary"})
+            continue
+        if canonical is None:
+            stats["no_canonical_variant"] += 1
+            if out is not None:
+                out.append({"word": word_norm, "used_tokens": used, "concat": concat_field,
+                            "status": "no_canonical_variant"})
+            continue
+
+        if used_ids == canonical:
+            stats["correct_canonical"] += 1
+            if out is not None:
+                out.append({"word": word_norm, "used_tokens": used, "concat": concat_field,
+                            "status": "correct_canonical"})
+        else:
+            stats["alt_tokenisation"] += 1
+            if out is not None:
+                tokens = index.interner.tokens
+                out.append({"word": word_norm, "used_tokens": used, "concat": concat_field,
+                            "status": "alt_tokenisation", "canonical": [tokens[i] for i in canonical]})
+
+    result: Dict[str, Any] = {"summary": dict(stats)}
+    if out is not None:
+        result["details"] = out
+    return result
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Re-score journaled idx responses with the evaluation engine.")
+    ap.add_argument("--rounds_jsonl", required=True)
+    ap.add_argument("--journal", required=True, help="Journal written by benchmark.py --journal")
+    ap.add_argument("--k_max", type=int, default=K_MAX)
+    args = ap.parse_args()
+
+    # Imported here so the engine itself stays free of I/O dependencies
+    from rounds_store import open_rounds
+    from run_journal import iter_journal
+
+    index = open_rounds(args.rounds_jsonl)
+    contexts: Dict[int, RoundContext] = {}
+    n = n_err = 0
+    sums = Counter()
+    t0 = time.perf_counter()
+    try:
+        for rec in iter_journal(args.journal):
+            n += 1
+            ctx = contexts.get(rec["round_id"])
+            if ctx is None:
+                r = index.get_by_id(rec["round_id"])
+                ctx = RoundContext(r["tiles"], r.get("all_solutions", []), r.get("targets", []),
+                                   tilings=r.get("idx_tilings"))
+                contexts[rec["round_id"]] = ctx
+            try:
+                outputs = json.loads(rec.get("raw") or "")
+                if not isinstance(outputs, list):
+                    raise ValueError("not a list")
+            except ValueError:
+                n_err += 1
+                continue
+            m = evaluate_idx(outputs, ctx, args.k_max)
+            for k in ("precision", "full_recall", "target_recall"):
+                sums[k] += m[k]
+    finally:
+        index.close()
+    dt = time.perf_counter() - t0
+
+    ok = max(1, n - n_err)
+    print(f"Re-scored {n} responses in {dt:.2f} s ({n / dt * 60:,.0f} per minute), {n_err} unparseable")
+    print(f"Avg precision: {sums['precision'] / ok:.3f}")
+    print(f"Avg full recall: {sums['full_recall'] / ok:.3f}")
+    print(f"Avg target recall: {sums['target_recall'] / ok:.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,8 @@
 from huggingface_hub import snapshot_download
 from transformers import AutoTokenizer
 import json
+import os
+import shutil
 
 # Download only tokenizer-related files
 snapshot_download(
@@ -18,6 +20,15 @@ snapshot_download(
 
 print("Tokenizer files downloaded.")
 
+# jsons/ is the tokenizer folder the other scripts read (dictionary_generator.py, token_budget.py)
+os.makedirs("jsons", exist_ok=True)
+for name in ("tokenizer.json", "tokenizer_config.json", "special_tokens_map.json"):
+    src = os.path.join("gpt-oss-20b", name)
+    if os.path.exists(src):
+        shutil.copy(src, os.path.join("jsons", name))
+
+print("Copied tokenizer files to jsons/.")
+
 # Load from local directory
 tokenizer = AutoTokenizer.from_pretrained("gpt-oss-20b")
 
@@ -0,0 +1,124 @@
+"""
+Valid idx sequences per solution, precomputed once per round.
+
+An idx response names tile positions; the word it spells is
+normalize_concat_to_word of those tiles joined. Identical tiles are
+interchangeable, so positions are grouped by tile string, and only one
+sequence per ordering of groups is stored: the k-th use of a group takes
+the group's k-th position ("canonical multiplicity ordering"). Three copies
+of "a" then give one stored sequence instead of 3! permutations.
+
+A round's tilings are stored as flat int rows in its "idx_tilings" field:
+
+  [s, c, i1, i2, ...]   s: index into all_solutions
+                        c: 1 if the tiles are the word's dictionary tokens
+                           (canonical tiling), 0 for an alternate tiling
+                        i1..: canonical tile positions, in order
+
+Scoring maps a response's positions to their groups (RoundContext in
+eval_engine.py) and looks the group sequence up in a dict; responses not in
+the table fall back to building the string, so a capped table is never
+wrong, only slower.
+
+Enumeration is a DFS over tile groups with multiplicity limits, pruned to
+prefixes of the round's solution words; whitespace follows the same
+leading/trailing rules as normalize_concat_to_word.
+"""
+
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from trie_solver import normalize_tile
+
+MAX_TILINGS_PER_WORD = 64
+
+
+def tile_groups(tiles: Sequence[str]) -> Tuple[List[str], List[List[int]]]:
+    """Distinct tile strings in first-seen order and the positions of each."""
+    index: Dict[str, int] = {}
+    names: List[str] = []
+    positions: List[List[int]] = []
+    for i, t in enumerate(tiles):
+        g = index.get(t)
+        if g is None:
+            index[t] = len(names)
+            names.append(t)
+            positions.append([i])
+        else:
+            positions[g].append(i)
+    return names, positions
+
+
+def round_idx_tilings(
+    tiles: Sequence[str],
+    solutions: Sequence[str],
+    canonical_tokens: Callable[[str], Optional[List[str]]],
+    max_per_word: int = MAX_TILINGS_PER_WORD,
+) -> List[List[int]]:
+    """
+    idx_tilings rows (see module docstring) for one round, at most
+    max_per_word per solution; the canonical tiling comes first when it exists.
+    """
+    names, positions = tile_groups(tiles)
+    texts = [normalize_tile(t) for t in names]
+    word_pos = {w: s for s, w in enumerate(solutions)}
+    prefixes = {w[:k] for w in word_pos for k in range(1, len(w) + 1)}
+
+    found: Dict[str, List[Tuple[int, ...]]] = {w: [] for w in word_pos}
+    remaining = [len(p) for p in positions]
+    seq: List[int] = []
+
+    def dfs(text: str) -> None:
+        core = text.rstrip()
+        if seq and core in found and len(found[core]) < max_per_word:
+            found[core].append(tuple(seq))
+        # Past a finished word only whitespace may follow
+        in_trailing = core != text and core != ""
+        for g, n in enumerate(remaining):
+            if not n:
+                continue
+            nxt = (text + texts[g]).lstrip()
+            nxt_core = nxt.rstrip()
+            if in_trailing and nxt_core != core:
+                continue
+            if nxt_core and nxt_core not in prefixes:
+                continue
+            if nxt_core and nxt_core != nxt and nxt_core not in found:
+                continue
+            remaining[g] -= 1
+            seq.append(g)
+            dfs(nxt)
+            seq.pop()
+            remaining[g] += 1
+
+    dfs("")
+
+    group_of = {t: g for g, t in enumerate(names)}
+    rows: List[List[int]] = []
+    for w, seqs in found.items():
+        # The canonical tiling goes first even if the capped DFS didn't keep it
+        canon = canonical_tokens(w)
+        canon_seq = None
+        # (only if it actually spells w; e.g. uppercase keys never normalize back to themselves)
+        if canon and all(t in group_of for t in canon) and "".join(map(normalize_tile, canon)).strip() == w:
+            gs = tuple(group_of[t] for t in canon)
+            if all(gs.count(g) <= len(positions[g]) for g in set(gs)):
+                canon_seq = gs
+        ordered = ([canon_seq] if canon_seq is not None else []) + [gs for gs in seqs if gs != canon_seq]
+        for gs in ordered[:max_per_word]:
+            used = [0] * len(names)
+            idx = []
+            for g in gs:
+                idx.append(positions[g][used[g]])
+                used[g] += 1
+            rows.append([word_pos[w], 1 if gs == canon_seq else 0] + idx)
+    return rows
+
+
+def add_idx_tilings(
+    r: Dict[str, Any],
+    canonical_tokens: Callable[[str], Optional[List[str]]],
+    max_per_word: int = MAX_TILINGS_PER_WORD,
+) -> Dict[str, Any]:
+    """Adds idx_tilings to a solved round (in place) and returns it."""
+    r["idx_tilings"] = round_idx_tilings(r["tiles"], r["all_solutions"], canonical_tokens, max_per_word)
+    return r
@@ -0,0 +1,276 @@
+"""
+Lightweight instrumentation shared by the scripts: named spans, counters and
+histograms, plus optional cProfile / tracemalloc snapshots, reported as JSON.
+
+  with span("solve"):
+      ...
+  count("rounds")
+  observe("n_solutions", r["n_solutions"])
+  for r in timed_iter("generate", rounds): ...   # time to produce each item
+
+Everything goes to the module-level RECORDER, which is off (spans are a shared
+null context) until a script enables it. Scripts call add_instrument_args(ap)
+and wrap their work in `with instrumented(args, "<script>"):`, which adds:
+
+  --instrument report.json   spans / counters / histograms as JSON, plus a
+                             span table on stdout
+  --profile                  also cProfile (top functions by cumulative time,
+                             full stats in report.json.prof) and tracemalloc
+                             (peak and top allocation sites)
+
+Histograms keep log-spaced buckets (4 per power of two), so p50/p95/p99 are
+approximate (within ~19%) while memory stays constant at millions of samples.
+Only the calling process is recorded: work done in --workers processes shows
+up as the parent's time waiting for it. cProfile sees the main thread only.
+"""
+
+import argparse
+import contextlib
+import cProfile
+import json
+import math
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from typing import Any, Dict, Iterable, Iterator, Optional, TypeVar
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+BUCKETS_PER_OCTAVE = 4
+PROFILE_TOP = 25
+_NULL_SPAN = contextlib.nullcontext()
+T = TypeVar("T")
+
+
+class Histogram:
+    """count / sum / min / max and log-spaced buckets of non-negative samples."""
+
+    def __init__(self):
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self.buckets: Counter = Counter()
+
+    def add(self, v: float) -> None:
+        self.count += 1
+        self.sum += v
+        if v < self.min:
+            self.min = v
+        if v > self.max:
+            self.max = v
+        # Bucket k holds (2^(k/B), 2^((k+1)/B)]; zero and negatives share one bucket
+        self.buckets[math.ceil(math.log2(v) * BUCKETS_PER_OCTAVE) - 1 if v > 0 else None] += 1
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-quantile, clamped to [min, max]."""
+        rank = q * self.count
+        seen = self.buckets.get(None, 0)
+        if seen and seen >= rank:
+            return min(0.0, self.max)
+        for k in sorted(b for b in self.buckets if b is not None):
+            seen += self.buckets[k]
+            if seen >= rank:
+                return min(max(2.0 ** ((k + 1) / BUCKETS_PER_OCTAVE), self.min), self.max)
+        return self.max
+
+    def to_dict(self, scale: float = 1.0) -> Dict[str, Any]:
+        if not self.count:
+            return {"count": 0}
+        return {
+            "count": self.count,
+            "sum": self.sum * scale,
+            "mean": self.sum / self.count * scale,
+            "min": self.min * scale,
+            "p50": self.quantile(0.5) * scale,
+            "p95": self.quantile(0.95) * scale,
+            "p99": self.quantile(0.99) * scale,
+            "max": self.max * scale,
+        }
+
+
+class Recorder:
+    """Thread-safe store of span timings, counters and histograms."""
+
+    def __init__(self):
+        self.enabled = False
+        self._lock = threading.Lock()
+        self.spans: Dict[str, Histogram] = {}
+        self.counters: Counter = Counter()
+        self.histograms: Dict[str, Histogram] = {}
+
+    def add_time(self, name: str, seconds: float) -> None:
+        """Records an externally measured duration under span `name`."""
+        if not self.enabled:
+            return
+        with self._lock:
+            h = self.spans.get(name)
+            if h is None:
+                h = self.spans[name] = Histogram()
+            h.add(seconds)
+
+    @contextlib.contextmanager
+    def _span(self, name: str) -> Iterator[None]:
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - t0)
+
+    def span(self, name: str):
+        """Context manager timing its body as one sample of span `name`."""
+        return self._span(name) if self.enabled else _NULL_SPAN
+
+    def count(self, name: str, n: int = 1) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] += n
+
+    def observe(self, name: str, value: float) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            h = self.histograms.get(name)
+            if h is None:
+                h = self.histograms[name] = Histogram()
+            h.add(value)
+
+    def report(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                # Span durations are reported in ms
+                "spans_ms": {k: h.to_dict(1000.0) for k, h in sorted(self.spans.items())},
+                "counters": dict(sorted(self.counters.items())),
+                "histograms": {k: h.to_dict() for k, h in sorted(self.histograms.items())},
+            }
+
+
+RECORDER = Recorder()
+span = RECORDER.span
+add_time = RECORDER.add_time
+count = RECORDER.count
+observe = RECORDER.observe
+
+
+def timed_iter(name: str, items: Iterable[T]) -> Iterator[T]:
+    """Yields from items, recording the time spent producing each one as span `name`."""
+    it = iter(items)
+    while True:
+        t0 = time.perf_counter()
+        try:
+            item = next(it)
+        except StopIteration:
+            return
+        add_time(name, time.perf_counter() - t0)
+        yield item
+
+
+class Profiler:
+    """cProfile + tracemalloc around a block of work."""
+
+    def __init__(self, top: int = PROFILE_TOP):
+        self.top = top
+        self.profile = cProfile.Profile()
+
+    def start(self) -> None:
+        tracemalloc.start()
+        self.profile.enable()
+
+    def stop(self, stats_path: Optional[str] = None) -> Dict[str, Any]:
+        self.profile.disable()
+        _, peak = tracemalloc.get_traced_memory()
+        snapshot = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+        if stats_path:
+            self.profile.dump_stats(stats_path)
+
+        stats = pstats.Stats(self.profile)
+        rows = sorted(stats.stats.items(), key=lambda kv: kv[1][3], reverse=True)[:self.top]
+        cpu = [
+            {
+                "function": f"{file}:{line}({func})",
+                "calls": nc,
+                "tottime_s": tt,
+                "cumtime_s": ct,
+            }
+            for (file, line, func), (_, nc, tt, ct, _) in rows
+        ]
+        memory = [
+            {"site": str(s.traceback[0]), "size_mb": s.size / 2**20, "blocks": s.count}
+            for s in snapshot.statistics("lineno")[:self.top]
+        ]
+        return {"cpu": cpu, "memory": {"traced_peak_mb": peak / 2**20, "top_sites": memory}}
+
+
+def peak_rss_mb() -> Optional[float]:
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kB on Linux, bytes on macOS
+    return rss / 2**20 if sys.platform == "darwin" else rss / 1024
+
+
+def add_instrument_args(ap: argparse.ArgumentParser) -> None:
+    ap.add_argument("--instrument", default=None, metavar="REPORT_JSON",
+                    help="Record spans / counters / histograms and write them to this JSON report")
+    ap.add_argument("--profile", action="store_true",
+                    help="Also run cProfile and tracemalloc (slower; see instrument.py)")
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    print(f"\n=== Instrumentation ({report['script']}, {report['wall_s']:.2f} s wall) ===")
+    for name, s in report["spans_ms"].items():
+        print(f"{name:<20} n={s['count']:<9} total={s['sum'] / 1000:9.2f} s  "
+              f"mean={s['mean']:9.3f} ms  p95={s['p95']:9.3f} ms  max={s['max']:9.3f} ms")
+    for name, n in report["counters"].items():
+        print(f"{name:<20} {n}")
+    for name, h in report["histograms"].items():
+        print(f"{name:<20} n={h['count']:<9} mean={h['mean']:.2f} p50={h['p50']:.2f} "
+              f"p95={h['p95']:.2f} max={h['max']:.2f}")
+    profile = report.get("profile")
+    if profile:
+        print(f"traced peak: {profile['memory']['traced_peak_mb']:.1f} MB")
+        for row in profile["cpu"][:10]:
+            print(f"  {row['cumtime_s']:9.3f} s cum  {row['calls']:>9}  {row['function']}")
+
+
+@contextlib.contextmanager
+def instrumented(args: argparse.Namespace, script: str) -> Iterator[Recorder]:
+    """
+    Enables RECORDER (and the profiler with --profile) for the block, then
+    prints the span table and writes the --instrument report. A no-op
+    without either flag.
+    """
+    out = getattr(args, "instrument", None)
+    profile = getattr(args, "profile", False)
+    if not out and not profile:
+        yield RECORDER
+        return
+
+    RECORDER.enabled = True
+    profiler = Profiler() if profile else None
+    if profiler is not None:
+        profiler.start()
+    t0 = time.perf_counter()
+    try:
+        yield RECORDER
+    finally:
+        wall_s = time.perf_counter() - t0
+        report: Dict[str, Any] = {"script": script, "argv": sys.argv[1:], "wall_s": wall_s}
+        if profiler is not None:
+            report["profile"] = profiler.stop(f"{out}.prof" if out else None)
+        RECORDER.enabled = False
+        report.update(RECORDER.report())
+        report["peak_rss_mb"] = peak_rss_mb()
+        print_report(report)
+        if out:
+            with open(out, "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2)
+            print(f"Instrumentation report: {out}")
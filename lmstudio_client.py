@@ -3,15 +3,24 @@ from typing import Any, Dict, List, Optional
 
 from openai import OpenAI
 
+from response_cache import ResponseCache
+
 
 class LMStudioClient:
     """
     Simple wrapper for LM Studio's OpenAI-compatible server.
     Ensure LM Studio server is running and exposing /v1.
+    With a `cache` (see response_cache.py), repeated temperature-0 requests are answered from disk.
     """
 
-    def __init__(self, base_url: str = "http://localhost:1234/v1", api_key: str = "lm-studio"):
+    def __init__(
+        self,
+        base_url: str = "http://localhost:1234/v1",
+        api_key: str = "lm-studio",
+        cache: Optional[ResponseCache] = None,
+    ):
         self.client = OpenAI(base_url=base_url, api_key=api_key)
+        self.cache = cache
 
     def list_models(self) -> List[Dict[str, Any]]:
         """
@@ -36,7 +45,7 @@ class LMStudioClient:
         """
         user_text = json.dumps(user_payload, ensure_ascii=False)
 
-        resp = self.client.chat.completions.create(
+        request = dict(
             model=model,
             messages=[
                 {"role": "system", "content": system_prompt},
@@ -44,10 +53,13 @@ class LMStudioClient:
             ],
             temperature=temperature,
             max_tokens=max_tokens,
-            timeout=timeout,
         )
-
-        content = resp.choices[0].message.content or ""
+        content = self.cache.get(request) if self.cache is not None else None
+        if content is None:
+            resp = self.client.chat.completions.create(**request, timeout=timeout)
+            content = resp.choices[0].message.content or ""
+            if self.cache is not None:
+                self.cache.put(request, content)
 
         # Expect the model to return raw JSON (a list). Try strict parse first.
         try:
@@ -0,0 +1,361 @@
+"""
+Local stand-in for LM Studio's OpenAI-compatible server, for offline harness benchmarking.
+
+Implements GET /v1/models and POST /v1/chat/completions (blocking and
+"stream": true SSE). Answers are built from the request itself:
+  - single rounds ({"tiles": [...]}) get an idx list, [{"idx": [...]}, ...], or
+    the encoding named by the request's schema (see response_encodings.py)
+  - batches ({"rounds": [...]}) get {"rounds": [{"round": j, "items": [...]}, ...]}
+  - run.py-style payloads (with "output_schema") get word/used_tokens/concat objects
+
+Strategies:
+  oracle     constructions of the round's all_solutions (needs --rounds, looked up by tiles)
+  random     random idx lists, a mix of valid, out-of-bounds and reused positions
+  malformed  truncated JSON, degenerate repeats, markdown fences, non-list output
+
+Timing: time-to-first-token is drawn from --latency, then the answer is
+"decoded" at --tokens_per_s (one token ~ 4 characters), capped at the request's
+max_tokens (finish_reason "length", i.e. a truncated answer). --slots bounds how
+many requests are served in parallel, like llama.cpp's -np; the rest queue.
+Answers and latencies are seeded from --seed and the request body, so a rerun
+of the same rounds sees the same responses.
+
+The default port matches benchmark.BASE_URL, so no client changes are needed.
+
+To run the code, paste the command below into your terminal:
+
+python mock_server.py ^
+  --rounds .\rounds\rounds_5000_sp_with_solutions.jsonl ^
+  --strategy oracle ^
+  --latency lognormal:200:0.5 ^
+  --tokens_per_s 60 ^
+  --slots 4
+
+"""
+
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+
+from evaluator import normalize_concat_to_word
+from response_encodings import ENCODERS
+from trie_solver import normalize_tile
+
+CHARS_PER_TOKEN = 4
+K_MAX = 20
+
+
+def parse_latency(spec: str):
+    """
+    fixed:MS | uniform:LO:HI | normal:MEAN:SD | lognormal:MEDIAN:SIGMA (all in ms).
+    Returns a function rng -> seconds.
+    """
+    kind, *params = spec.split(":")
+    p = [float(x) for x in params]
+    if kind == "fixed" and len(p) == 1:
+        return lambda rng: p[0] / 1000
+    if kind == "uniform" and len(p) == 2:
+        return lambda rng: rng.uniform(p[0], p[1]) / 1000
+    if kind == "normal" and len(p) == 2:
+        return lambda rng: max(0.0, rng.gauss(p[0], p[1])) / 1000
+    if kind == "lognormal" and len(p) == 2:
+        return lambda rng: p[0] * rng.lognormvariate(0.0, p[1]) / 1000
+    raise ValueError(f"Bad latency spec: {spec!r}")
+
+
+def find_tiling(word: str, tiles: List[str]) -> Optional[List[int]]:
+    """Distinct tile positions whose concatenation normalizes to `word`, or None."""
+    texts = [normalize_tile(t) for t in tiles]
+
+    def dfs(pos: int, used: List[int]) -> Optional[List[int]]:
+        if pos == len(word):
+            return used or None
+        for i, t in enumerate(texts):
+            if i in used:
+                continue
+            # Leading whitespace only counts before the word starts
+            body = t.lstrip() if pos == 0 else t
+            if not body:
+                continue
+            if word.startswith(body, pos):
+                found = dfs(pos + len(body), used + [i])
+                if found is not None:
+                    return found
+            else:
+                # A word-final tile may carry trailing whitespace
+                core = body.rstrip()
+                if core and core != body and pos + len(core) == len(word) and word.startswith(core, pos):
+                    return used + [i]
+        return None
+
+    found = dfs(0, [])
+    if found is not None and normalize_concat_to_word("".join(tiles[i] for i in found)) == word:
+        return found
+    return None
+
+
+class Answerer:
+    def __init__(self, strategy: str, rounds_path: Optional[str] = None, k_max: int = K_MAX):
+        self.strategy = strategy
+        self.k_max = k_max
+        self.solutions: Dict[Tuple[str, ...], List[str]] = {}
+        if rounds_path:
+            with open(rounds_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if line:
+                        r = json.loads(line)
+                        self.solutions[tuple(r["tiles"])] = list(r.get("all_solutions", []))
+
+    def constructions(self, tiles: List[str], rng: random.Random) -> List[List[int]]:
+        if self.strategy == "oracle":
+            out = []
+            for w in self.solutions.get(tuple(tiles), []):
+                idx = find_tiling(w, tiles)
+                if idx is not None:
+                    out.append(idx)
+                if len(out) >= self.k_max:
+                    break
+            return out
+
+        out = []
+        n = len(tiles)
+        for _ in range(rng.randint(0, self.k_max)):
+            idx = [rng.randrange(n) for _ in range(rng.randint(1, 4))] if n else [0]
+            roll = rng.random()
+            if roll < 0.1:
+                idx.append(n + rng.randrange(5))  # out of bounds
+            elif roll < 0.2:
+                idx.append(idx[0])  # reused position
+            out.append(idx)
+        return out
+
+    def malformed(self, good: str, rng: random.Random) -> str:
+        kind = rng.randrange(4)
+        if kind == 0:
+            return good[:max(1, len(good) // 2)]
+        if kind == 1:
+            return json.dumps([{"idx": [0, 0, 1, 1, -1]}] * self.k_max)
+        if kind == 2:
+            return "```json\n" + good + "\n```"
+        return json.dumps({"answer": good})
+
+    def answer(self, payload: Any, rng: random.Random, encoding: str = "idx") -> str:
+        if isinstance(payload, dict) and isinstance(payload.get("rounds"), list):
+            body = {"rounds": [
+                {"round": e.get("round", j), "items": [{"idx": c} for c in self.constructions(e.get("tiles", []), rng)]}
+                for j, e in enumerate(payload["rounds"])
+            ]}
+        else:
+            tiles = payload.get("tiles", []) if isinstance(payload, dict) else []
+            cons = self.constructions(tiles, rng)
+            if isinstance(payload, dict) and "output_schema" in payload:
+                body = []
+                for c in cons:
+                    used = [tiles[i] if 0 <= i < len(tiles) else "?" for i in c]
+                    concat = "".join(used)
+                    body.append({"word": normalize_concat_to_word(concat), "used_tokens": used, "concat": concat})
+            elif encoding != "idx":
+                words = [normalize_concat_to_word("".join(tiles[i] for i in c if 0 <= i < len(tiles))) for c in cons]
+                body = ENCODERS[encoding](list(zip(words, cons)))
+            else:
+                body = [{"idx": c} for c in cons]
+
+        # Non-idx encodings come out of their encoder already serialized
+        text = body if isinstance(body, str) else json.dumps(body, ensure_ascii=False)
+        if self.strategy == "malformed":
+            return self.malformed(text, rng)
+        return text
+
+
+class MockHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # listen() backlog; must be set before bind/activate, so it's a class attribute
+    request_queue_size = 1024
+
+
+class MockState:
+    def __init__(self, args):
+        self.answerer = Answerer(args.strategy, args.rounds, args.k_max)
+        self.latency = parse_latency(args.latency)
+        self.tokens_per_s = args.tokens_per_s
+        self.model = args.model
+        self.seed = args.seed
+        self.slots = threading.BoundedSemaphore(args.slots) if args.slots else None
+        self.lock = threading.Lock()
+        self.n_requests = 0
+        self.n_streamed = 0
+        self.n_disconnected = 0
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real server
+    state: MockState = None
+    verbose = False
+
+    def log_message(self, fmt, *args):
+        if self.verbose:
+            super().log_message(fmt, *args)
+
+    def _send_json(self, code: int, obj: Any) -> None:
+        data = json.dumps(obj, ensure_ascii=False).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path.rstrip("/") == "/v1/models":
+            self._send_json(200, {"object": "list", "data": [
+                {"id": self.state.model, "object": "model", "created": 0, "owned_by": "mock"},
+            ]})
+        else:
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}", "type": "not_found"}})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length)
+        if self.path.rstrip("/") != "/v1/chat/completions":
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}", "type": "not_found"}})
+            return
+        try:
+            req = json.loads(body)
+            user_text = next(m["content"] for m in reversed(req["messages"]) if m.get("role") == "user")
+        except (ValueError, KeyError, StopIteration, TypeError) as e:
+            self._send_json(400, {"error": {"message": f"Bad request: {e}", "type": "invalid_request_error"}})
+            return
+        try:
+            payload = json.loads(user_text)
+        except (ValueError, TypeError):
+            payload = {}
+
+        st = self.state
+        rng = random.Random(hashlib.sha256(f"{st.seed}:".encode("utf-8") + body).hexdigest())
+        schema_name = ((req.get("response_format") or {}).get("json_schema") or {}).get("name", "")
+        encoding = schema_name[len("constructions_"):] if schema_name.startswith("constructions_") else "idx"
+        content = st.answerer.answer(payload, rng, encoding if encoding in ENCODERS else "idx")
+        max_tokens = req.get("max_tokens") or 0
+        finish = "stop"
+        if max_tokens and len(content) > max_tokens * CHARS_PER_TOKEN:
+            content = content[:max_tokens * CHARS_PER_TOKEN]
+            finish = "length"
+        usage = {
+            "prompt_tokens": (len(body) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN,
+            "completion_tokens": (len(content) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN,
+        }
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        ttft = st.latency(rng)
+
+        with st.lock:
+            st.n_requests += 1
+        if st.slots is not None:
+            st.slots.acquire()
+        try:
+            if req.get("stream"):
+                with st.lock:
+                    st.n_streamed += 1
+                include_usage = bool((req.get("stream_options") or {}).get("include_usage"))
+                self._stream(content, finish, usage if include_usage else None, ttft)
+            else:
+                time.sleep(ttft + usage["completion_tokens"] / st.tokens_per_s)
+                self._send_json(200, {
+                    "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": req.get("model", st.model),
+                    "choices": [{
+                        "index": 0,
+                        "message": {"role": "assistant", "content": content},
+                        "finish_reason": finish,
+                    }],
+                    "usage": usage,
+                })
+        except (BrokenPipeError, ConnectionResetError):
+            # Client cancelled (e.g. benchmark --early_stop); stop "generating"
+            with st.lock:
+                st.n_disconnected += 1
+            self.close_connection = True
+        finally:
+            if st.slots is not None:
+                st.slots.release()
+
+    def _stream(self, content: str, finish: str, usage: Optional[Dict[str, int]], ttft: float) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        cid = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        created = int(time.time())
+        model = self.state.model
+
+        def event(delta: Dict[str, Any], finish_reason: Optional[str] = None, chunk_usage=None) -> None:
+            chunk = {
+                "id": cid, "object": "chat.completion.chunk", "created": created, "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}] if delta is not None else [],
+            }
+            if chunk_usage is not None:
+                chunk["usage"] = chunk_usage
+            self.wfile.write(b"data: " + json.dumps(chunk, ensure_ascii=False).encode("utf-8") + b"\n\n")
+            self.wfile.flush()
+
+        time.sleep(ttft)
+        event({"role": "assistant", "content": ""})
+        per_token = 1.0 / self.state.tokens_per_s
+        next_t = time.perf_counter()
+        for i in range(0, len(content), CHARS_PER_TOKEN):
+            next_t += per_token
+            delay = next_t - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            event({"content": content[i:i + CHARS_PER_TOKEN]})
+        event({}, finish)
+        if usage is not None:
+            event(None, chunk_usage=usage)
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Mock OpenAI-compatible chat server for offline benchmarking.")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=1234)
+    ap.add_argument("--strategy", choices=["oracle", "random", "malformed"], default="oracle")
+    ap.add_argument("--rounds", default=None, help="Rounds JSONL with all_solutions (for --strategy oracle)")
+    ap.add_argument("--k_max", type=int, default=K_MAX, help="Most constructions per round in an answer")
+    ap.add_argument("--latency", default="fixed:0", help="Time to first token, e.g. fixed:50, lognormal:200:0.5")
+    ap.add_argument("--tokens_per_s", type=float, default=1e6, help="Decode rate per request")
+    ap.add_argument("--slots", type=int, default=0, help="Requests served in parallel (0 = unlimited)")
+    ap.add_argument("--model", default="openai/gpt-oss-20b", help="Model id reported by /v1/models")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--verbose", action="store_true", help="Log every request")
+    args = ap.parse_args()
+
+    if args.strategy == "oracle" and not args.rounds:
+        ap.error("--strategy oracle needs --rounds")
+
+    Handler.state = MockState(args)
+    Handler.verbose = args.verbose
+    server = MockHTTPServer((args.host, args.port), Handler)
+    print(f"Mock server on http://{args.host}:{args.port}/v1 (strategy={args.strategy})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        st = Handler.state
+        print(f"\nServed {st.n_requests} requests ({st.n_streamed} streamed, {st.n_disconnected} cancelled by client)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""
+Fused streaming pipeline: generate -> solve -> benchmark, with no intermediate files.
+
+Every stage is a generator, so rounds are produced only when the benchmark
+has a free request slot (iter_round_results pulls lazily). Memory stays
+constant however many rounds flow through; --n_rounds 0 streams forever.
+--tee_rounds still persists the solved rounds as JSONL when wanted.
+
+To run the code, paste the command below into your terminal:
+
+python pipeline.py ^
+  --dict .\jsons\english_token_dictionary_bow_sp.json ^
+  --n_rounds 1000 ^
+  --variant sp ^
+  --engine sparse ^
+  --concurrency 4 ^
+  --tee_rounds .\rounds\rounds_stream_sp_with_solutions.jsonl
+
+"""
+
+import argparse
+import json
+import random
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, Optional
+
+import benchmark
+from precompute_full_recall import build_indices, iter_solved_rounds
+from precompute_rounds import build_word_pool, iter_rounds, load_dictionary
+from run_journal import RunJournal
+
+
+def tee_jsonl(rounds: Iterable[Dict[str, Any]], path: str) -> Iterator[Dict[str, Any]]:
+    """Writes each round to `path` as it passes through, then yields it unchanged."""
+    out_path = Path(path)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(out_path, "w", encoding="utf-8") as f:
+        for r in rounds:
+            f.write(json.dumps(r, ensure_ascii=False) + "\n")
+            yield r
+
+
+def solved_round_stream(
+    dictionary: Dict[str, Any],
+    variant: str = "sp",
+    n_rounds: Optional[int] = None,
+    k_targets: int = 3,
+    distractors: int = 8,
+    min_tokens: int = 1,
+    max_tokens: int = 4,
+    seed: int = 12345,
+    max_tiles: int = 80,
+    ensure_unique_rounds: bool = False,
+    engine: str = "python",
+    batch_size: int = 256,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Rounds exactly as precompute_rounds.py + precompute_full_recall.py would write
+    them, generated and solved on demand.
+    """
+    pool = build_word_pool(dictionary, variant, min_tokens, max_tokens)
+    if not pool:
+        raise RuntimeError("No eligible words found. Adjust --variant/--min_tokens/--max_tokens.")
+    indices = build_indices(dictionary, variant)
+
+    random.seed(seed)
+    rounds = iter_rounds(
+        dictionary=dictionary,
+        pool=pool,
+        variant=variant,
+        n_rounds=n_rounds,
+        k_targets=k_targets,
+        distractors=distractors,
+        min_tokens=min_tokens,
+        max_tokens=max_tokens,
+        seed=seed,
+        max_tiles=max_tiles,
+        ensure_unique_rounds=ensure_unique_rounds,
+    )
+    return iter_solved_rounds(rounds, indices, variant, engine=engine, batch_size=batch_size)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Generate, solve and benchmark rounds in one streaming pass.")
+    ap.add_argument("--dict", required=True, help="Path to english_token_dictionary_bow_sp.json")
+    ap.add_argument("--n_rounds", type=int, default=benchmark.N_ROUNDS, help="0 = stream until interrupted")
+    ap.add_argument("--variant", choices=["sp", "bow"], default="sp")
+    ap.add_argument("--k_targets", type=int, default=3)
+    ap.add_argument("--distractors", type=int, default=8)
+    ap.add_argument("--seed", type=int, default=12345)
+    ap.add_argument("--min_tokens", type=int, default=1)
+    ap.add_argument("--max_tokens", type=int, default=4)
+    ap.add_argument("--max_tiles", type=int, default=80)
+    ap.add_argument("--ensure_unique_rounds", action="store_true")
+    ap.add_argument("--engine", choices=["python", "sparse", "trie"], default="python",
+                    help="Solver for all_solutions (see precompute_full_recall.py)")
+    ap.add_argument("--solve_batch", type=int, default=256, help="Rounds per batch for --engine sparse")
+    ap.add_argument("--concurrency", type=int, default=benchmark.CONCURRENCY)
+    ap.add_argument("--tee_rounds", default=None, help="Also write the solved rounds to this JSONL")
+    ap.add_argument("--journal", default=None, help="Journal raw responses (see run_journal.py)")
+    ap.add_argument("--report_every", type=int, default=0, help="Print a running summary every N rounds")
+    args = ap.parse_args()
+
+    dictionary = load_dictionary(args.dict)
+    rounds = solved_round_stream(
+        dictionary,
+        variant=args.variant,
+        n_rounds=args.n_rounds or None,
+        k_targets=args.k_targets,
+        distractors=args.distractors,
+        min_tokens=args.min_tokens,
+        max_tokens=args.max_tokens,
+        seed=args.seed,
+        max_tiles=args.max_tiles,
+        ensure_unique_rounds=args.ensure_unique_rounds,
+        engine=args.engine,
+        batch_size=args.solve_batch,
+    )
+    if args.tee_rounds:
+        rounds = tee_jsonl(rounds, args.tee_rounds)
+
+    client = benchmark.make_client(args.concurrency)
+    cfg_hash = benchmark.config_hash()
+    journal = RunJournal(args.journal) if args.journal else None
+    summary = benchmark.RunningSummary()
+
+    t_start = time.perf_counter()
+    try:
+        for i, metrics, raw in benchmark.iter_round_results(client, rounds, args.concurrency):
+            if journal is not None:
+                journal.append(benchmark.journal_record(metrics, raw, cfg_hash))
+            summary.add(metrics)
+            print(f"Round {i+1} (id={metrics['round_id']}) -> {metrics.get('latency_ms')} ms | "
+                  f"prec={metrics.get('precision')} recall={metrics.get('full_recall')} "
+                  f"target={metrics.get('target_recall')} err={metrics.get('error', '')}")
+            if args.report_every and (i + 1) % args.report_every == 0:
+                summary.print(time.perf_counter() - t_start, args.concurrency, summary.n_rows)
+    except KeyboardInterrupt:
+        print("\nInterrupted; summarizing rounds completed so far.")
+    finally:
+        if journal is not None:
+            journal.close()
+
+    summary.print(time.perf_counter() - t_start, args.concurrency, summary.n_rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -6,20 +6,38 @@ python precompute_full_recall.py ^
   --rounds .\rounds\rounds_5000_sp.jsonl ^
   --out .\rounds\rounds_5000_sp_with_solutions.jsonl ^
   --variant sp ^
-  --verify_round_variant
+  --verify_round_variant ^
+  --workers 8
+
+--rounds may also be a .rstore file (see rounds_store.py); with --engine sparse
+its tile id arrays are solved in place, batch by batch.
+
+--idx_tilings also stores each solution's valid idx sequences (see
+idx_tilings.py), so the evaluator scores idx responses by table lookup.
+
+Add --instrument report.json [--profile] for per-phase timings (load,
+index_build, solve, write) and n_solutions histograms (see instrument.py).
 
 """
 
 import json
 import argparse
+import functools
+import itertools
+import multiprocessing as mp
 from pathlib import Path
 from collections import Counter, defaultdict
-from typing import Dict, Any, List, Tuple, Iterable, Set
+from typing import Dict, Any, Callable, List, Optional, Tuple, Iterable, Iterator, Set
+
+import dict_store
+from idx_tilings import MAX_TILINGS_PER_WORD, add_idx_tilings
+from instrument import add_instrument_args, count, instrumented, observe, span, timed_iter
+from rounds_store import RoundsStore, is_store, iter_rounds_file
 
 
 def load_dictionary(path: str) -> Dict[str, Any]:
-    with open(path, "r", encoding="utf-8") as f:
-        return json.load(f)
+    # JSON (either layout) or binary .tokdict, see dict_store.py
+    return dict_store.load_dictionary(path)
 
 
 def iter_jsonl(path: str) -> Iterable[Dict[str, Any]]:
@@ -102,49 +120,302 @@ def compute_solutions_for_round(
     return solutions
 
 
+class IncrementalSolutionCounter:
+    """
+    Solution set of a tile multiset that is built one tile at a time.
+
+    For every token, token_needs[t] lists (word id, count of t the word needs),
+    taken from the token_to_word_ids reverse index. Adding tile t only visits
+    those words: a word's requirement for t becomes met exactly when the
+    available count reaches its need, and the word becomes a solution once all
+    of its distinct tokens are met. Same answers as compute_solutions_for_round
+    for the final tiles, at O(words containing t) per added tile.
+    """
+
+    def __init__(
+        self,
+        word_list: List[str],
+        word_token_counters: List[Counter],
+        token_to_word_ids: Dict[str, List[int]],
+    ):
+        self.word_list = word_list
+        self.n_needed = [len(c) for c in word_token_counters]
+        self.token_needs: Dict[str, List[Tuple[int, int]]] = {
+            t: [(wid, word_token_counters[wid][t]) for wid in ids] for t, ids in token_to_word_ids.items()
+        }
+        self.reset()
+
+    def reset(self) -> None:
+        self.available: Counter = Counter()
+        self.satisfied: Dict[int, int] = {}
+        self.solution_ids: Set[int] = set()
+
+    def add(self, tile: str) -> int:
+        """Adds one tile; returns how many new solutions it completed."""
+        n = self.available[tile] + 1
+        self.available[tile] = n
+        new = 0
+        for wid, need in self.token_needs.get(tile, ()):
+            if need == n:
+                s = self.satisfied.get(wid, 0) + 1
+                self.satisfied[wid] = s
+                if s == self.n_needed[wid]:
+                    self.solution_ids.add(wid)
+                    new += 1
+        return new
+
+    @property
+    def n_solutions(self) -> int:
+        return len(self.solution_ids)
+
+    def solutions(self) -> List[str]:
+        return sorted(self.word_list[i] for i in self.solution_ids)
+
+
+def check_round(r: Dict[str, Any], variant: str, verify_round_variant: bool) -> List[str]:
+    """Validates a round and returns its tiles."""
+    if verify_round_variant:
+        rv = r.get("variant")
+        if rv != variant:
+            raise ValueError(f"Round variant mismatch: round has {rv}, expected {variant}")
+
+    tiles = r.get("tiles")
+    if not isinstance(tiles, list) or any(not isinstance(t, str) for t in tiles):
+        raise ValueError(f"Invalid tiles in round_id={r.get('round_id')}")
+    return tiles
+
+
+def solve_round(
+    r: Dict[str, Any],
+    solve: Callable[[List[str]], List[str]],
+    variant: str,
+    verify_round_variant: bool,
+) -> Dict[str, Any]:
+    """Adds all_solutions / n_solutions to one round dict (in place) and returns it."""
+    tiles = check_round(r, variant, verify_round_variant)
+    with span("solve"):
+        solutions = solve(tiles)
+
+    # Add fields
+    r["all_solutions"] = solutions
+    r["n_solutions"] = len(solutions)
+    return r
+
+
+# Per-worker state for --workers. Set once by _init_worker: with the fork start
+# method the parent's indices are inherited copy-on-write; with spawn they are
+# pickled once per worker, never per shard.
+_WORKER_STATE: Tuple = ()
+
+
+def _init_worker(
+    solve: Callable[[List[str]], List[str]],
+    variant: str,
+    verify_round_variant: bool,
+    add_tilings: Optional[Callable[[Dict[str, Any]], Dict[str, Any]]] = None,
+) -> None:
+    global _WORKER_STATE
+    _WORKER_STATE = (solve, variant, verify_round_variant, add_tilings)
+
+
+def _solve_shard(lines: List[str]) -> Tuple[List[str], List[int]]:
+    """Output lines of a shard and each round's n_solutions (for the parent's histogram)."""
+    solve, variant, verify_round_variant, add_tilings = _WORKER_STATE
+    out = []
+    n_solutions = []
+    for line in lines:
+        r = solve_round(json.loads(line), solve, variant, verify_round_variant)
+        if add_tilings is not None:
+            add_tilings(r)
+        out.append(json.dumps(r, ensure_ascii=False) + "\n")
+        n_solutions.append(r["n_solutions"])
+    return out, n_solutions
+
+
+def make_solver(engine: str, indices) -> Callable[[List[str]], List[str]]:
+    """Per-round solve(tiles) -> sorted solutions for the 'python' and 'trie' engines."""
+    word_list, word_token_counters, token_to_word_ids = indices
+    if engine == "trie":
+        from trie_solver import TrieSolver
+
+        return TrieSolver(word_list).solve
+    if engine == "python":
+        return functools.partial(
+            compute_solutions_for_round,
+            word_list=word_list,
+            word_token_counters=word_token_counters,
+            token_to_word_ids=token_to_word_ids,
+        )
+    raise ValueError(f"Engine {engine!r} has no per-round solver")
+
+
+def iter_solved_rounds(
+    rounds: Iterable[Dict[str, Any]],
+    indices,
+    variant: str,
+    engine: str = "python",
+    verify_round_variant: bool = False,
+    batch_size: int = 256,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Lazily adds all_solutions / n_solutions to a stream of rounds.
+    The sparse engine pulls batch_size rounds at a time; the others go one by one.
+    """
+    if engine != "sparse":
+        solve = make_solver(engine, indices)
+        for r in rounds:
+            yield solve_round(r, solve, variant, verify_round_variant)
+        return
+
+    from sparse_solver import SparseSolver
+
+    solver = SparseSolver(indices[0], indices[1])
+    rounds_iter = iter(rounds)
+    while True:
+        batch = list(itertools.islice(rounds_iter, batch_size))
+        if not batch:
+            return
+        tiles_batch = [check_round(r, variant, verify_round_variant) for r in batch]
+        with span("solve_batch"):
+            solved = solver.solve_batch(tiles_batch)
+        for r, solutions in zip(batch, solved):
+            r["all_solutions"] = solutions
+            r["n_solutions"] = len(solutions)
+            yield r
+
+
+def iter_solved_store(
+    store: RoundsStore,
+    indices,
+    variant: str,
+    verify_round_variant: bool = False,
+    batch_size: int = 256,
+) -> Iterator[Dict[str, Any]]:
+    """iter_solved_rounds(engine="sparse") for a .rstore, solving from its tile id arrays."""
+    from sparse_solver import SparseSolver
+
+    solver = SparseSolver(indices[0], indices[1])
+    for batch in store.iter_batches(batch_size):
+        rounds = batch.rounds()
+        for r in rounds:
+            check_round(r, variant, verify_round_variant)
+        with span("solve_batch"):
+            solved = solver.solve_store_batch(batch)
+        for r, solutions in zip(rounds, solved):
+            r["all_solutions"] = solutions
+            r["n_solutions"] = len(solutions)
+            yield r
+
+
+def canonical_tokens_map(dictionary: Dict[str, Any], variant: str) -> Dict[str, List[str]]:
+    """word -> its dictionary tokens for the variant (the canonical tiling)."""
+    return {w: e[variant]["tokens"] for w, e in dictionary.items() if is_entry_ok(e, variant)}
+
+
+def iter_shards(path: str, shard_size: int) -> Iterable[List[str]]:
+    """Yields the non-empty raw lines of a JSONL file in chunks of shard_size."""
+    with open(path, "r", encoding="utf-8") as f:
+        lines = (line for line in f if line.strip())
+        while True:
+            shard = list(itertools.islice(lines, shard_size))
+            if not shard:
+                return
+            yield shard
+
+
 def main():
     ap = argparse.ArgumentParser(description="Add full-recall solution sets to precomputed rounds JSONL.")
     ap.add_argument("--dict", required=True, help="Path to english_token_dictionary_bow_sp.json")
-    ap.add_argument("--rounds", required=True, help="Input rounds JSONL (precomputed)")
+    ap.add_argument("--rounds", required=True, help="Input rounds JSONL or .rstore (precomputed)")
     ap.add_argument("--out", required=True, help="Output JSONL with full recall fields added")
     ap.add_argument("--variant", choices=["sp", "bow"], default="sp",
                     help="Which tokenisation variant to use for solutions (should match round.variant)")
     ap.add_argument("--verify_round_variant", action="store_true",
                     help="If set, checks each round['variant'] equals --variant and raises if not.")
+    ap.add_argument("--workers", type=int, default=1,
+                    help="Worker processes; >1 solves shards in parallel (output order is unchanged)")
+    ap.add_argument("--shard_size", type=int, default=2000, help="Rounds per shard handed to a worker")
+    ap.add_argument("--engine", choices=["python", "sparse", "trie"], default="python",
+                    help="'python'/'sparse': canonical token multiset fits the tiles (sparse batches with SciPy); "
+                         "'trie': any ordered tiling whose normalized concat is the word (see trie_solver.py)")
+    ap.add_argument("--idx_tilings", action="store_true",
+                    help="Also store each solution's valid idx sequences (see idx_tilings.py)")
+    ap.add_argument("--max_tilings", type=int, default=MAX_TILINGS_PER_WORD,
+                    help="Cap on stored idx sequences per solution; longer lists fall back to string scoring")
+    add_instrument_args(ap)
     args = ap.parse_args()
 
-    dictionary = load_dictionary(args.dict)
-
-    word_list, word_token_counters, token_to_word_ids = build_indices(dictionary, args.variant)
-
-    out_path = Path(args.out)
-    out_path.parent.mkdir(parents=True, exist_ok=True)
-
-    written = 0
-    with open(out_path, "w", encoding="utf-8") as out_f:
-        for r in iter_jsonl(args.rounds):
-            if args.verify_round_variant:
-                rv = r.get("variant")
-                if rv != args.variant:
-                    raise ValueError(f"Round variant mismatch: round has {rv}, expected {args.variant}")
-
-            tiles = r.get("tiles")
-            if not isinstance(tiles, list) or any(not isinstance(t, str) for t in tiles):
-                raise ValueError(f"Invalid tiles in round_id={r.get('round_id')}")
-
-            solutions = compute_solutions_for_round(
-                tiles=tiles,
-                word_list=word_list,
-                word_token_counters=word_token_counters,
-                token_to_word_ids=token_to_word_ids,
-            )
-
-            # Add fields
-            r["all_solutions"] = solutions
-            r["n_solutions"] = len(solutions)
-
-            out_f.write(json.dumps(r, ensure_ascii=False) + "\n")
-            written += 1
+    if args.engine == "sparse" and args.workers > 1:
+        ap.error("--engine sparse is already vectorized; use it with --workers 1")
+    rounds_is_store = is_store(args.rounds)
+    if rounds_is_store and args.workers > 1:
+        ap.error("--workers shards JSONL lines; convert the .rstore back with rounds_store.py first")
+
+    with instrumented(args, "precompute_full_recall"):
+        with span("load"):
+            dictionary = load_dictionary(args.dict)
+
+        with span("index_build"):
+            indices = build_indices(dictionary, args.variant)
+            add_tilings = None
+            if args.idx_tilings:
+                add_tilings = functools.partial(
+                    add_idx_tilings,
+                    canonical_tokens=canonical_tokens_map(dictionary, args.variant).get,
+                    max_per_word=args.max_tilings,
+                )
+        del dictionary
+
+        out_path = Path(args.out)
+        out_path.parent.mkdir(parents=True, exist_ok=True)
+
+        written = 0
+        with open(out_path, "w", encoding="utf-8") as out_f:
+
+            def write_round(r: Dict[str, Any]) -> None:
+                if add_tilings is not None:
+                    with span("idx_tilings"):
+                        add_tilings(r)
+                observe("n_solutions", r["n_solutions"])
+                with span("write"):
+                    out_f.write(json.dumps(r, ensure_ascii=False) + "\n")
+
+            if args.workers > 1:
+                # Prefer fork so workers share the indices copy-on-write instead of unpickling them.
+                methods = mp.get_all_start_methods()
+                ctx = mp.get_context("fork" if "fork" in methods else None)
+                with ctx.Pool(
+                    processes=args.workers,
+                    initializer=_init_worker,
+                    initargs=(make_solver(args.engine, indices), args.variant, args.verify_round_variant, add_tilings),
+                ) as pool:
+                    # imap keeps shard order, so the merged output is in input (round_id) order.
+                    # Worker spans stay in the workers; "solve" here is the wait for each shard.
+                    shards = pool.imap(_solve_shard, iter_shards(args.rounds, args.shard_size))
+                    for shard_out, n_solutions in timed_iter("solve", shards):
+                        for n in n_solutions:
+                            observe("n_solutions", n)
+                        with span("write"):
+                            out_f.writelines(shard_out)
+                        written += len(shard_out)
+            elif rounds_is_store and args.engine == "sparse":
+                store = RoundsStore(args.rounds)
+                for r in iter_solved_store(store, indices, args.variant, args.verify_round_variant, args.shard_size):
+                    write_round(r)
+                    written += 1
+                store.close()
+            else:
+                for r in iter_solved_rounds(
+                    iter_rounds_file(args.rounds),
+                    indices,
+                    args.variant,
+                    engine=args.engine,
+                    verify_round_variant=args.verify_round_variant,
+                    batch_size=args.shard_size,
+                ):
+                    write_round(r)
+                    written += 1
+        count("rounds", written)
 
     print(f"Wrote {written} rounds with full recall to: {out_path}")
 
@@ -13,20 +13,42 @@ python precompute_rounds.py ^
   --seed 12345 ^
   --ensure_unique_rounds
 
+Add --seeding per_round [--workers N] [--append] for sharded / extendable generation.
+
+With --ensure_unique_rounds, rounds are compared by a 64-bit multiset hash
+(see round_hash.py). Add --seen_from other.jsonl ... to stay unique against
+earlier files or other shards, --hash_bits 128 for a wider hash, and
+--bloom_error_rate 0.01 to keep those files' hashes on disk behind a Bloom filter.
+
+Add --n_solutions_bins "1-8:0.25,9-16:0.5,17-:0.25" to control difficulty: the
+solution set is kept up to date as each tile is added, rounds are accepted only
+while their n_solutions bin has quota left, and all_solutions / n_solutions are
+written in the same pass (no precompute_full_recall.py run needed).
+--with_solutions alone writes the same rounds as without it, plus solutions.
+
+Add --instrument report.json [--profile] for per-phase timings (load, pool,
+generate, write), rejection counters and n_tiles / n_solutions histograms
+(see instrument.py).
+
 """
 
 
 import json
 import random
 import argparse
+import multiprocessing as mp
 from pathlib import Path
-from typing import Dict, Any, List, Tuple
-from collections import Counter
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+
+import dict_store
+from precompute_full_recall import IncrementalSolutionCounter, build_indices
+from instrument import add_instrument_args, count, instrumented, observe, span, timed_iter
+from round_hash import SeenRounds, multiset_hash
 
 
 def load_dictionary(path: str) -> Dict[str, Any]:
-    with open(path, "r", encoding="utf-8") as f:
-        return json.load(f)
+    # JSON (either layout) or binary .tokdict, see dict_store.py
+    return dict_store.load_dictionary(path)
 
 
 def is_entry_ok(entry: Any, variant: str) -> bool:
@@ -56,6 +78,7 @@ def pick_targets(
     variant: str,
     k_targets: int,
     max_attempts: int = 2000,
+    rng=random,
 ) -> List[str]:
     """
     Pick k_targets words. Attempts to avoid duplicates and to prefer variety in token sequences.
@@ -64,7 +87,7 @@ def pick_targets(
         raise ValueError("Pool too small for requested number of targets.")
 
     for _ in range(max_attempts):
-        targets = random.sample(pool, k_targets)
+        targets = rng.sample(pool, k_targets)
         # Optional: you can add additional constraints here (e.g., disallow identical first token).
         return targets
 
@@ -76,12 +99,13 @@ def sample_distractor_tokens(
     dictionary: Dict[str, Any],
     variant: str,
     n_distractors: int,
+    rng=random,
 ) -> List[str]:
     distractors = []
     for _ in range(n_distractors):
-        w = random.choice(pool)
+        w = rng.choice(pool)
         toks = dictionary[w][variant]["tokens"]
-        distractors.append(random.choice(toks))
+        distractors.append(rng.choice(toks))
     return distractors
 
 
@@ -92,8 +116,11 @@ def round_tiles_from_targets(
     n_distractors: int,
     pool_for_distractors: List[str],
     shuffle_tiles: bool = True,
+    rng=random,
 ) -> Tuple[List[str], Dict[str, List[str]]]:
     """
+    `rng` is any object with the random module's interface (default: the global state).
+
     Returns:
       tiles: list of token strings (multiset)
       target_map: {word: [token strings used for that word in chosen variant]}
@@ -106,14 +133,360 @@ def round_tiles_from_targets(
         target_map[w] = toks
         tiles.extend(toks)
 
-    tiles.extend(sample_distractor_tokens(pool_for_distractors, dictionary, variant, n_distractors))
+    tiles.extend(sample_distractor_tokens(pool_for_distractors, dictionary, variant, n_distractors, rng=rng))
 
     if shuffle_tiles:
-        random.shuffle(tiles)
+        rng.shuffle(tiles)
 
     return tiles, target_map
 
 
+def round_tiles_counted(
+    targets: List[str],
+    dictionary: Dict[str, Any],
+    variant: str,
+    n_distractors: int,
+    pool_for_distractors: List[str],
+    counter: IncrementalSolutionCounter,
+    max_solutions: Optional[int] = None,
+    shuffle_tiles: bool = True,
+    rng=random,
+) -> Optional[Tuple[List[str], Dict[str, List[str]]]]:
+    """
+    round_tiles_from_targets that feeds every tile into `counter` as it is added
+    (counter.solutions() is the round's solution set afterwards). Draws from
+    `rng` in the same order, so without pruning the tiles are identical.
+
+    Returns None as soon as more than max_solutions words fit: solutions only
+    grow with more tiles, so the round can no longer get easier.
+    """
+    counter.reset()
+    tiles: List[str] = []
+    target_map: Dict[str, List[str]] = {}
+
+    def add(t: str) -> bool:
+        tiles.append(t)
+        counter.add(t)
+        return max_solutions is None or counter.n_solutions <= max_solutions
+
+    for w in targets:
+        toks = dictionary[w][variant]["tokens"]
+        target_map[w] = toks
+        for t in toks:
+            if not add(t):
+                return None
+
+    for _ in range(n_distractors):
+        w = rng.choice(pool_for_distractors)
+        toks = dictionary[w][variant]["tokens"]
+        if not add(rng.choice(toks)):
+            return None
+
+    if shuffle_tiles:
+        rng.shuffle(tiles)
+
+    return tiles, target_map
+
+
+def parse_n_solutions_bins(spec: str, n_rounds: int) -> List[List[Optional[int]]]:
+    """
+    "1-8:0.25,9-16:0.5,17-:0.25" -> [[lo, hi, quota], ...] with hi=None for an
+    open bin. Shares are normalized and turned into round counts summing to
+    n_rounds (largest remainder).
+    """
+    bins = []
+    for part in spec.split(","):
+        rng_part, _, share = part.strip().partition(":")
+        lo, dash, hi = rng_part.partition("-")
+        if not dash:
+            hi = lo  # "5" is the single-value bin 5-5
+        bins.append([int(lo), int(hi) if hi else None, float(share or 1)])
+    total = sum(b[2] for b in bins)
+    if total <= 0:
+        raise ValueError(f"Bin shares must add up to > 0: {spec!r}")
+    exact = [b[2] / total * n_rounds for b in bins]
+    quotas = [int(x) for x in exact]
+    by_remainder = sorted(range(len(bins)), key=lambda i: exact[i] - quotas[i], reverse=True)
+    for i in by_remainder[:n_rounds - sum(quotas)]:
+        quotas[i] += 1
+    return [[lo, hi, q] for (lo, hi, _), q in zip(bins, quotas)]
+
+
+def find_bin(n: int, bins: List[List[Optional[int]]]) -> Optional[List[Optional[int]]]:
+    for b in bins:
+        if b[0] <= n and (b[1] is None or n <= b[1]):
+            return b
+    return None
+
+
+def open_bins_max(bins: List[List[Optional[int]]]) -> Optional[int]:
+    """Largest n_solutions any bin with quota left accepts (None = unbounded)."""
+    his = [b[1] for b in bins if b[2] > 0]
+    if any(hi is None for hi in his):
+        return None
+    return max(his) if his else -1
+
+
+def make_round_obj(
+    round_id: int,
+    variant: str,
+    tiles: List[str],
+    target_map: Dict[str, List[str]],
+    meta: Dict[str, Any],
+) -> Dict[str, Any]:
+    return {
+        "round_id": round_id,
+        "variant": variant,
+        "tiles": tiles,
+        "targets": list(target_map.keys()),
+        "target_tokens": target_map,  # explicit ground truth token sequences
+        "meta": meta,
+    }
+
+
+def iter_rounds(
+    dictionary: Dict[str, Any],
+    pool: List[str],
+    variant: str,
+    n_rounds: Optional[int],
+    k_targets: int,
+    distractors: int,
+    min_tokens: int,
+    max_tokens: int,
+    seed: int,
+    max_tiles: int = 80,
+    ensure_unique_rounds: bool = False,
+    max_stall: int = 10000,
+    counter: Optional[IncrementalSolutionCounter] = None,
+    bins: Optional[List[List[Optional[int]]]] = None,
+    max_attempts: Optional[int] = None,
+    seen_rounds: Optional[SeenRounds] = None,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Yields round dicts (the JSONL records) one at a time, drawing from the global
+    `random` state; seed it before iterating. n_rounds=None streams forever.
+
+    With a `counter`, each round also gets all_solutions / n_solutions. With
+    `bins` (see parse_n_solutions_bins; needs a counter) a round is only
+    accepted while its n_solutions bin has quota left, and is abandoned while
+    tiles are still being added once it outgrows every open bin. Quotas are
+    decremented in place.
+
+    ensure_unique_rounds checks against `seen_rounds` (a fresh SeenRounds by
+    default; pass one pre-loaded with other files to stay unique against them).
+
+    Stops early (yielding fewer than n_rounds) after max_attempts (default
+    n_rounds * 20) attempts, or raises if max_stall attempts in a row are
+    rejected in endless mode.
+    """
+    if seen_rounds is None:
+        seen_rounds = SeenRounds()
+    meta = {
+        "k_targets": k_targets,
+        "distractors": distractors,
+        "min_tokens": min_tokens,
+        "max_tokens": max_tokens,
+        "seed": seed,
+    }
+    if bins is not None:
+        meta["n_solutions_bins"] = [b[:2] for b in bins]
+
+    written = 0
+    attempts = 0
+    stall = 0
+    if max_attempts is None and n_rounds is not None:
+        max_attempts = n_rounds * 20  # avoid infinite loops with strict constraints
+
+    while n_rounds is None or (written < n_rounds and attempts < max_attempts):
+        attempts += 1
+        stall += 1
+        count("attempts")
+        if n_rounds is None and stall > max_stall:
+            raise RuntimeError(f"{max_stall} rounds in a row were rejected; relax constraints.")
+
+        targets = pick_targets(pool, dictionary, variant, k_targets)
+        if counter is None:
+            tiles, target_map = round_tiles_from_targets(
+                targets=targets,
+                dictionary=dictionary,
+                variant=variant,
+                n_distractors=distractors,
+                pool_for_distractors=pool,
+                shuffle_tiles=True,
+            )
+        else:
+            built = round_tiles_counted(
+                targets=targets,
+                dictionary=dictionary,
+                variant=variant,
+                n_distractors=distractors,
+                pool_for_distractors=pool,
+                counter=counter,
+                max_solutions=open_bins_max(bins) if bins is not None else None,
+            )
+            if built is None:
+                count("rejected_max_solutions")
+                continue
+            tiles, target_map = built
+
+        if len(tiles) > max_tiles:
+            count("rejected_max_tiles")
+            continue
+
+        target_bin = None
+        if bins is not None:
+            target_bin = find_bin(counter.n_solutions, bins)
+            if target_bin is None or target_bin[2] <= 0:
+                count("rejected_bin_full")
+                continue
+
+        # Optional: ensure rounds are unique by multiset hash
+        if ensure_unique_rounds and not seen_rounds.add_if_new(multiset_hash(tiles, seen_rounds.bits)):
+            count("rejected_duplicate")
+            continue
+
+        round_obj = make_round_obj(written, variant, tiles, target_map, meta)
+        if counter is not None:
+            round_obj["all_solutions"] = counter.solutions()
+            round_obj["n_solutions"] = len(round_obj["all_solutions"])
+        if target_bin is not None:
+            target_bin[2] -= 1
+        yield round_obj
+        written += 1
+        stall = 0
+
+
+def round_rng(seed: int, round_id: int, attempt: int = 0) -> random.Random:
+    """
+    Independent RNG for one round attempt. String seeds go through SHA-512 in
+    random.seed, so this is stable across runs, platforms and PYTHONHASHSEED.
+    """
+    return random.Random(f"{seed}:{round_id}:{attempt}")
+
+
+def generate_round(
+    dictionary: Dict[str, Any],
+    pool: List[str],
+    variant: str,
+    round_id: int,
+    attempt: int,
+    k_targets: int,
+    distractors: int,
+    max_tiles: int,
+    meta: Dict[str, Any],
+) -> Optional[Dict[str, Any]]:
+    """
+    One per-round-seeded candidate, or None if it exceeds max_tiles.
+    Depends only on (seed, round_id, attempt), so any round can be regenerated
+    on its own. Attempts > 0 are only used when an earlier attempt is rejected.
+    """
+    rng = round_rng(meta["seed"], round_id, attempt)
+    targets = pick_targets(pool, dictionary, variant, k_targets, rng=rng)
+    tiles, target_map = round_tiles_from_targets(
+        targets=targets,
+        dictionary=dictionary,
+        variant=variant,
+        n_distractors=distractors,
+        pool_for_distractors=pool,
+        shuffle_tiles=True,
+        rng=rng,
+    )
+    if len(tiles) > max_tiles:
+        return None
+    return make_round_obj(round_id, variant, tiles, target_map, meta)
+
+
+# Worker state for --workers; set by _init_worker (inherited on fork).
+_WORKER_ARGS: Tuple = ()
+
+
+def _init_worker(*args) -> None:
+    global _WORKER_ARGS
+    _WORKER_ARGS = args
+
+
+def _first_candidate(round_id: int) -> Optional[Dict[str, Any]]:
+    dictionary, pool, variant, k_targets, distractors, max_tiles, meta = _WORKER_ARGS
+    return generate_round(dictionary, pool, variant, round_id, 0, k_targets, distractors, max_tiles, meta)
+
+
+def iter_rounds_per_round(
+    dictionary: Dict[str, Any],
+    pool: List[str],
+    variant: str,
+    start_round: int,
+    n_rounds: int,
+    k_targets: int,
+    distractors: int,
+    min_tokens: int,
+    max_tokens: int,
+    seed: int,
+    max_tiles: int = 80,
+    ensure_unique_rounds: bool = False,
+    seen_rounds: Optional[SeenRounds] = None,
+    workers: int = 1,
+    max_attempts_per_round: int = 20,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Yields rounds start_round .. start_round + n_rounds - 1, each drawn from
+    round_rng(seed, round_id, attempt). Attempt 0 of every round is generated in
+    parallel by `workers` processes; uniqueness is checked here, in round_id
+    order, and a rejected round retries with attempt 1, 2, ... . The output is
+    therefore identical for any worker count, and a longer run with the same
+    seed starts with exactly the rounds of a shorter one.
+
+    seen_rounds may be pre-loaded (e.g. with the existing file, or other shards)
+    to keep an extension unique against them.
+    """
+    meta = {
+        "k_targets": k_targets,
+        "distractors": distractors,
+        "min_tokens": min_tokens,
+        "max_tokens": max_tokens,
+        "seed": seed,
+        "seeding": "per_round",
+    }
+    if seen_rounds is None:
+        seen_rounds = SeenRounds()
+    round_ids = range(start_round, start_round + n_rounds)
+    worker_args = (dictionary, pool, variant, k_targets, distractors, max_tiles, meta)
+
+    def accept(round_id: int, candidate: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        attempt = 0
+        while True:
+            if candidate is not None:
+                if not ensure_unique_rounds:
+                    return candidate
+                if seen_rounds.add_if_new(multiset_hash(candidate["tiles"], seen_rounds.bits)):
+                    return candidate
+            attempt += 1
+            if attempt >= max_attempts_per_round:
+                raise RuntimeError(f"Round {round_id}: no acceptable round in {max_attempts_per_round} attempts; "
+                                   f"relax constraints.")
+            candidate = generate_round(dictionary, pool, variant, round_id, attempt,
+                                       k_targets, distractors, max_tiles, meta)
+
+    if workers > 1:
+        methods = mp.get_all_start_methods()
+        ctx = mp.get_context("fork" if "fork" in methods else None)
+        window = workers * 4096  # bounds how far workers run ahead of the writer
+        with ctx.Pool(processes=workers, initializer=_init_worker, initargs=worker_args) as mp_pool:
+            for lo in range(0, len(round_ids), window):
+                ids = round_ids[lo:lo + window]
+                for round_id, candidate in zip(ids, mp_pool.imap(_first_candidate, ids, chunksize=256)):
+                    yield accept(round_id, candidate)
+    else:
+        _init_worker(*worker_args)
+        for round_id in round_ids:
+            yield accept(round_id, _first_candidate(round_id))
+
+
+def count_lines(path: str) -> int:
+    """Number of rounds in an existing JSONL."""
+    with open(path, "r", encoding="utf-8") as f:
+        return sum(1 for line in f if line.strip())
+
+
 def main():
     ap = argparse.ArgumentParser(description="Precompute token-tile anagram rounds (JSONL).")
     ap.add_argument("--dict", required=True, help="Path to english_token_dictionary_bow_sp.json")
@@ -131,67 +504,123 @@ def main():
     # Safety valves
     ap.add_argument("--max_tiles", type=int, default=80, help="Hard cap to avoid huge tile sets")
     ap.add_argument("--ensure_unique_rounds", action="store_true", help="Avoid exact duplicate tile-multisets")
-
+    ap.add_argument("--seen_from", nargs="+", default=[], metavar="JSONL",
+                    help="Also stay unique against the rounds in these files (earlier runs, other shards)")
+    ap.add_argument("--hash_bits", type=int, choices=[64, 128], default=64, help="Multiset hash width")
+    ap.add_argument("--bloom_error_rate", type=float, default=None,
+                    help="Keep --seen_from hashes memory-mapped behind a Bloom filter with this false-positive rate")
+
+    # Per-round seeding: round k depends only on (seed, k), so it can be sharded/extended
+    ap.add_argument("--seeding", choices=["global", "per_round"], default="global",
+                    help="'global': one random.seed for the whole file (original behaviour); "
+                         "'per_round': independent RNG per round_id")
+    ap.add_argument("--workers", type=int, default=1, help="Generator processes (per_round seeding only)")
+    ap.add_argument("--append", action="store_true",
+                    help="Extend an existing per_round file up to --n_rounds total, keeping its prefix")
+
+    # Difficulty targeting: solutions are counted while the round is built
+    ap.add_argument("--with_solutions", action="store_true",
+                    help="Also write all_solutions / n_solutions (same as precompute_full_recall.py --engine python)")
+    ap.add_argument("--n_solutions_bins", default=None, metavar="LO-HI:SHARE,...",
+                    help="Target n_solutions histogram, e.g. '1-8:0.25,9-16:0.5,17-:0.25' (implies --with_solutions)")
+    ap.add_argument("--max_attempts", type=int, default=None,
+                    help="Give up after this many candidate rounds (default: 20 * --n_rounds)")
+
+    add_instrument_args(ap)
     args = ap.parse_args()
 
-    random.seed(args.seed)
-
-    dictionary = load_dictionary(args.dict)
-
-    pool = build_word_pool(dictionary, args.variant, args.min_tokens, args.max_tokens)
-    if not pool:
-        raise RuntimeError("No eligible words found. Adjust --variant/--min_tokens/--max_tokens.")
-
-    out_path = Path(args.out)
-    out_path.parent.mkdir(parents=True, exist_ok=True)
-
-    seen_signatures = set()
-
-    written = 0
-    attempts = 0
-    max_attempts = args.n_rounds * 20  # avoid infinite loops with strict constraints
-
-    with open(out_path, "w", encoding="utf-8") as f:
-        while written < args.n_rounds and attempts < max_attempts:
-            attempts += 1
-
-            targets = pick_targets(pool, dictionary, args.variant, args.k_targets)
-            tiles, target_map = round_tiles_from_targets(
-                targets=targets,
+    if args.seeding == "global" and (args.workers > 1 or args.append):
+        ap.error("--workers and --append need --seeding per_round")
+    if args.seeding == "per_round" and (args.with_solutions or args.n_solutions_bins):
+        ap.error("--with_solutions and --n_solutions_bins need --seeding global")
+    if args.seen_from and not args.ensure_unique_rounds:
+        ap.error("--seen_from needs --ensure_unique_rounds")
+
+    with instrumented(args, "precompute_rounds"):
+        seen = SeenRounds(args.hash_bits, args.bloom_error_rate)
+        if args.seen_from:
+            print(f"Loaded {seen.load(args.seen_from)} round hashes from {len(args.seen_from)} file(s)")
+
+        random.seed(args.seed)
+
+        with span("load"):
+            dictionary = load_dictionary(args.dict)
+
+        with span("pool"):
+            pool = build_word_pool(dictionary, args.variant, args.min_tokens, args.max_tokens)
+        if not pool:
+            raise RuntimeError("No eligible words found. Adjust --variant/--min_tokens/--max_tokens.")
+
+        out_path = Path(args.out)
+        out_path.parent.mkdir(parents=True, exist_ok=True)
+
+        if args.seeding == "per_round":
+            start_round = 0
+            if args.append and out_path.exists():
+                start_round = count_lines(str(out_path))
+                if args.ensure_unique_rounds:
+                    seen.load([str(out_path)])
+            rounds = iter_rounds_per_round(
                 dictionary=dictionary,
+                pool=pool,
                 variant=args.variant,
-                n_distractors=args.distractors,
-                pool_for_distractors=pool,
-                shuffle_tiles=True,
+                start_round=start_round,
+                n_rounds=max(0, args.n_rounds - start_round),
+                k_targets=args.k_targets,
+                distractors=args.distractors,
+                min_tokens=args.min_tokens,
+                max_tokens=args.max_tokens,
+                seed=args.seed,
+                max_tiles=args.max_tiles,
+                ensure_unique_rounds=args.ensure_unique_rounds,
+                seen_rounds=seen,
+                workers=args.workers,
+            )
+        else:
+            start_round = 0
+            counter = None
+            bins = None
+            if args.with_solutions or args.n_solutions_bins:
+                with span("index_build"):
+                    counter = IncrementalSolutionCounter(*build_indices(dictionary, args.variant))
+            if args.n_solutions_bins:
+                bins = parse_n_solutions_bins(args.n_solutions_bins, args.n_rounds)
+            rounds = iter_rounds(
+                dictionary=dictionary,
+                pool=pool,
+                variant=args.variant,
+                n_rounds=args.n_rounds,
+                k_targets=args.k_targets,
+                distractors=args.distractors,
+                min_tokens=args.min_tokens,
+                max_tokens=args.max_tokens,
+                seed=args.seed,
+                max_tiles=args.max_tiles,
+                ensure_unique_rounds=args.ensure_unique_rounds,
+                counter=counter,
+                bins=bins,
+                max_attempts=args.max_attempts,
+                seen_rounds=seen,
             )
 
-            if len(tiles) > args.max_tiles:
-                continue
-
-            # Optional: ensure rounds are unique by multiset signature
-            if args.ensure_unique_rounds:
-                sig = tuple(sorted(Counter(tiles).items()))
-                if sig in seen_signatures:
-                    continue
-                seen_signatures.add(sig)
-
-            round_obj = {
-                "round_id": written,
-                "variant": args.variant,
-                "tiles": tiles,
-                "targets": list(target_map.keys()),
-                "target_tokens": target_map,  # explicit ground truth token sequences
-                "meta": {
-                    "k_targets": args.k_targets,
-                    "distractors": args.distractors,
-                    "min_tokens": args.min_tokens,
-                    "max_tokens": args.max_tokens,
-                    "seed": args.seed,
-                },
-            }
-
-            f.write(json.dumps(round_obj, ensure_ascii=False) + "\n")
-            written += 1
+        written = start_round
+        with open(out_path, "a" if args.append else "w", encoding="utf-8") as f:
+            for round_obj in timed_iter("generate", rounds):
+                observe("n_tiles", len(round_obj["tiles"]))
+                if "n_solutions" in round_obj:
+                    observe("n_solutions", round_obj["n_solutions"])
+                with span("write"):
+                    f.write(json.dumps(round_obj, ensure_ascii=False) + "\n")
+                written += 1
+        count("rounds", written - start_round)
+
+    if args.ensure_unique_rounds:
+        print(seen.report())
+
+    if args.n_solutions_bins:
+        for lo, hi, left in bins:
+            label = f"{lo}-{'' if hi is None else hi}"
+            print(f"n_solutions {label}: {left} rounds short" if left else f"n_solutions {label}: filled")
 
     if written < args.n_rounds:
         raise RuntimeError(f"Only wrote {written}/{args.n_rounds} rounds; relax constraints or increase max_attempts.")
@@ -0,0 +1,160 @@
+"""
+Content-addressed on-disk cache of model responses.
+
+At temperature 0 the same request body gives a reproducible answer, so a rerun
+can reuse it instead of calling the model again. Entries are keyed by a
+SHA-256 of the canonical JSON request body (model, messages, temperature,
+max_tokens, response_format, ...; transport-only fields like stream/timeout
+are left out) and stored in SQLite:
+
+  responses(key PRIMARY KEY, body, size, last_access)   + index on last_access
+  meta("bytes")                                          running total of `size`
+
+The total body size is kept under `max_bytes` by evicting least recently used
+entries on every put. SQLite (WAL mode) provides the locking, so any number of
+worker threads, or several processes, can share one cache file; every thread
+gets its own connection.
+
+Only requests with temperature 0 are cached unless any_temperature=True.
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+# Request fields that don't change the answer
+TRANSPORT_KEYS = ("stream", "stream_options", "timeout")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    body TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_lru ON responses(last_access);
+CREATE TABLE IF NOT EXISTS meta (k TEXT PRIMARY KEY, v INTEGER NOT NULL);
+INSERT OR IGNORE INTO meta (k, v) VALUES ('bytes', 0);
+"""
+
+
+def request_key(request: Dict[str, Any]) -> str:
+    body = {k: v for k, v in request.items() if k not in TRANSPORT_KEYS}
+    blob = json.dumps(body, sort_keys=True, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return hashlib.sha256(blob).hexdigest()
+
+
+class ResponseCache:
+    def __init__(self, path: str, max_bytes: int = 512 * 1024 * 1024, any_temperature: bool = False):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.any_temperature = any_temperature
+
+        self._local = threading.local()
+        self._conns: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(_SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # Autocommit; writes use explicit BEGIN IMMEDIATE transactions
+            conn = sqlite3.connect(self.path, timeout=30.0, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            with self._lock:
+                self._conns.append(conn)
+        return conn
+
+    def cacheable(self, request: Dict[str, Any]) -> bool:
+        return self.any_temperature or not request.get("temperature")
+
+    def get(self, request: Dict[str, Any]) -> Optional[str]:
+        """Cached response content for `request`, or None (counted as a miss)."""
+        if not self.cacheable(request):
+            return None
+        key = request_key(request)
+        conn = self._conn()
+        row = conn.execute("SELECT body FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            with self._lock:
+                self.misses += 1
+            return None
+        conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (time.time(), key))
+        with self._lock:
+            self.hits += 1
+        return row[0]
+
+    def put(self, request: Dict[str, Any], body: str) -> None:
+        if not self.cacheable(request) or not body:
+            return
+        key = request_key(request)
+        size = len(body.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            old = conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, body, size, last_access) VALUES (?, ?, ?, ?)",
+                (key, body, size, time.time()),
+            )
+            conn.execute("UPDATE meta SET v = v + ? WHERE k = 'bytes'", (size - (old[0] if old else 0),))
+            total = conn.execute("SELECT v FROM meta WHERE k = 'bytes'").fetchone()[0]
+            evicted = 0
+            while total > self.max_bytes:
+                victims = conn.execute(
+                    "SELECT key, size FROM responses WHERE key != ? ORDER BY last_access LIMIT 64", (key,)
+                ).fetchall()
+                if not victims:
+                    break
+                for vkey, vsize in victims:
+                    conn.execute("DELETE FROM responses WHERE key = ?", (vkey,))
+                    total -= vsize
+                    evicted += 1
+                    if total <= self.max_bytes:
+                        break
+                conn.execute("UPDATE meta SET v = ? WHERE k = 'bytes'", (total,))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        if evicted:
+            with self._lock:
+                self.evictions += evicted
+
+    def size_bytes(self) -> int:
+        return self._conn().execute("SELECT v FROM meta WHERE k = 'bytes'").fetchone()[0]
+
+    def __len__(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def report(self) -> None:
+        lookups = self.hits + self.misses
+        rate = self.hits / lookups if lookups else 0.0
+        print(f"Response cache: {self.hits} hits / {self.misses} misses ({rate:.1%} hit rate), "
+              f"{self.evictions} evicted, {len(self)} entries, "
+              f"{self.size_bytes() / 2**20:.1f}/{self.max_bytes / 2**20:.1f} MB")
+
+    def close(self) -> None:
+        with self._lock:
+            for conn in self._conns:
+                conn.close()
+            self._conns = []
+        self._local = threading.local()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
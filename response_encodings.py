@@ -0,0 +1,161 @@
+"""
+Response encodings: how the model writes its constructions.
+
+  idx         [{"idx": [1, 0]}, {"idx": [4]}]   the original format (benchmark.RESPONSE_FORMAT)
+  int_arrays  [[1, 0], [4]]                      the same positions without the per-item key
+  delimited   "1 0;4"                            one string: positions split by ' ', constructions by ';'
+  words       ["inky", "ab"]                     words only; tilings are reconstructed from the tiles
+
+Each encoding has a system prompt, a strict JSON schema, a decoder and an
+encoder. Decoders turn a raw response into the [{"idx": [...]}, ...] items
+evaluate_idx scores, salvaging the complete constructions of a truncated
+response. A word the tiles can't spell decodes to {"word": w}, which
+evaluate_idx(words_ok=True) counts as a wrong prediction. Encoders write a
+list of (word, idx) constructions the way the model would; token_budget.py
+counts their tokens.
+"""
+
+import json
+import re
+from typing import Any, Callable, Dict, List, Tuple
+
+from idx_tilings import round_idx_tilings
+from stream_parser import salvage_items
+
+# Complete JSON strings of a (possibly truncated) array
+_STRING_PATTERN = re.compile(r'"((?:[^"\\]|\\.)*)"')
+
+_COMMON_RULES = """The tiles at those positions, joined, with 'Ġ'->' ' and 'Ċ'->'\\n', then stripped and lowercased, must spell a dictionary word.
+Positions are 0-based indices into the tiles, in concatenation order, each position used at most once.
+"""
+
+PROMPTS = {
+    "int_arrays": """Output ONLY a compact JSON list of up to {k_max} constructions from the tiles, without whitespace. No reasoning, explanations, or extra text.
+
+Each construction is a list of tile positions [i, j, ...].
+""" + _COMMON_RULES + """Example: tiles=["ky", "Ġin", "x"] -> [[1,0]] spells "inky".
+If none, output [].
+""",
+    "delimited": """Output ONLY one JSON string holding up to {k_max} constructions from the tiles. No reasoning, explanations, or extra text.
+
+Each construction is its tile positions separated by single spaces; constructions are separated by ';'.
+""" + _COMMON_RULES + """Example: tiles=["ky", "Ġin", "x", "Ġa"] -> "1 0;3" spells "inky" and "a".
+If none, output "".
+""",
+    "words": """Output ONLY a compact JSON list of up to {k_max} dictionary words that can be built from the tiles, without whitespace. No reasoning, explanations, or extra text.
+
+A word can be built if some tiles, each used at most once, joined in some order, with 'Ġ'->' ' and 'Ċ'->'\\n', then stripped and lowercased, spell it.
+Example: tiles=["ky", "Ġin", "x"] -> ["inky"].
+If none, output [].
+""",
+}
+
+
+def schema(encoding: str, k_max: int) -> Dict[str, Any]:
+    """Strict JSON schema of a response in a non-idx encoding."""
+    if encoding == "int_arrays":
+        return {
+            "type": "array",
+            "maxItems": k_max,
+            "items": {"type": "array", "items": {"type": "integer"}, "minItems": 1},
+        }
+    if encoding == "delimited":
+        group = "[0-9]+( [0-9]+)*"
+        return {"type": "string", "pattern": f"^({group}(;{group}){{0,{max(0, k_max - 1)}}})?$"}
+    if encoding == "words":
+        return {"type": "array", "maxItems": k_max, "items": {"type": "string", "minLength": 1}}
+    raise ValueError(f"Unknown response encoding {encoding!r}")
+
+
+def _loads_or_none(raw: str) -> Any:
+    try:
+        return json.loads(raw)
+    except json.JSONDecodeError:
+        return None
+
+
+def decode_int_arrays(raw: str, tiles: List[str]) -> Tuple[List[Any], bool]:
+    parsed = _loads_or_none(raw)
+    salvaged = not isinstance(parsed, list)
+    if salvaged:
+        # Items are the depth-2 brackets, exactly as in an idx response
+        parsed = salvage_items(raw)
+        if not parsed:
+            raise ValueError(f"Expected a JSON list of int lists. Raw:\n{raw}")
+    return [{"idx": x} if isinstance(x, list) else x for x in parsed], salvaged
+
+
+def decode_delimited(raw: str, tiles: List[str]) -> Tuple[List[Any], bool]:
+    parsed = _loads_or_none(raw)
+    salvaged = not isinstance(parsed, str)
+    if salvaged:
+        # Truncated string: keep the constructions closed by a ';'
+        start = raw.find('"')
+        if start < 0 or ";" not in raw[start:]:
+            raise ValueError(f"Expected a JSON string of ';'-separated constructions. Raw:\n{raw}")
+        parsed = raw[start + 1:].rsplit(";", 1)[0]
+    items: List[Any] = []
+    for group in parsed.split(";") if parsed.strip() else []:
+        parts = group.split()
+        items.append({"idx": [int(p) for p in parts]} if parts and all(p.isascii() and p.isdigit() for p in parts) else None)
+    return items, salvaged
+
+
+def decode_words(raw: str, tiles: List[str]) -> Tuple[List[Any], bool]:
+    parsed = _loads_or_none(raw)
+    salvaged = not isinstance(parsed, list)
+    if salvaged:
+        # Only a truncated list is salvaged; other JSON (e.g. an object's keys) isn't a word list
+        parsed = [json.loads(f'"{s}"') for s in _STRING_PATTERN.findall(raw)] if raw.lstrip().startswith("[") else []
+        if not parsed:
+            raise ValueError(f"Expected a JSON list of words. Raw:\n{raw}")
+
+    words = [w.strip().lower() for w in parsed if isinstance(w, str) and w.strip()]
+    unique = list(dict.fromkeys(words))
+    tilings = {unique[row[0]]: row[2:] for row in round_idx_tilings(tiles, unique, lambda w: None, 1)}
+
+    items: List[Any] = []
+    for w in parsed:
+        if not isinstance(w, str) or not w.strip():
+            items.append(None)
+            continue
+        w = w.strip().lower()
+        items.append({"idx": tilings[w]} if w in tilings else {"word": w})
+    return items, salvaged
+
+
+def encode_idx(constructions: List[Tuple[str, List[int]]]) -> str:
+    return json.dumps([{"idx": idx} for _, idx in constructions])
+
+
+def encode_int_arrays(constructions: List[Tuple[str, List[int]]]) -> str:
+    return json.dumps([idx for _, idx in constructions], separators=(",", ":"))
+
+
+def encode_delimited(constructions: List[Tuple[str, List[int]]]) -> str:
+    return json.dumps(";".join(" ".join(map(str, idx)) for _, idx in constructions))
+
+
+def encode_words(constructions: List[Tuple[str, List[int]]]) -> str:
+    return json.dumps([w for w, _ in constructions], separators=(",", ":"), ensure_ascii=False)
+
+
+# The idx encoding is decoded by benchmark.parse_or_salvage
+DECODERS: Dict[str, Callable[[str, List[str]], Tuple[List[Any], bool]]] = {
+    "int_arrays": decode_int_arrays,
+    "delimited": decode_delimited,
+    "words": decode_words,
+}
+ENCODERS: Dict[str, Callable[[List[Tuple[str, List[int]]]], str]] = {
+    "idx": encode_idx,
+    "int_arrays": encode_int_arrays,
+    "delimited": encode_delimited,
+    "words": encode_words,
+}
+ENCODINGS = tuple(ENCODERS)
+
+
+def decode(encoding: str, raw: str, tiles: List[str]) -> Tuple[List[Any], bool]:
+    """(idx items, salvaged) of a non-idx response; raises ValueError when nothing is recoverable."""
+    return DECODERS[encoding](raw, tiles)
+
@@ -0,0 +1,326 @@
+"""
+Compact duplicate-round detection with order-independent multiset hashes.
+
+multiset_hash(tiles) is the sum, mod 2**bits (64 or 128), of a BLAKE2b hash of
+every tile. It ignores tile order, counts repeated tiles, and is stable across
+runs, processes and machines, so hashes from different shards and files can
+be compared directly. precompute_rounds.py used to dedupe with a
+`seen_signatures` set of sorted (token, count) tuples, one per round, which
+cost hundreds of bytes per round; these hashes replace it.
+
+SeenRounds answers "was this multiset generated before?" from
+  - this run's hashes: HashStore, a sorted uint64 array (8 or 16 bytes per
+    round) plus a small set of recent additions merged into it in batches
+  - hashes of earlier files / other shards, loaded with SeenRounds.load from
+    <rounds>.jsonl.rhash<bits> sidecars (built and refreshed automatically)
+
+With bloom_error_rate set, the earlier files' hashes stay memory-mapped on
+disk behind an in-memory Bloom filter (about 1.2 bytes per round at 1%), and
+only Bloom positives do the exact second check, a binary search in the
+sidecar.
+
+Sidecar layout (little-endian):
+  b"RHSH0001" | source size (q) | source mtime_ns (q) | n (q) | bits (q)
+  then bits // 64 uint64 columns of n values (high word first), sorted by
+  (high, low)
+
+To check round files (e.g. independently generated shards) for duplicates
+across and within them, paste the command below into your terminal:
+
+python round_hash.py ^
+  --check .\rounds\shard_0.jsonl .\rounds\shard_1.jsonl
+
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import os
+import struct
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+MAGIC = b"RHSH0001"
+HEADER = struct.Struct("<8sqqqq")
+MASK64 = (1 << 64) - 1
+_GOLDEN = 0x9E3779B97F4A7C15
+
+_token_hashes: Dict[Tuple[str, int], int] = {}
+
+
+def token_hash(token: str, bits: int = 64) -> int:
+    h = _token_hashes.get((token, bits))
+    if h is None:
+        h = int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=bits // 8).digest(), "little")
+        _token_hashes[(token, bits)] = h
+    return h
+
+
+def multiset_hash(tiles: Iterable[str], bits: int = 64) -> int:
+    """Order-independent hash of a tile multiset."""
+    if bits not in (64, 128):
+        raise ValueError(f"bits must be 64 or 128, got {bits}")
+    return sum(token_hash(t, bits) for t in tiles) & ((1 << bits) - 1)
+
+
+def _words(h: int, n_words: int) -> List[int]:
+    """Hash as uint64 words, high word first."""
+    return [(h >> (64 * (n_words - 1 - i))) & MASK64 for i in range(n_words)]
+
+
+def _sort_columns(cols: np.ndarray) -> np.ndarray:
+    if cols.shape[0] == 1:
+        return np.sort(cols, axis=1)
+    # lexsort sorts by the last key first
+    return cols[:, np.lexsort(cols[::-1])]
+
+
+def _sorted_contains(cols: np.ndarray, words: List[int]) -> bool:
+    """Exact membership in (n_words, n) columns sorted by (high, low)."""
+    high = cols[0]
+    key = np.uint64(words[0])
+    i = int(np.searchsorted(high, key, "left"))
+    if len(words) == 1:
+        return i < len(high) and int(high[i]) == words[0]
+    j = int(np.searchsorted(high, key, "right"))
+    return bool((cols[1][i:j] == np.uint64(words[1])).any())
+
+
+class HashStore:
+    """Exact set of multiset hashes at 8 bytes per word."""
+
+    def __init__(self, bits: int = 64, merge_every: int = 1 << 16):
+        self.bits = bits
+        self.n_words = bits // 64
+        self.merge_every = merge_every
+        self._sorted = np.empty((self.n_words, 0), dtype=np.uint64)
+        self._recent: Set[int] = set()
+
+    def __len__(self) -> int:
+        return self._sorted.shape[1] + len(self._recent)
+
+    def __contains__(self, h: int) -> bool:
+        return h in self._recent or _sorted_contains(self._sorted, _words(h, self.n_words))
+
+    def add(self, h: int) -> None:
+        self._recent.add(h)
+        # Merging costs O(n), so let the buffer grow with the array (amortized O(log n) per add)
+        if len(self._recent) >= max(self.merge_every, self._sorted.shape[1] >> 3):
+            self._merge()
+
+    def _merge(self) -> None:
+        if not self._recent:
+            return
+        if self.n_words == 1:
+            new = np.fromiter(self._recent, dtype=np.uint64, count=len(self._recent)).reshape(1, -1)
+        else:
+            new = np.array([_words(h, self.n_words) for h in self._recent], dtype=np.uint64).T
+        self._sorted = _sort_columns(np.concatenate([self._sorted, new], axis=1))
+        self._recent = set()
+
+    def columns(self) -> np.ndarray:
+        self._merge()
+        return self._sorted
+
+
+class BloomFilter:
+    """Bloom filter over multiset hashes (double hashing on the low 64 bits)."""
+
+    def __init__(self, capacity: int, error_rate: float = 0.01):
+        capacity = max(1, capacity)
+        self.m = max(64, int(math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)))
+        self.k = max(1, int(round(self.m / capacity * math.log(2))))
+        self.bits = np.zeros((self.m + 7) // 8, dtype=np.uint8)
+
+    def _positions(self, low: int) -> List[int]:
+        step = (((low * _GOLDEN) & MASK64) >> 32) | 1
+        return [((low + i * step) & MASK64) % self.m for i in range(self.k)]
+
+    def add_many(self, low: np.ndarray) -> None:
+        low = np.asarray(low, dtype=np.uint64)
+        step = ((low * np.uint64(_GOLDEN)) >> np.uint64(32)) | np.uint64(1)
+        for i in range(self.k):
+            pos = (low + np.uint64(i) * step) % np.uint64(self.m)
+            np.bitwise_or.at(self.bits, pos >> np.uint64(3), (np.uint8(1) << (pos & np.uint64(7)).astype(np.uint8)))
+
+    def __contains__(self, h: int) -> bool:
+        bits = self.bits
+        return all(bits[p >> 3] >> (p & 7) & 1 for p in self._positions(h & MASK64))
+
+
+def sidecar_path_for(rounds_path: str, bits: int = 64) -> str:
+    return f"{rounds_path}.rhash{bits}"
+
+
+def _is_fresh(rounds_path: str, sidecar_path: str, bits: int) -> bool:
+    if not os.path.exists(sidecar_path):
+        return False
+    st = os.stat(rounds_path)
+    with open(sidecar_path, "rb") as f:
+        head = f.read(HEADER.size)
+    if len(head) < HEADER.size:
+        return False
+    magic, size, mtime_ns, _, file_bits = HEADER.unpack(head)
+    return magic == MAGIC and size == st.st_size and mtime_ns == st.st_mtime_ns and file_bits == bits
+
+
+def iter_round_tiles(rounds_path: str) -> Iterable[List[str]]:
+    with open(rounds_path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)["tiles"]
+
+
+def build_sidecar(rounds_path: str, bits: int = 64, sidecar_path: Optional[str] = None) -> str:
+    sidecar_path = sidecar_path or sidecar_path_for(rounds_path, bits)
+    n_words = bits // 64
+    hashes = [_words(multiset_hash(tiles, bits), n_words) for tiles in iter_round_tiles(rounds_path)]
+    cols = _sort_columns(np.array(hashes, dtype=np.uint64).reshape(-1, n_words).T)
+
+    st = os.stat(rounds_path)
+    tmp_path = sidecar_path + ".tmp"
+    with open(tmp_path, "wb") as out:
+        out.write(HEADER.pack(MAGIC, st.st_size, st.st_mtime_ns, cols.shape[1], bits))
+        out.write(np.ascontiguousarray(cols, dtype="<u8").tobytes())
+    os.replace(tmp_path, sidecar_path)
+    return sidecar_path
+
+
+def load_hashes(rounds_path: str, bits: int = 64, mmap: bool = False) -> np.ndarray:
+    """(bits // 64, n) sorted hash columns of a rounds JSONL, via its (refreshed) sidecar."""
+    sidecar = sidecar_path_for(rounds_path, bits)
+    if not _is_fresh(rounds_path, sidecar, bits):
+        build_sidecar(rounds_path, bits, sidecar)
+    with open(sidecar, "rb") as f:
+        _, _, _, n, _ = HEADER.unpack(f.read(HEADER.size))
+    n_words = bits // 64
+    if n == 0:
+        return np.empty((n_words, 0), dtype=np.uint64)
+    if mmap:
+        return np.memmap(sidecar, dtype="<u8", mode="r", offset=HEADER.size, shape=(n_words, n))
+    return np.fromfile(sidecar, dtype="<u8", offset=HEADER.size).reshape(n_words, n)
+
+
+class SeenRounds:
+    """Seen-set of round tile multisets, by multiset hash."""
+
+    def __init__(self, bits: int = 64, bloom_error_rate: Optional[float] = None):
+        self.bits = bits
+        self.n_words = bits // 64
+        self.bloom_error_rate = bloom_error_rate
+        self.store = HashStore(bits)
+        self._frozen: List[np.ndarray] = []
+        self._bloom: Optional[BloomFilter] = None
+        self.n_checked = 0
+        self.n_duplicates = 0
+        self.n_exact_checks = 0
+
+    def load(self, rounds_paths: Iterable[str]) -> int:
+        """Adds the rounds of existing JSONL files; returns how many hashes were loaded."""
+        use_bloom = self.bloom_error_rate is not None
+        loaded = [load_hashes(p, self.bits, mmap=use_bloom) for p in rounds_paths]
+        self._frozen.extend(c for c in loaded if c.shape[1])
+        n = sum(c.shape[1] for c in loaded)
+        if use_bloom and self._frozen:
+            self._bloom = BloomFilter(sum(c.shape[1] for c in self._frozen), self.bloom_error_rate)
+            for cols in self._frozen:
+                for lo in range(0, cols.shape[1], 1 << 20):
+                    self._bloom.add_many(cols[-1][lo:lo + (1 << 20)])
+        return n
+
+    def _in_frozen(self, h: int) -> bool:
+        if not self._frozen:
+            return False
+        if self._bloom is not None and h not in self._bloom:
+            return False
+        self.n_exact_checks += 1
+        words = _words(h, self.n_words)
+        return any(_sorted_contains(cols, words) for cols in self._frozen)
+
+    def __contains__(self, h: int) -> bool:
+        return h in self.store or self._in_frozen(h)
+
+    def add_if_new(self, h: int) -> bool:
+        """Records `h`; False if it was already seen."""
+        self.n_checked += 1
+        if h in self:
+            self.n_duplicates += 1
+            return False
+        self.store.add(h)
+        return True
+
+    def report(self) -> str:
+        return (f"Unique-round check: {self.n_checked} candidates, {self.n_duplicates} duplicates, "
+                f"{len(self.store)} new hashes, {sum(c.shape[1] for c in self._frozen)} from files, "
+                f"{self.n_exact_checks} exact file lookups")
+
+
+def find_duplicates(rounds_paths: List[str], bits: int = 64) -> List[List[Tuple[str, int]]]:
+    """
+    Groups of (path, line position) holding the same tile multiset, across all
+    files. Hash matches are confirmed by comparing the actual multisets.
+    """
+    by_hash: Dict[int, List[Tuple[str, int]]] = {}
+    # First pass keeps only hashes; positions are collected for repeated hashes only
+    seen = HashStore(bits)
+    repeated: Set[int] = set()
+    for path in rounds_paths:
+        for tiles in iter_round_tiles(path):
+            h = multiset_hash(tiles, bits)
+            if h in seen:
+                repeated.add(h)
+            else:
+                seen.add(h)
+    if not repeated:
+        return []
+
+    signatures: Dict[Tuple[str, int], Counter] = {}
+    for path in rounds_paths:
+        for pos, tiles in enumerate(iter_round_tiles(path)):
+            h = multiset_hash(tiles, bits)
+            if h in repeated:
+                by_hash.setdefault(h, []).append((path, pos))
+                signatures[(path, pos)] = Counter(tiles)
+
+    groups = []
+    for refs in by_hash.values():
+        # Exact second check: split hash collisions into real duplicate groups
+        exact: List[List[Tuple[str, int]]] = []
+        for ref in refs:
+            for g in exact:
+                if signatures[g[0]] == signatures[ref]:
+                    g.append(ref)
+                    break
+            else:
+                exact.append([ref])
+        groups.extend(g for g in exact if len(g) > 1)
+    return groups
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Build round-hash sidecars or check rounds files for duplicate rounds.")
+    ap.add_argument("rounds", nargs="*", help="Rounds JSONL files to (re)build .rhash sidecars for")
+    ap.add_argument("--check", nargs="+", default=None, metavar="JSONL",
+                    help="Report duplicate tile multisets within and across these files")
+    ap.add_argument("--bits", type=int, choices=[64, 128], default=64)
+    args = ap.parse_args()
+
+    for path in args.rounds:
+        print(f"Wrote {build_sidecar(path, args.bits)}")
+
+    if args.check:
+        groups = find_duplicates(args.check, args.bits)
+        for g in groups[:20]:
+            print("Duplicate: " + ", ".join(f"{p}:{pos}" for p, pos in g))
+        if len(groups) > 20:
+            print(f"... and {len(groups) - 20} more groups")
+        print(f"{len(groups)} duplicate groups across {len(args.check)} files")
+        if groups:
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
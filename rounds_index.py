@@ -0,0 +1,215 @@
+"""
+Byte-offset index sidecar for rounds JSONL files.
+
+<rounds>.jsonl.idx stores, per non-empty line: round_id, byte offset, byte
+length, n_solutions (-1 if unsolved) and tile count. With it, any subset of
+rounds is read by seeking straight to its lines through an mmap of the JSONL,
+instead of parsing everything before them.
+
+The index is rebuilt automatically when the JSONL's size or mtime changes.
+
+To build (or refresh) an index by hand:
+
+python rounds_index.py .\rounds\rounds_5000_sp_with_solutions.jsonl
+
+"""
+
+import argparse
+import json
+import mmap
+import os
+import random
+import struct
+import sys
+from array import array
+from collections import defaultdict
+from typing import Any, Dict, Iterator, List, Optional
+
+MAGIC = b"RIDX0001"
+# magic | source size (q) | source mtime_ns (q) | n rows (q)
+HEADER = struct.Struct("<8sqqq")
+# Fixed-width columns, stored one after another in this order
+COLUMNS = (("round_id", "q"), ("offset", "q"), ("length", "i"), ("n_solutions", "i"), ("n_tiles", "i"))
+
+
+def index_path_for(rounds_path: str) -> str:
+    return rounds_path + ".idx"
+
+
+def build_index(rounds_path: str, index_path: Optional[str] = None) -> str:
+    index_path = index_path or index_path_for(rounds_path)
+    cols = {name: array(code) for name, code in COLUMNS}
+
+    offset = 0
+    pos = 0
+    with open(rounds_path, "rb") as f:
+        for line in f:
+            stripped = line.strip()
+            if stripped:
+                r = json.loads(stripped)
+                sols = r.get("all_solutions")
+                cols["round_id"].append(r.get("round_id", pos))
+                cols["offset"].append(offset)
+                cols["length"].append(len(line))
+                cols["n_solutions"].append(r.get("n_solutions", len(sols) if isinstance(sols, list) else -1))
+                cols["n_tiles"].append(len(r.get("tiles", [])))
+                pos += 1
+            offset += len(line)
+
+    st = os.stat(rounds_path)
+    tmp_path = index_path + ".tmp"
+    with open(tmp_path, "wb") as out:
+        out.write(HEADER.pack(MAGIC, st.st_size, st.st_mtime_ns, pos))
+        for name, _ in COLUMNS:
+            a = cols[name]
+            if sys.byteorder != "little":
+                a.byteswap()
+            out.write(a.tobytes())
+    os.replace(tmp_path, index_path)
+    return index_path
+
+
+def _is_fresh(rounds_path: str, index_path: str) -> bool:
+    if not os.path.exists(index_path):
+        return False
+    st = os.stat(rounds_path)
+    with open(index_path, "rb") as f:
+        head = f.read(HEADER.size)
+    if len(head) < HEADER.size:
+        return False
+    magic, size, mtime_ns, _ = HEADER.unpack(head)
+    return magic == MAGIC and size == st.st_size and mtime_ns == st.st_mtime_ns
+
+
+class PositionQueries:
+    """
+    Position selection shared by RoundsIndex and rounds_store.RoundsStore;
+    needs `self.n` and `self.columns` with round_id / n_solutions / n_tiles.
+    """
+
+    def range_positions(self, start_id: int, stop_id: int) -> List[int]:
+        """Positions of rounds with start_id <= round_id < stop_id, in file order."""
+        ids = self.columns["round_id"]
+        return [i for i in range(self.n) if start_id <= ids[i] < stop_id]
+
+    def sample_positions(self, n: int, seed: int, positions: Optional[List[int]] = None) -> List[int]:
+        """Up to n random positions, drawn from `positions` (default: all rounds)."""
+        rng = random.Random(seed)
+        candidates = range(self.n) if positions is None else positions
+        return sorted(rng.sample(candidates, min(n, len(candidates))))
+
+    def stratified_positions(
+        self,
+        n: int,
+        column: str,
+        seed: int,
+        positions: Optional[List[int]] = None,
+    ) -> List[int]:
+        """
+        Up to n positions spread evenly over the distinct values of `column`
+        (round-robin over strata in random order, random within each stratum),
+        drawn from `positions` (default: all rounds).
+        """
+        rng = random.Random(seed)
+        strata: Dict[int, List[int]] = defaultdict(list)
+        values = self.columns[column]
+        for i in range(self.n) if positions is None else positions:
+            strata[values[i]].append(i)
+        buckets = []
+        for key in sorted(strata):
+            members = strata[key]
+            rng.shuffle(members)
+            buckets.append(members)
+
+        picked: List[int] = []
+        depth = 0
+        while len(picked) < n and any(depth < len(b) for b in buckets):
+            # Shuffle strata each pass so a partial last pass isn't biased to low values
+            live = [b for b in buckets if depth < len(b)]
+            rng.shuffle(live)
+            for b in live[:n - len(picked)]:
+                picked.append(b[depth])
+            depth += 1
+        return sorted(picked)
+
+
+class RoundsIndex(PositionQueries):
+    """
+    Random access to a rounds JSONL by position or round_id.
+    Column values are exposed as memoryviews over the mmap'd index file.
+    """
+
+    def __init__(self, rounds_path: str, index_path: Optional[str] = None, rebuild: bool = False):
+        if sys.byteorder != "little":
+            raise RuntimeError("RoundsIndex assumes a little-endian host")
+        self.rounds_path = rounds_path
+        self.index_path = index_path or index_path_for(rounds_path)
+        if rebuild or not _is_fresh(rounds_path, self.index_path):
+            build_index(rounds_path, self.index_path)
+
+        self._idx_f = open(self.index_path, "rb")
+        self._idx_mm = mmap.mmap(self._idx_f.fileno(), 0, access=mmap.ACCESS_READ)
+        _, _, _, n = HEADER.unpack_from(self._idx_mm, 0)
+        self.n = n
+
+        view = memoryview(self._idx_mm)
+        self.columns: Dict[str, memoryview] = {}
+        pos = HEADER.size
+        for name, code in COLUMNS:
+            width = struct.calcsize(code) * n
+            self.columns[name] = view[pos:pos + width].cast(code)
+            pos += width
+
+        self._data_f = open(rounds_path, "rb")
+        self._data_mm = mmap.mmap(self._data_f.fileno(), 0, access=mmap.ACCESS_READ) if n else None
+        self._pos_by_id: Optional[Dict[int, int]] = None
+
+    def __len__(self) -> int:
+        return self.n
+
+    def get(self, pos: int) -> Dict[str, Any]:
+        """Round at line position `pos` (0-based over non-empty lines)."""
+        off = self.columns["offset"][pos]
+        length = self.columns["length"][pos]
+        return json.loads(self._data_mm[off:off + length])
+
+    def position_of(self, round_id: int) -> int:
+        ids = self.columns["round_id"]
+        # Fast path: files written by precompute_rounds.py have round_id == position
+        if 0 <= round_id < self.n and ids[round_id] == round_id:
+            return round_id
+        if self._pos_by_id is None:
+            self._pos_by_id = {rid: i for i, rid in enumerate(ids)}
+        return self._pos_by_id[round_id]
+
+    def get_by_id(self, round_id: int) -> Dict[str, Any]:
+        return self.get(self.position_of(round_id))
+
+    def iter_positions(self, positions: List[int]) -> Iterator[Dict[str, Any]]:
+        for p in positions:
+            yield self.get(p)
+
+    def close(self) -> None:
+        for m in self.columns.values():
+            m.release()
+        self.columns = {}
+        self._idx_mm.close()
+        self._idx_f.close()
+        if self._data_mm is not None:
+            self._data_mm.close()
+        self._data_f.close()
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Build the byte-offset index sidecar for a rounds JSONL.")
+    ap.add_argument("rounds", help="Rounds JSONL")
+    args = ap.parse_args()
+
+    path = build_index(args.rounds)
+    idx = RoundsIndex(args.rounds)
+    print(f"Indexed {len(idx)} rounds -> {path}")
+    idx.close()
+
+
+if __name__ == "__main__":
+    main()
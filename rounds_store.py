@@ -0,0 +1,417 @@
+"""
+Columnar, mmap'd binary store for rounds (the .rstore format).
+
+A rounds JSONL repeats the meta block, the token strings and the solution
+words on every line, and every reader has to json.loads each line. A .rstore
+keeps the same rounds as flat arrays:
+
+  b"RSTORE01" | u32 header length | header JSON | sections (8-byte aligned)
+
+The header holds n_rounds, the variant names, the distinct meta blocks (as
+JSON), the distinct key orders ("layouts") and the section table, as in
+dict_store.py. Sections (little-endian):
+  tok_off / tok_blob     interned token table
+  word_off / word_blob   interned word table, sorted by code point, so a
+                         sorted all_solutions is also a sorted run of ids
+  round_id (q), variant (i), meta (i), layout (i), n_solutions (i, -1 if absent)
+  tile_off (q, n + 1)    + tile_tok (i)     tiles as token ids
+  target_off (q, n + 1)  + target_word (i)  targets as word ids
+  ttok_off (q, per target + 1) + ttok_tok (i)  target_tokens, one run per target
+  sol_off (q, n + 1)     + sol_word (i)     all_solutions as word ids
+  extra_off / extra_blob JSON of any field that doesn't fit the columns
+
+RoundsStore.get(pos) rebuilds the exact round dict (same keys in the same
+order), so JSONL -> .rstore -> JSONL is lossless. RoundsStore.batch() and
+iter_batches() hand out numpy views of the id arrays without copying them,
+for the solvers; RoundsStore also answers the RoundsIndex queries
+(get_by_id, range/sample/stratified positions), so benchmark.py takes either
+file through open_rounds().
+
+To convert (either direction; the input format is detected), paste the command below into your terminal:
+
+python rounds_store.py ^
+  --in  .\rounds\rounds_5000_sp_with_solutions.jsonl ^
+  --out .\rounds\rounds_5000_sp_with_solutions.rstore ^
+  --verify
+
+"""
+
+import argparse
+import itertools
+import json
+import mmap
+import struct
+import sys
+import time
+from array import array
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from dict_store import _aligned, _le, _string_table
+from rounds_index import PositionQueries, RoundsIndex
+
+MAGIC = b"RSTORE01"
+
+# Fields with a columnar representation; anything else goes to the extra JSON
+COLUMN_FIELDS = ("round_id", "variant", "tiles", "targets", "target_tokens", "meta", "all_solutions", "n_solutions")
+
+
+def _is_str_list(v: Any) -> bool:
+    return isinstance(v, list) and all(isinstance(x, str) for x in v)
+
+
+def _is_int(v: Any) -> bool:
+    return isinstance(v, int) and not isinstance(v, bool)
+
+
+def _columnar_fields(r: Dict[str, Any]) -> set:
+    """Fields of `r` that the columns can hold exactly."""
+    ok = set()
+    if _is_int(r.get("round_id")):
+        ok.add("round_id")
+    if isinstance(r.get("variant"), str):
+        ok.add("variant")
+    if _is_str_list(r.get("tiles")):
+        ok.add("tiles")
+    if _is_str_list(r.get("targets")):
+        ok.add("targets")
+        tt = r.get("target_tokens")
+        # One token run per target, keyed in target order (how precompute_rounds.py writes it)
+        if (isinstance(tt, dict) and list(tt) == r["targets"] and len(set(r["targets"])) == len(r["targets"])
+                and all(_is_str_list(v) for v in tt.values())):
+            ok.add("target_tokens")
+    if isinstance(r.get("meta"), dict):
+        ok.add("meta")
+    if _is_str_list(r.get("all_solutions")):
+        ok.add("all_solutions")
+    if _is_int(r.get("n_solutions")) and r["n_solutions"] >= 0:
+        ok.add("n_solutions")
+    return ok
+
+
+def write_store(rounds: Iterable[Dict[str, Any]], path: str) -> int:
+    """Writes rounds to a .rstore file; returns how many were written."""
+    token_ids: Dict[str, int] = {}
+    word_ids: Dict[str, int] = {}
+    variants: Dict[str, int] = {}
+    metas: Dict[str, int] = {}
+    layouts: Dict[Tuple[str, ...], int] = {}
+
+    cols = {name: array(code) for name, code in (
+        ("round_id", "q"), ("variant", "i"), ("meta", "i"), ("layout", "i"), ("n_solutions", "i"),
+        ("tile_tok", "i"), ("target_word", "i"), ("ttok_tok", "i"), ("sol_word", "i"),
+    )}
+    offsets = {name: array("q", [0]) for name in ("tile_off", "target_off", "ttok_off", "sol_off", "extra_off")}
+    extra_blob = bytearray()
+
+    n = 0
+    for r in rounds:
+        ok = _columnar_fields(r)
+        cols["round_id"].append(r["round_id"] if "round_id" in ok else 0)
+        cols["variant"].append(variants.setdefault(r["variant"], len(variants)) if "variant" in ok else -1)
+        cols["meta"].append(
+            metas.setdefault(json.dumps(r["meta"], ensure_ascii=False), len(metas)) if "meta" in ok else -1)
+        cols["layout"].append(layouts.setdefault(tuple(r), len(layouts)))
+        cols["n_solutions"].append(r["n_solutions"] if "n_solutions" in ok else -1)
+
+        if "tiles" in ok:
+            cols["tile_tok"].extend(token_ids.setdefault(t, len(token_ids)) for t in r["tiles"])
+        offsets["tile_off"].append(len(cols["tile_tok"]))
+        if "targets" in ok:
+            for w in r["targets"]:
+                cols["target_word"].append(word_ids.setdefault(w, len(word_ids)))
+                if "target_tokens" in ok:
+                    cols["ttok_tok"].extend(token_ids.setdefault(t, len(token_ids)) for t in r["target_tokens"][w])
+                offsets["ttok_off"].append(len(cols["ttok_tok"]))
+        offsets["target_off"].append(len(cols["target_word"]))
+        if "all_solutions" in ok:
+            cols["sol_word"].extend(word_ids.setdefault(w, len(word_ids)) for w in r["all_solutions"])
+        offsets["sol_off"].append(len(cols["sol_word"]))
+
+        extra = {k: v for k, v in r.items() if k not in ok}
+        if extra:
+            extra_blob += json.dumps(extra, ensure_ascii=False).encode("utf-8")
+        offsets["extra_off"].append(len(extra_blob))
+        n += 1
+
+    # Renumber words in sorted order
+    words = sorted(word_ids)
+    rank = np.empty(len(word_ids), dtype=np.int32)
+    for new_id, w in enumerate(words):
+        rank[word_ids[w]] = new_id
+    for name in ("target_word", "sol_word"):
+        if len(cols[name]):
+            cols[name] = array("i", rank[np.frombuffer(cols[name], dtype=np.int32)].tobytes())
+
+    tokens = sorted(token_ids, key=token_ids.get)
+    sections: Dict[str, Tuple[bytes, str]] = {}
+    for name, (table_off, blob) in (("tok", _string_table(tokens)), ("word", _string_table(words))):
+        sections[f"{name}_off"] = (_le(table_off), "q")
+        sections[f"{name}_blob"] = (blob, "B")
+    for name, a in cols.items():
+        sections[name] = (_le(a), a.typecode)
+    for name, a in offsets.items():
+        sections[name] = (_le(a), "q")
+    sections["extra_blob"] = (bytes(extra_blob), "B")
+
+    # Two passes: header size depends on offsets, offsets depend on header size
+    header: Dict[str, Any] = {
+        "n_rounds": n,
+        "n_tokens": len(tokens),
+        "n_words": len(words),
+        "variants": sorted(variants, key=variants.get),
+        "metas": sorted(metas, key=metas.get),
+        "layouts": [list(k) for k in sorted(layouts, key=layouts.get)],
+        "sections": {},
+    }
+    for _ in range(2):
+        pos = _aligned(len(MAGIC) + 4 + len(json.dumps(header).encode("utf-8")))
+        table = {}
+        for name, (data, code) in sections.items():
+            table[name] = [pos, len(data), code]
+            pos = _aligned(pos + len(data))
+        header["sections"] = table
+    header_bytes = json.dumps(header).encode("utf-8")
+
+    with open(path, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<I", len(header_bytes)))
+        f.write(header_bytes)
+        for name, (data, _) in sections.items():
+            f.seek(header["sections"][name][0])
+            f.write(data)
+        # Pad so the last section's mmap view is complete even when it is empty
+        f.truncate(max(f.tell(), pos))
+    return n
+
+
+class RoundsBatch:
+    """
+    Rounds start..stop of a store as numpy arrays. The id arrays (tile_tok,
+    sol_word, target_word) are views into the mmap; the offsets are rebased
+    to start at 0.
+    """
+
+    def __init__(self, store: "RoundsStore", start: int, stop: int):
+        self.store = store
+        self.start = start
+        self.stop = stop
+        self.round_id = store.round_id[start:stop]
+        self.n_solutions = store.n_solutions[start:stop]
+        self.tile_off, self.tile_tok = store._runs("tile", start, stop)
+        self.target_off, self.target_word = store._runs("target", start, stop)
+        self.sol_off, self.sol_word = store._runs("sol", start, stop)
+
+    def __len__(self) -> int:
+        return self.stop - self.start
+
+    def tile_ids(self, i: int) -> np.ndarray:
+        return self.tile_tok[self.tile_off[i]:self.tile_off[i + 1]]
+
+    def solution_ids(self, i: int) -> np.ndarray:
+        return self.sol_word[self.sol_off[i]:self.sol_off[i + 1]]
+
+    def tiles(self, i: int) -> List[str]:
+        tokens = self.store.tokens
+        return [tokens[t] for t in self.tile_ids(i).tolist()]
+
+    def rounds(self) -> List[Dict[str, Any]]:
+        return [self.store.get(p) for p in range(self.start, self.stop)]
+
+
+class RoundsStore(PositionQueries):
+    """Read-only, mmap-backed view of a .rstore file."""
+
+    def __init__(self, path: str):
+        if sys.byteorder != "little":
+            raise RuntimeError("RoundsStore assumes a little-endian host")
+        self.path = path
+        self._f = open(path, "rb")
+        self._mm = mmap.mmap(self._f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mm[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"Not a rounds store: {path}")
+        (hlen,) = struct.unpack_from("<I", self._mm, len(MAGIC))
+        start = len(MAGIC) + 4
+        header = json.loads(self._mm[start:start + hlen].decode("utf-8"))
+
+        # numpy views for batches, memoryviews for per-round access (cheaper scalar reads)
+        view = memoryview(self._mm)
+        self._sec: Dict[str, np.ndarray] = {}
+        self._mv: Dict[str, memoryview] = {}
+        for name, (off, length, code) in header["sections"].items():
+            dtype = np.dtype(code).newbyteorder("<")
+            self._sec[name] = np.frombuffer(self._mm, dtype=dtype, count=length // dtype.itemsize, offset=off)
+            self._mv[name] = view[off:off + length].cast(code)
+
+        self.n: int = header["n_rounds"]
+        self.variants: List[str] = header["variants"]
+        self.metas: List[str] = header["metas"]
+        self.layouts: List[List[str]] = header["layouts"]
+        # Both tables are small next to the rounds; decode them once
+        self.tokens: List[str] = self._strings("tok", header["n_tokens"])
+        self.words: List[str] = self._strings("word", header["n_words"])
+
+        self.round_id = self._sec["round_id"]
+        self.n_solutions = self._sec["n_solutions"]
+        self.columns: Dict[str, np.ndarray] = {
+            "round_id": self.round_id,
+            "n_solutions": self.n_solutions,
+            "n_tiles": np.diff(self._sec["tile_off"]),
+        }
+        self._pos_by_id: Optional[Dict[int, int]] = None
+
+    def _strings(self, table: str, n: int) -> List[str]:
+        off = self._sec[table + "_off"].tolist()
+        blob = self._sec[table + "_blob"].tobytes()
+        return [blob[off[i]:off[i + 1]].decode("utf-8") for i in range(n)]
+
+    def _runs(self, name: str, start: int, stop: int) -> Tuple[np.ndarray, np.ndarray]:
+        off = self._sec[f"{name}_off"][start:stop + 1]
+        values = self._sec[f"{name}_tok" if name == "tile" else f"{name}_word"]
+        base = int(off[0]) if len(off) else 0
+        end = int(off[-1]) if len(off) else 0
+        return off - base, values[base:end]
+
+    def __len__(self) -> int:
+        return self.n
+
+    def _field(self, key: str, pos: int) -> Any:
+        sec = self._mv
+        if key == "round_id":
+            return sec["round_id"][pos]
+        if key == "variant":
+            return self.variants[sec["variant"][pos]]
+        if key == "tiles":
+            tokens = self.tokens
+            return [tokens[t] for t in sec["tile_tok"][sec["tile_off"][pos]:sec["tile_off"][pos + 1]].tolist()]
+        if key == "targets":
+            words = self.words
+            return [words[w] for w in sec["target_word"][sec["target_off"][pos]:sec["target_off"][pos + 1]].tolist()]
+        if key == "target_tokens":
+            tokens, words = self.tokens, self.words
+            lo, hi = sec["target_off"][pos], sec["target_off"][pos + 1]
+            ttok_off = sec["ttok_off"][lo:hi + 1].tolist()
+            ttok = sec["ttok_tok"]
+            return {
+                words[w]: [tokens[t] for t in ttok[ttok_off[j]:ttok_off[j + 1]].tolist()]
+                for j, w in enumerate(sec["target_word"][lo:hi].tolist())
+            }
+        if key == "meta":
+            return json.loads(self.metas[sec["meta"][pos]])
+        if key == "all_solutions":
+            words = self.words
+            return [words[w] for w in sec["sol_word"][sec["sol_off"][pos]:sec["sol_off"][pos + 1]].tolist()]
+        if key == "n_solutions":
+            return sec["n_solutions"][pos]
+        raise KeyError(key)
+
+    def get(self, pos: int) -> Dict[str, Any]:
+        """Round at position `pos`, identical to the JSONL record it came from."""
+        sec = self._mv
+        lo, hi = sec["extra_off"][pos], sec["extra_off"][pos + 1]
+        extra = json.loads(bytes(sec["extra_blob"][lo:hi])) if hi > lo else {}
+        r: Dict[str, Any] = {}
+        for key in self.layouts[sec["layout"][pos]]:
+            r[key] = extra[key] if key in extra else self._field(key, pos)
+        return r
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for pos in range(self.n):
+            yield self.get(pos)
+
+    def position_of(self, round_id: int) -> int:
+        ids = self.round_id
+        if 0 <= round_id < self.n and ids[round_id] == round_id:
+            return round_id
+        if self._pos_by_id is None:
+            self._pos_by_id = {rid: i for i, rid in enumerate(ids.tolist())}
+        return self._pos_by_id[round_id]
+
+    def get_by_id(self, round_id: int) -> Dict[str, Any]:
+        return self.get(self.position_of(round_id))
+
+    def iter_positions(self, positions: List[int]) -> Iterator[Dict[str, Any]]:
+        for p in positions:
+            yield self.get(p)
+
+    def batch(self, start: int, stop: int) -> RoundsBatch:
+        return RoundsBatch(self, max(0, start), min(stop, self.n))
+
+    def iter_batches(self, batch_size: int = 1024, start: int = 0, stop: Optional[int] = None) -> Iterator[RoundsBatch]:
+        stop = self.n if stop is None else min(stop, self.n)
+        for lo in range(start, stop, batch_size):
+            yield self.batch(lo, min(lo + batch_size, stop))
+
+    def close(self) -> None:
+        for m in self._mv.values():
+            m.release()
+        self._sec = {}
+        self._mv = {}
+        self.columns = {}
+        self.round_id = self.n_solutions = None
+        try:
+            self._mm.close()
+        except BufferError:
+            pass  # batches still hold views; the mapping goes away with them
+        self._f.close()
+
+
+def is_store(path: str) -> bool:
+    with open(path, "rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def open_rounds(path: str):
+    """RoundsStore for a .rstore file, RoundsIndex (offset sidecar) for a JSONL."""
+    return RoundsStore(path) if is_store(path) else RoundsIndex(path)
+
+
+def iter_rounds_file(path: str) -> Iterator[Dict[str, Any]]:
+    """Round dicts from a rounds JSONL or .rstore file, in file order."""
+    if is_store(path):
+        store = RoundsStore(path)
+        try:
+            yield from store
+        finally:
+            store.close()
+        return
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Convert rounds JSONL <-> columnar .rstore.")
+    ap.add_argument("--in", dest="inp", required=True, help="Rounds JSONL or .rstore")
+    ap.add_argument("--out", required=True, help="Output .rstore (from JSONL) or JSONL (from .rstore)")
+    ap.add_argument("--verify", action="store_true", help="Re-read the output and compare every round")
+    args = ap.parse_args()
+
+    if is_store(args.inp):
+        n = 0
+        with open(args.out, "w", encoding="utf-8") as f:
+            for r in iter_rounds_file(args.inp):
+                f.write(json.dumps(r, ensure_ascii=False) + "\n")
+                n += 1
+        print(f"Wrote {n} rounds to: {args.out}")
+    else:
+        t0 = time.perf_counter()
+        n = write_store(iter_rounds_file(args.inp), args.out)
+        print(f"Wrote {n} rounds to: {args.out} in {time.perf_counter() - t0:.1f} s")
+
+    if args.verify:
+        missing = object()
+        pairs = itertools.zip_longest(iter_rounds_file(args.inp), iter_rounds_file(args.out), fillvalue=missing)
+        for i, (a, b) in enumerate(pairs):
+            if a is missing or b is missing:
+                raise SystemExit(f"Verify failed at round {i}: {'input' if a is missing else 'output'} has fewer rounds")
+            if a != b or list(a) != list(b):
+                raise SystemExit(f"Verify failed at round {i}: {a} != {b}")
+        print("Verify OK")
+
+
+if __name__ == "__main__":
+    main()
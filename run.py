@@ -1,7 +1,10 @@
+import argparse
 import json
 import random
 
+import dict_store
 from lmstudio_client import LMStudioClient
+from response_cache import ResponseCache
 from evaluator import evaluate_round
 
 
@@ -23,8 +26,8 @@ Rules:
 
 
 def load_dictionary(path: str):
-    with open(path, "r", encoding="utf-8") as f:
-        return json.load(f)
+    # JSON (either layout) or binary .tokdict, see dict_store.py
+    return dict_store.load_dictionary(path)
 
 def sample_tiles_from_dictionary(dictionary, k_words=3, distractors=6, variant="sp"):
     """
@@ -50,6 +53,12 @@ def sample_tiles_from_dictionary(dictionary, k_words=3, distractors=6, variant="
 
 
 def main():
+    ap = argparse.ArgumentParser(description="Play one token-tile round against LM Studio.")
+    ap.add_argument("--cache", default=None,
+                    help="SQLite response cache; temperature-0 requests seen before are answered from it")
+    ap.add_argument("--cache_mb", type=float, default=512, help="Byte budget of --cache (LRU eviction)")
+    args = ap.parse_args()
+
     DICT_PATH = "./jsons/english_token_dictionary_bow_sp.json"
     dictionary = load_dictionary(DICT_PATH)
 
@@ -62,7 +71,8 @@ def main():
         "constraints": {"lowercase_only": True, "max_candidates": 50}
     }
 
-    client = LMStudioClient(base_url="http://localhost:1234/v1", api_key="lm-studio")
+    cache = ResponseCache(args.cache, int(args.cache_mb * 1024 * 1024)) if args.cache else None
+    client = LMStudioClient(base_url="http://localhost:1234/v1", api_key="lm-studio", cache=cache)
 
     # You may need to set this to the exact model name LM Studio exposes
     MODEL_NAME = "openai/gpt-oss-20b"
@@ -84,6 +94,10 @@ def main():
     for d in report["details"][:10]:
         print(d)
 
+    if cache is not None:
+        cache.report()
+        cache.close()
+
 
 if __name__ == "__main__":
     main()
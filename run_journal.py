@@ -0,0 +1,188 @@
+"""
+Append-only JSONL journal for benchmark runs.
+
+One record per round (raw model output, latency, config hash, ...), written
+in round order. Records are fsync'ed in batches of `fsync_every`, so a crash
+loses at most the last unsynced batch.
+
+The compression is picked from the file suffix:
+  .jsonl      plain text
+  .jsonl.gz   gzip (stdlib)
+  .jsonl.zst  zstd (needs `pip install zstandard`)
+
+A torn tail (partial line, unterminated gzip member / zstd frame) is tolerated
+on read and repaired before appending on resume.
+"""
+
+import gzip
+import io
+import json
+import os
+import zlib
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+
+def _compression_for(path: str) -> Optional[str]:
+    if path.endswith(".gz"):
+        return "gzip"
+    if path.endswith(".zst") or path.endswith(".zstd"):
+        return "zstd"
+    return None
+
+
+def _import_zstd():
+    try:
+        import zstandard
+    except ImportError as e:
+        raise RuntimeError("zstd journals need the 'zstandard' package (pip install zstandard)") from e
+    return zstandard
+
+
+def _decompress_zstd_frames(zstd, data: bytes) -> Tuple[bytes, bool]:
+    """
+    Decodes concatenated zstd frames one at a time. Returns (decoded, complete);
+    `complete` is False if the last frame is truncated or corrupt, in which case
+    `decoded` holds whatever that frame yielded before it stopped.
+    """
+    dctx = zstd.ZstdDecompressor()
+    chunks: List[bytes] = []
+    while data:
+        dobj = dctx.decompressobj()
+        try:
+            chunks.append(dobj.decompress(data))
+        except zstd.ZstdError:
+            return b"".join(chunks), False
+        if not dobj.eof:
+            return b"".join(chunks), False
+        data = dobj.unused_data
+    return b"".join(chunks), True
+
+
+def _read_records(path: str) -> Tuple[List[Dict[str, Any]], bool]:
+    """
+    Returns (records, damaged). `damaged` is True if the file ends in a torn
+    record or an unterminated compressed block.
+    """
+    records: List[Dict[str, Any]] = []
+    damaged = False
+    compression = _compression_for(path)
+    # Errors that mean "the compressed stream stops early", not "bad file"
+    torn_errors: Tuple[type, ...] = (EOFError, OSError, zlib.error)
+
+    with open(path, "rb") as raw_f:
+        if compression == "gzip":
+            stream = gzip.GzipFile(fileobj=raw_f, mode="rb")
+        elif compression == "zstd":
+            zstd = _import_zstd()
+            data, complete = _decompress_zstd_frames(zstd, raw_f.read())
+            damaged = not complete
+            stream = io.BytesIO(data)
+        else:
+            stream = raw_f
+
+        text = io.TextIOWrapper(stream, encoding="utf-8", newline="\n")
+        try:
+            for line in text:
+                if not line.endswith("\n"):
+                    damaged = True
+                    break
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    damaged = True
+        except torn_errors:
+            damaged = True
+
+    return records, damaged
+
+
+def iter_journal(path: str) -> Iterator[Dict[str, Any]]:
+    """Yields every complete record in the journal, skipping a torn tail."""
+    if not os.path.exists(path):
+        return
+    records, _ = _read_records(path)
+    yield from records
+
+
+class RunJournal:
+    """
+    Writer side of the journal. Use as a context manager:
+
+        with RunJournal(path, resume=True) as journal:
+            done = journal.existing   # records already on disk
+            journal.append({...})
+    """
+
+    def __init__(self, path: str, resume: bool = False, fsync_every: int = 32):
+        self.path = path
+        self.fsync_every = max(1, fsync_every)
+        self.compression = _compression_for(path)
+        self.existing: List[Dict[str, Any]] = []
+        self._pending = 0
+
+        parent = os.path.dirname(os.path.abspath(path))
+        os.makedirs(parent, exist_ok=True)
+
+        if resume and os.path.exists(path):
+            self.existing, damaged = _read_records(path)
+            if damaged:
+                self._rewrite(self.existing)
+        elif os.path.exists(path) and os.path.getsize(path) > 0:
+            raise FileExistsError(f"Journal already exists: {path} (use --resume to continue it)")
+
+        self._raw_f = open(path, "ab")
+        if self.compression == "gzip":
+            # Each session appends a new gzip member; concatenated members are valid gzip.
+            self._stream = gzip.GzipFile(fileobj=self._raw_f, mode="ab")
+        elif self.compression == "zstd":
+            zstd = _import_zstd()
+            self._zstd = zstd
+            self._stream = zstd.ZstdCompressor().stream_writer(self._raw_f, closefd=False)
+        else:
+            self._stream = self._raw_f
+
+    def _rewrite(self, records: List[Dict[str, Any]]) -> None:
+        # Drop the torn tail by rewriting the good records, then swap atomically.
+        # Keep the suffix so the temp file gets the same compression
+        head, tail = os.path.split(self.path)
+        tmp_path = os.path.join(head, ".tmp-" + tail)
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        with RunJournal(tmp_path, fsync_every=len(records) + 1) as tmp:
+            for rec in records:
+                tmp.append(rec)
+        os.replace(tmp_path, self.path)
+
+    def append(self, record: Dict[str, Any]) -> None:
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        self._stream.write(line.encode("utf-8"))
+        self._pending += 1
+        if self._pending >= self.fsync_every:
+            self.flush()
+
+    def flush(self) -> None:
+        if self.compression == "gzip":
+            self._stream.flush(zlib.Z_SYNC_FLUSH)
+        elif self.compression == "zstd":
+            # End the frame so everything written so far decodes on its own
+            self._stream.flush(self._zstd.FLUSH_FRAME)
+        self._raw_f.flush()
+        os.fsync(self._raw_f.fileno())
+        self._pending = 0
+
+    def close(self) -> None:
+        if self._raw_f.closed:
+            return
+        self.flush()
+        if self._stream is not self._raw_f:
+            self._stream.close()
+        self._raw_f.close()
+
+    def __enter__(self) -> "RunJournal":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
@@ -0,0 +1,203 @@
+"""
+Vectorized full-recall solver (NumPy/SciPy).
+
+Same answers as precompute_full_recall.compute_solutions_for_round, computed
+for a whole batch of rounds with sparse matrix products instead of a Python
+loop over Counter dicts.
+
+A word fits a tile multiset iff available[t] >= needed[t] for every token t
+the word uses. With N_k = [needed == k] (words x tokens) and
+A_k = [available >= k] (rounds x tokens), the number of satisfied tokens is
+
+    S = sum_k A_k @ N_k.T        (rounds x words, sparse)
+
+and word w fits round r iff S[r, w] == nnz(needed[w]).
+
+solve_store_batch builds the availability matrix straight from the tile id
+arrays of a rounds_store batch, without materializing token strings.
+
+Throughput comparison against the Python path:
+
+python sparse_solver.py ^
+  --dict .\jsons\english_token_dictionary_bow_sp.json ^
+  --rounds .\rounds\rounds_5000_sp.jsonl ^
+  --variant sp
+
+(--rounds may also be a .rstore file; its batches then go through solve_store_batch.)
+
+"""
+
+import argparse
+import time
+from collections import Counter
+from typing import Any, Dict, List, Sequence
+
+import numpy as np
+import scipy.sparse as sp
+
+from precompute_full_recall import (
+    build_indices,
+    compute_solutions_for_round,
+    load_dictionary,
+)
+from rounds_store import RoundsBatch, RoundsStore, is_store, iter_rounds_file
+
+
+class SparseSolver:
+    def __init__(self, word_list: List[str], word_token_counters: List[Counter]):
+        # Columns are sorted by word so each row's hits come out already in the
+        # same order as compute_solutions_for_round's solutions.sort().
+        order = sorted(range(len(word_list)), key=lambda i: word_list[i])
+        self.words: List[str] = [word_list[i] for i in order]
+
+        self.token_ids: Dict[str, int] = {}
+        indptr = [0]
+        indices: List[int] = []
+        data: List[int] = []
+        for i in order:
+            for t, n in word_token_counters[i].items():
+                tid = self.token_ids.setdefault(t, len(self.token_ids))
+                indices.append(tid)
+                data.append(n)
+            indptr.append(len(indices))
+
+        n_words, n_tokens = len(self.words), len(self.token_ids)
+        needed = sp.csr_matrix(
+            (np.asarray(data, dtype=np.int32), np.asarray(indices, dtype=np.int32), np.asarray(indptr)),
+            shape=(n_words, n_tokens),
+        )
+        self.n_tokens = n_tokens
+        self.nnz_per_word = np.diff(needed.indptr).astype(np.int32)
+
+        # One (tokens x words) indicator matrix per distinct needed count
+        self.max_need = int(needed.data.max()) if needed.nnz else 0
+        self.need_eq_t = []
+        for k in range(1, self.max_need + 1):
+            eq = needed.copy()
+            eq.data = (eq.data == k).astype(np.int32)
+            eq.eliminate_zeros()
+            self.need_eq_t.append(eq.T.tocsr())
+        self._remaps: Dict[int, Any] = {}
+
+    def _available_matrix(self, tiles_batch: Sequence[List[str]]) -> sp.csr_matrix:
+        indptr = [0]
+        indices: List[int] = []
+        data: List[int] = []
+        for tiles in tiles_batch:
+            for t, n in Counter(tiles).items():
+                tid = self.token_ids.get(t)
+                # Tokens no dictionary word uses can never help a word fit
+                if tid is not None:
+                    indices.append(tid)
+                    data.append(n)
+            indptr.append(len(indices))
+        return sp.csr_matrix(
+            (np.asarray(data, dtype=np.int32), np.asarray(indices, dtype=np.int32), np.asarray(indptr)),
+            shape=(len(tiles_batch), self.n_tokens),
+        )
+
+    def _available_from_ids(self, batch: RoundsBatch) -> sp.csr_matrix:
+        # Store token id -> solver token id (-1: no word uses it), built once per store
+        remap = self._remaps.get(id(batch.store))
+        if remap is None:
+            remap = np.array([self.token_ids.get(t, -1) for t in batch.store.tokens], dtype=np.int32)
+            self._remaps[id(batch.store)] = remap
+        cols = remap[batch.tile_tok]
+        rows = np.repeat(np.arange(len(batch), dtype=np.int32), np.diff(batch.tile_off))
+        keep = cols >= 0
+        # Duplicate (round, token) pairs are summed into tile counts
+        return sp.csr_matrix(
+            (np.ones(int(keep.sum()), dtype=np.int32), (rows[keep], cols[keep])),
+            shape=(len(batch), self.n_tokens),
+        )
+
+    def solve_batch(self, tiles_batch: Sequence[List[str]]) -> List[List[str]]:
+        """Returns the sorted solution list for every round in the batch."""
+        if not tiles_batch:
+            return []
+        return self._solve_available(self._available_matrix(tiles_batch))
+
+    def solve_store_batch(self, batch: RoundsBatch) -> List[List[str]]:
+        """solve_batch for a rounds_store batch, reading its tile ids in place."""
+        if not len(batch):
+            return []
+        return self._solve_available(self._available_from_ids(batch))
+
+    def _solve_available(self, available: sp.csr_matrix) -> List[List[str]]:
+        if not self.need_eq_t:
+            # No dictionary word has this variant
+            return [[] for _ in range(available.shape[0])]
+        satisfied = None
+        for k, eq_t in enumerate(self.need_eq_t, start=1):
+            at_least_k = available.copy()
+            at_least_k.data = (at_least_k.data >= k).astype(np.int32)
+            at_least_k.eliminate_zeros()
+            part = at_least_k @ eq_t
+            satisfied = part if satisfied is None else satisfied + part
+
+        satisfied = satisfied.tocsr()
+        satisfied.sort_indices()
+        fits = satisfied.data == self.nnz_per_word[satisfied.indices]
+
+        out: List[List[str]] = []
+        for r in range(available.shape[0]):
+            lo, hi = satisfied.indptr[r], satisfied.indptr[r + 1]
+            cols = satisfied.indices[lo:hi][fits[lo:hi]]
+            out.append([self.words[c] for c in cols])
+        return out
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Compare the sparse solver with the Python full-recall path.")
+    ap.add_argument("--dict", required=True, help="Path to english_token_dictionary_bow_sp.json")
+    ap.add_argument("--rounds", required=True, help="Rounds JSONL")
+    ap.add_argument("--variant", choices=["sp", "bow"], default="sp")
+    ap.add_argument("--batch_size", type=int, default=1024)
+    args = ap.parse_args()
+
+    dictionary = load_dictionary(args.dict)
+    word_list, word_token_counters, token_to_word_ids = build_indices(dictionary, args.variant)
+    tiles_all = [r["tiles"] for r in iter_rounds_file(args.rounds)]
+
+    t0 = time.perf_counter()
+    solver = SparseSolver(word_list, word_token_counters)
+    t_build = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    sparse_out: List[List[str]] = []
+    for s in range(0, len(tiles_all), args.batch_size):
+        sparse_out.extend(solver.solve_batch(tiles_all[s:s + args.batch_size]))
+    t_sparse = time.perf_counter() - t0
+
+    if is_store(args.rounds):
+        store = RoundsStore(args.rounds)
+        t0 = time.perf_counter()
+        ids_out: List[List[str]] = []
+        for batch in store.iter_batches(args.batch_size):
+            ids_out.extend(solver.solve_store_batch(batch))
+        t_ids = time.perf_counter() - t0
+        store.close()
+        print(f"Sparse solve from store ids: {t_ids:.2f} s ({len(tiles_all) / t_ids:.0f} rounds/s), "
+              f"{sum(1 for a, b in zip(ids_out, sparse_out) if a != b)} mismatching")
+
+    t0 = time.perf_counter()
+    python_out = [
+        compute_solutions_for_round(tiles, word_list, word_token_counters, token_to_word_ids)
+        for tiles in tiles_all
+    ]
+    t_python = time.perf_counter() - t0
+
+    mismatches = sum(1 for a, b in zip(sparse_out, python_out) if a != b)
+    n = len(tiles_all)
+    print(f"Rounds: {n}")
+    print(f"Sparse build: {t_build:.2f} s")
+    print(f"Sparse solve: {t_sparse:.2f} s ({n / t_sparse:.0f} rounds/s)")
+    print(f"Python solve: {t_python:.2f} s ({n / t_python:.0f} rounds/s)")
+    print(f"Speedup: {t_python / t_sparse:.1f}x")
+    print(f"Mismatching rounds: {mismatches}")
+    if mismatches:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
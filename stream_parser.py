@@ -0,0 +1,139 @@
+"""
+Incremental parser for streamed idx responses ([{"idx": [...]}, ...]).
+
+Text is fed as it arrives; every item object is decoded and validated the
+moment its closing brace is seen, so the client can cancel generation early:
+  - once K_MAX items have closed (evaluate_outputs ignores anything after them)
+  - after `max_invalid_run` invalid items in a row (degenerate output)
+  - when a single open item grows past any sensible size (runaway idx list)
+
+The same parser salvages the complete items of a truncated response, instead
+of failing the whole round on json.loads.
+"""
+
+import json
+from typing import Any, List, Optional
+
+from evaluator import normalize_concat_to_word
+
+VALID, FORMAT_ERROR, INDEX_OOB, INDEX_REUSE, DUPLICATE_WORD = "valid", "format", "oob", "reuse", "duplicate_word"
+
+
+class IdxStreamParser:
+    def __init__(
+        self,
+        tiles: Optional[List[str]] = None,
+        k_max: Optional[int] = None,
+        max_invalid_run: int = 0,
+        max_item_chars: Optional[int] = None,
+    ):
+        """
+        tiles: enables per-item validation (bounds, reuse, duplicate word); None = structure only.
+        k_max / max_invalid_run: stop conditions (0 / None disables them).
+        """
+        self.tiles = tiles
+        self.k_max = k_max
+        self.max_invalid_run = max_invalid_run
+        if max_item_chars is None and tiles is not None:
+            # '{"idx": [' + up to len(tiles) indices of a few digits each, with slack
+            max_item_chars = 64 + 8 * len(tiles)
+        self.max_item_chars = max_item_chars
+
+        self.items: List[Any] = []
+        self.statuses: List[str] = []
+        self.words: set = set()
+        self.n_valid = 0
+        self.invalid_run = 0
+        self.stop_reason: Optional[str] = None
+
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._item_buf: List[str] = []
+        self._item_len = 0
+
+    def _validate(self, item: Any) -> str:
+        if not isinstance(item, dict) or not isinstance(item.get("idx"), list):
+            return FORMAT_ERROR
+        idx_list = item["idx"]
+        if any(not isinstance(x, int) for x in idx_list):
+            return FORMAT_ERROR
+        if self.tiles is None:
+            return VALID
+        if any(x < 0 or x >= len(self.tiles) for x in idx_list):
+            return INDEX_OOB
+        if len(set(idx_list)) != len(idx_list):
+            return INDEX_REUSE
+        w = normalize_concat_to_word("".join(self.tiles[i] for i in idx_list))
+        if w in self.words:
+            return DUPLICATE_WORD
+        self.words.add(w)
+        return VALID
+
+    def _close_item(self, text: str) -> None:
+        try:
+            item = json.loads(text)
+        except json.JSONDecodeError:
+            item = None
+        status = self._validate(item)
+        self.items.append(item)
+        self.statuses.append(status)
+        if status == VALID:
+            self.n_valid += 1
+            self.invalid_run = 0
+        else:
+            self.invalid_run += 1
+
+        if self.k_max and len(self.items) >= self.k_max:
+            self.stop_reason = "k_max"
+        elif self.max_invalid_run and self.invalid_run >= self.max_invalid_run:
+            self.stop_reason = "invalid_run"
+
+    def feed(self, text: str) -> int:
+        """Consumes more response text; returns how many items closed in it."""
+        before = len(self.items)
+        for ch in text:
+            if self.stop_reason is not None:
+                break
+            if self._depth >= 2:
+                self._item_buf.append(ch)
+                self._item_len += 1
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                continue
+            if ch == '"':
+                self._in_string = True
+            elif ch in "[{":
+                self._depth += 1
+                if self._depth == 2:
+                    self._item_buf = [ch]
+                    self._item_len = 1
+            elif ch in "]}":
+                self._depth -= 1
+                if self._depth == 1:
+                    self._close_item("".join(self._item_buf))
+                    self._item_buf = []
+                    self._item_len = 0
+                elif self._depth == 0:
+                    self.stop_reason = "done"
+
+            if self.max_item_chars and self._item_len > self.max_item_chars:
+                self.stop_reason = "runaway_item"
+        return len(self.items) - before
+
+    @property
+    def should_stop(self) -> bool:
+        # "done" means the array closed normally; nothing left to cancel
+        return self.stop_reason not in (None, "done")
+
+
+def salvage_items(raw: str) -> List[Any]:
+    """Every complete item of a (possibly truncated) idx response, in order."""
+    parser = IdxStreamParser()
+    parser.feed(raw)
+    return parser.items
@@ -0,0 +1,234 @@
+"""
+Config sweep: models x sampling params x prompt variants over one shared round set.
+
+The grid is grouped by model, so LM Studio loads each model once (timed by a
+one-token warm-up request). All configs of a model then run concurrently: their
+requests are interleaved round by round through one in-flight window, so every
+config sees the same server conditions. One comparable results table is printed
+at the end and, with --out, written as CSV.
+
+Prompt variants are the keys of benchmark.PROMPT_VARIANTS.
+
+To run the code, paste the command below into your terminal:
+
+python sweep.py ^
+  --models openai/gpt-oss-20b,qwen/qwen3-8b ^
+  --temperatures 0,0.7 ^
+  --max_tokens 400,800 ^
+  --prompts default,idx ^
+  --n_rounds 50 ^
+  --concurrency 4 ^
+  --out .\runs\sweep.csv
+
+"""
+
+import argparse
+import csv
+import itertools
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from openai import OpenAI
+
+import benchmark
+from response_cache import ResponseCache
+
+TABLE_COLUMNS = (
+    "model", "prompt", "temperature", "max_tokens", "k_max", "config_hash",
+    "rounds_ok", "rounds", "load_s", "avg_latency_ms", "p95_latency_ms",
+    "precision", "full_recall", "target_recall", "invalid_items_per_round", "avg_output_tokens",
+)
+
+
+def parse_list(text: str, cast: Callable[[str], Any]) -> List[Any]:
+    return [cast(x.strip()) for x in text.split(",") if x.strip()]
+
+
+def build_grid(
+    models: List[str],
+    temperatures: List[float],
+    max_tokens: List[int],
+    k_maxes: List[int],
+    prompts: List[str],
+) -> List[Dict[str, Any]]:
+    """One entry per grid point: {"prompt": name, "config": benchmark.make_config(...)}."""
+    grid = []
+    for model, temp, mt, k, prompt in itertools.product(models, temperatures, max_tokens, k_maxes, prompts):
+        grid.append({
+            "prompt": prompt,
+            "config": benchmark.make_config(model=model, temperature=temp, max_tokens=mt, k_max=k, prompt=prompt),
+        })
+    return grid
+
+
+def group_by_model(grid: List[Dict[str, Any]]) -> Dict[str, List[Dict[str, Any]]]:
+    groups: Dict[str, List[Dict[str, Any]]] = {}
+    for entry in grid:
+        groups.setdefault(entry["config"]["model"], []).append(entry)
+    return groups
+
+
+def warm_up(client: OpenAI, model: str) -> float:
+    """Seconds for a one-token request, i.e. roughly the time LM Studio needs to load `model`."""
+    t0 = time.perf_counter()
+    client.chat.completions.create(
+        model=model,
+        messages=[{"role": "user", "content": "ok"}],
+        max_tokens=1,
+        temperature=0.0,
+    )
+    return time.perf_counter() - t0
+
+
+def run_model_group(
+    client: OpenAI,
+    entries: List[Dict[str, Any]],
+    rounds: List[Dict[str, Any]],
+    concurrency: int,
+    cache: Optional[ResponseCache] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Runs every config of one model over `rounds`, interleaved round by round
+    through a shared in-flight window. Returns one stats dict per entry.
+    """
+    n_cfg = len(entries)
+    stats = [{
+        "summary": benchmark.RunningSummary(),
+        "latencies": [],
+        "invalid": 0,
+        "out_tokens": 0,
+        "n_out_tokens": 0,
+    } for _ in entries]
+
+    def fn(item: Tuple[int, Dict[str, Any]], i: int) -> Tuple[int, Dict[str, Any]]:
+        k, r = item
+        metrics, _ = benchmark.run_round(client, r, i // n_cfg, config=entries[k]["config"], cache=cache)
+        return k, metrics
+
+    items = ((k, r) for r in rounds for k in range(n_cfg))
+    for _, (k, metrics) in benchmark.iter_ordered(fn, items, concurrency):
+        st = stats[k]
+        st["summary"].add(metrics)
+        if "error" in metrics:
+            continue
+        if metrics.get("latency_ms") is not None:
+            st["latencies"].append(metrics["latency_ms"])
+        st["invalid"] += metrics["format_errors"] + metrics["index_oob"] + metrics["index_reuse"]
+        if metrics.get("output_tokens") is not None:
+            st["out_tokens"] += metrics["output_tokens"]
+            st["n_out_tokens"] += 1
+    return stats
+
+
+def table_row(entry: Dict[str, Any], st: Dict[str, Any], load_s: float) -> Dict[str, Any]:
+    cfg = entry["config"]
+    sm = st["summary"]
+    ok = max(1, sm.n_ok)
+    lat = st["latencies"]
+    return {
+        "model": cfg["model"],
+        "prompt": entry["prompt"],
+        "temperature": cfg["temperature"],
+        "max_tokens": cfg["max_tokens"],
+        "k_max": cfg["k_max"],
+        "config_hash": benchmark.config_hash(config=cfg),
+        "rounds_ok": sm.n_ok,
+        "rounds": sm.n_rows,
+        "load_s": round(load_s, 2),
+        "avg_latency_ms": round(sum(lat) / len(lat), 1) if lat else None,
+        "p95_latency_ms": round(benchmark._percentile(lat, 0.95), 1) if lat else None,
+        "precision": round(sm.sum_prec / ok, 3),
+        "full_recall": round(sm.sum_full / ok, 3),
+        "target_recall": round(sm.sum_target / ok, 3),
+        "invalid_items_per_round": round(st["invalid"] / ok, 2),
+        "avg_output_tokens": round(st["out_tokens"] / st["n_out_tokens"], 1) if st["n_out_tokens"] else None,
+    }
+
+
+def print_table(rows: List[Dict[str, Any]]) -> None:
+    cols = [c for c in TABLE_COLUMNS if c != "config_hash"]
+    cells = [[("" if r[c] is None else str(r[c])) for c in cols] for r in rows]
+    widths = [max(len(c), *(len(row[j]) for row in cells)) for j, c in enumerate(cols)]
+    print("\n=== Sweep results ===")
+    print("  ".join(c.rjust(w) for c, w in zip(cols, widths)))
+    for row in cells:
+        print("  ".join(v.rjust(w) for v, w in zip(row, widths)))
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Sweep models x sampling params x prompt variants over one round set.")
+    ap.add_argument("--rounds_jsonl", default=benchmark.ROUNDS_JSONL)
+    ap.add_argument("--n_rounds", type=int, default=benchmark.N_ROUNDS)
+    ap.add_argument("--rounds", default=None, metavar="START:STOP", help="See benchmark.py --rounds")
+    ap.add_argument("--sample", type=int, default=0)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--stratify", choices=["n_solutions", "n_tiles"], default=None)
+    ap.add_argument("--models", default=benchmark.MODEL_NAME, help="Comma-separated model ids")
+    ap.add_argument("--temperatures", default=str(benchmark.TEMPERATURE))
+    ap.add_argument("--max_tokens", default=str(benchmark.MAX_TOKENS))
+    ap.add_argument("--k_max", default=str(benchmark.K_MAX))
+    ap.add_argument("--prompts", default="default", help=f"Any of: {', '.join(benchmark.PROMPT_VARIANTS)}")
+    ap.add_argument("--concurrency", type=int, default=benchmark.CONCURRENCY,
+                    help="Requests in flight per model, shared by all its configs")
+    ap.add_argument("--no_warmup", action="store_true", help="Skip the per-model load/warm-up request")
+    ap.add_argument("--cache", default=None, help="SQLite response cache shared by all configs (see benchmark.py)")
+    ap.add_argument("--cache_mb", type=float, default=512)
+    ap.add_argument("--out", default=None, help="Write the results table to this CSV")
+    args = ap.parse_args()
+
+    prompts = parse_list(args.prompts, str)
+    unknown = [p for p in prompts if p not in benchmark.PROMPT_VARIANTS]
+    if unknown:
+        ap.error(f"Unknown prompt variant(s): {', '.join(unknown)}")
+    if args.stratify and not args.sample:
+        ap.error("--stratify needs --sample N")
+
+    grid = build_grid(
+        parse_list(args.models, str),
+        parse_list(args.temperatures, float),
+        parse_list(args.max_tokens, int),
+        parse_list(args.k_max, int),
+        prompts,
+    )
+    groups = group_by_model(grid)
+    rounds = benchmark.select_rounds(args)
+    print(f"Sweep: {len(grid)} configs over {len(groups)} model(s), {len(rounds)} rounds each")
+
+    client = benchmark.make_client(args.concurrency)
+    cache = ResponseCache(args.cache, int(args.cache_mb * 1024 * 1024)) if args.cache else None
+    rows = []
+    for model, entries in groups.items():
+        load_s = 0.0
+        if not args.no_warmup:
+            try:
+                load_s = warm_up(client, model)
+            except Exception as e:
+                print(f"[{model}] warm-up failed, skipping: {e}")
+                continue
+        print(f"[{model}] loaded in {load_s:.1f} s; running {len(entries)} configs")
+        t_start = time.perf_counter()
+        stats = run_model_group(client, entries, rounds, args.concurrency, cache)
+        wall_s = time.perf_counter() - t_start
+        n_req = len(entries) * len(rounds)
+        print(f"[{model}] {n_req} requests in {wall_s:.1f} s ({n_req / wall_s:.2f} req/s)")
+        rows.extend(table_row(e, st, load_s) for e, st in zip(entries, stats))
+
+    if cache is not None:
+        cache.report()
+        cache.close()
+    if not rows:
+        return
+    print_table(rows)
+    if args.out:
+        out_path = Path(args.out)
+        out_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(out_path, "w", encoding="utf-8", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=TABLE_COLUMNS)
+            writer.writeheader()
+            writer.writerows(rows)
+        print(f"\nWrote: {out_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+"""
+Offline token counts and per-round max_tokens budgets.
+
+Prompt tokens are counted exactly with the model's tokenizer.json through the
+`tokenizers` package. The file is not in the repo: get_tokenizer_files.py
+downloads it to gpt-oss-20b/ and copies it to jsons/, and either location is
+used. When the file or the package is missing, a regex approximation of the
+byte-level pre-tokenizer is used instead (prompt counts typically off by
+~25%); TokenCounter.exact says which one is active.
+
+The output budget of a round is the token count of a complete answer: one
+response item per solution (up to k_max), each spelled by a valid tiling
+(the round's idx_tilings when precomputed, see idx_tilings.py), serialized
+in the response encoding like the model would (see response_encodings.py).
+Then slack and a fixed reserve are added, and the result is clamped to
+[min_tokens, max_tokens]:
+
+  budget = clamp(ceil(answer_tokens * slack) + reserve)
+
+With a reasoning model, raise the reserve to cover its analysis tokens.
+
+To run the code, paste the command below into your terminal:
+
+python token_budget.py ^
+  --rounds .\rounds\rounds_5000_sp_with_solutions.jsonl ^
+  --n_rounds 1000
+
+"""
+
+import argparse
+import math
+import os
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from idx_tilings import round_idx_tilings
+from response_encodings import ENCODERS, ENCODINGS
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+# First existing file wins: jsons/ (where get_tokenizer_files.py copies it), then its download folder
+TOKENIZER_JSON_PATHS = (
+    os.path.join(SCRIPT_DIR, "jsons", "tokenizer.json"),
+    os.path.join(SCRIPT_DIR, "gpt-oss-20b", "tokenizer.json"),
+)
+
+# Chat-template tokens around each message (role / channel markers); not part of the content
+MESSAGE_OVERHEAD_TOKENS = 8
+
+BUDGET_SLACK = 1.25
+BUDGET_RESERVE = 32
+BUDGET_MIN = 32
+
+# Non-ASCII chars, optionally space-prefixed letter runs, up to 3 digits, ASCII punctuation runs, whitespace
+_APPROX_PATTERN = re.compile(r"[^\x00-\x7f]| ?[A-Za-z]+|\d{1,3}| ?[!-/:-@\[-`{-~]+|\s+")
+
+
+class TokenCounter:
+    """Token counts with the bundled tokenizer, or the regex approximation without it."""
+
+    def __init__(self, tokenizer_json: Optional[str] = None):
+        self.tokenizer = None
+        if tokenizer_json is None:
+            tokenizer_json = next((p for p in TOKENIZER_JSON_PATHS if os.path.exists(p)), None)
+        try:
+            from tokenizers import Tokenizer
+        except ImportError:
+            Tokenizer = None
+        if Tokenizer is not None and tokenizer_json and os.path.exists(tokenizer_json):
+            self.tokenizer = Tokenizer.from_file(tokenizer_json)
+
+    @property
+    def exact(self) -> bool:
+        return self.tokenizer is not None
+
+    def count(self, text: str) -> int:
+        if self.tokenizer is not None:
+            return len(self.tokenizer.encode(text, add_special_tokens=False).ids)
+        return len(_APPROX_PATTERN.findall(text))
+
+    def count_messages(self, messages: List[Dict[str, str]]) -> int:
+        """Prompt tokens of a chat request: content tokens plus the per-message template overhead."""
+        return sum(self.count(m["content"]) + MESSAGE_OVERHEAD_TOKENS for m in messages)
+
+
+_COUNTER: Optional[TokenCounter] = None
+
+
+def default_counter() -> TokenCounter:
+    """Process-wide TokenCounter (loading tokenizer.json once)."""
+    global _COUNTER
+    if _COUNTER is None:
+        _COUNTER = TokenCounter()
+    return _COUNTER
+
+
+def complete_answer(r: Dict[str, Any], k_max: int) -> List[Tuple[str, List[int]]]:
+    """
+    The (word, idx) constructions of a complete answer: one valid tiling per
+    solution, using the precomputed idx_tilings when present. With more than
+    k_max solutions the k_max longest are kept, so the budget errs on the high side.
+    """
+    solutions = r.get("all_solutions", [])
+    rows = r.get("idx_tilings")
+    if rows is None:
+        rows = round_idx_tilings(r["tiles"], solutions, r.get("target_tokens", {}).get, 1)
+    first: Dict[int, List[int]] = {}
+    for row in rows:
+        first.setdefault(row[0], row[2:])
+    ranked = sorted(first.items(), key=lambda kv: (len(kv[1]), len(solutions[kv[0]])), reverse=True)
+    return [(solutions[s], idx) for s, idx in ranked[:k_max]]
+
+
+def answer_tokens(
+    r: Dict[str, Any],
+    k_max: int,
+    counter: Optional[TokenCounter] = None,
+    encoding: str = "idx",
+) -> int:
+    counter = counter or default_counter()
+    return counter.count(ENCODERS[encoding](complete_answer(r, k_max)))
+
+
+def round_budget(
+    r: Dict[str, Any],
+    k_max: int,
+    slack: float = BUDGET_SLACK,
+    reserve: int = BUDGET_RESERVE,
+    min_tokens: int = BUDGET_MIN,
+    max_tokens: Optional[int] = None,
+    counter: Optional[TokenCounter] = None,
+    encoding: str = "idx",
+) -> int:
+    """max_tokens for one round (see the module docstring)."""
+    budget = math.ceil(answer_tokens(r, k_max, counter, encoding) * slack) + reserve
+    budget = max(min_tokens, budget)
+    return budget if max_tokens is None else min(max_tokens, budget)
+
+
+def main():
+    from benchmark import K_MAX, MAX_TOKENS, make_config, round_messages
+    from rounds_store import iter_rounds_file
+
+    ap = argparse.ArgumentParser(description="Prompt tokens and adaptive max_tokens budgets of precomputed rounds.")
+    ap.add_argument("--rounds", required=True, help="Rounds JSONL or .rstore with all_solutions")
+    ap.add_argument("--n_rounds", type=int, default=1000)
+    ap.add_argument("--k_max", type=int, default=K_MAX)
+    ap.add_argument("--slack", type=float, default=BUDGET_SLACK)
+    ap.add_argument("--reserve", type=int, default=BUDGET_RESERVE)
+    args = ap.parse_args()
+
+    counter = default_counter()
+    cfg = make_config(k_max=args.k_max)
+    prompt, budgets, n_solutions = [], [], []
+    # Complete-answer tokens and solutions per encoding, for tokens per valid word
+    by_encoding = {e: [0, 0] for e in ENCODINGS}
+    for i, r in enumerate(iter_rounds_file(args.rounds)):
+        if i >= args.n_rounds:
+            break
+        prompt.append(counter.count_messages(round_messages(cfg, r["tiles"])))
+        budgets.append(round_budget(r, args.k_max, args.slack, args.reserve, max_tokens=MAX_TOKENS, counter=counter))
+        n_solutions.append(r.get("n_solutions", len(r.get("all_solutions", []))))
+        answer = complete_answer(r, args.k_max)
+        for e, acc in by_encoding.items():
+            acc[0] += counter.count(ENCODERS[e](answer))
+            acc[1] += len(answer)
+    if not budgets:
+        return
+
+    def pct(xs: List[int], q: float) -> int:
+        return sorted(xs)[min(len(xs) - 1, int(q * len(xs)))]
+
+    print(f"Token counts: {'tokenizer.json' if counter.exact else 'approximate (tokenizers or tokenizer.json missing, see get_tokenizer_files.py)'}")
+    print(f"Rounds: {len(budgets)}")
+    print(f"Prompt tokens: mean={sum(prompt) / len(prompt):.1f} p50={pct(prompt, 0.5)} max={max(prompt)}")
+    print(f"Adaptive max_tokens: mean={sum(budgets) / len(budgets):.1f} p50={pct(budgets, 0.5)} "
+          f"p95={pct(budgets, 0.95)} max={max(budgets)} (fixed: {MAX_TOKENS})")
+    print(f"Decode budget vs fixed: {sum(budgets) / (MAX_TOKENS * len(budgets)):.1%}")
+    by_n: Dict[int, List[int]] = {}
+    for n, b in zip(n_solutions, budgets):
+        by_n.setdefault(n, []).append(b)
+    print("n_solutions -> mean max_tokens: " + ", ".join(
+        f"{n}:{sum(bs) / len(bs):.0f}" for n, bs in sorted(by_n.items())
+    ))
+    print("Complete-answer tokens per word by encoding: " + ", ".join(
+        f"{e}={tokens / max(1, words):.2f}" for e, (tokens, words) in by_encoding.items()
+    ))
+
+
+if __name__ == "__main__":
+    main()